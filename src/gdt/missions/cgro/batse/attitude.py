@@ -0,0 +1,363 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import numpy as np
+import astropy.coordinates.representation as r
+from astropy.constants import R_earth
+from scipy.interpolate import CubicSpline
+
+from gdt.core.coords import Quaternion
+from ..frame import CgroFrame, _radec_to_vectors, _rotate_inverse
+from ..time import Time
+from .detectors import BatseDetectors
+from .phaii import _det_number
+
+__all__ = ['BatseAttitudeInterpolator']
+
+_R_EARTH_KM = R_earth.to('km').value
+# intervals between records longer than this multiple of the median interval
+# are gaps in the records
+_GAP_FACTOR = 10.0
+
+class BatseAttitudeInterpolator():
+    """An interpolator of the CGRO attitude and orbital position, such as 
+    from the records in a BATSE CONT or DISCLA file.  The attitude quaternions
+    are interpolated by spherical linear interpolation (SLERP) and the 
+    position by a cubic spline.  All queries are evaluated on arrays of times
+    without creating frame or coordinate objects.
+    
+    Times are in TJD, the same as the MID_TIME of the BATSE records, and sky
+    positions are RA and Dec in degrees.  A single sky position can be 
+    evaluated at many times, or many sky positions at a single time; 
+    otherwise the sky positions and times are paired element-wise.
+    
+    The records are not interpolated across gaps, such as SAA passages or 
+    telemetry losses, and times within a gap are rejected.
+    
+    Parameters:
+        times (np.array): The times of the records in TJD
+        quaternions (np.array): The (N, 4) attitude quaternions, in 
+                                (x, y, z, w) order
+        positions (np.array): The (N, 3) spacecraft positions in km
+        max_gap (float, optional): 
+            The longest interval between records, in seconds, that is 
+            interpolated.  If not set, intervals longer than 10 times the 
+            median interval are gaps.
+    """
+    def __init__(self, times, quaternions, positions, max_gap=None):
+        times = np.asarray(times, dtype=float).reshape(-1)
+        quaternions = np.asarray(quaternions, dtype=float).reshape(-1, 4)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        if (quaternions.shape[0] != times.size) or \
+           (positions.shape[0] != times.size):
+            raise ValueError('times, quaternions, and positions must have ' \
+                             'the same number of records')
+        
+        # sort the records and remove duplicate times
+        times, idx = np.unique(times, return_index=True)
+        if times.size < 2:
+            raise ValueError('At least two records with distinct times are ' \
+                             'required')
+        quaternions = quaternions[idx]
+        quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+        
+        # flip signs so that consecutive quaternions take the shortest path, 
+        # and precompute the SLERP angle of each interval
+        dot = np.einsum('ij,ij->i', quaternions[:-1], quaternions[1:])
+        flips = np.concatenate(([False], dot < 0.0))
+        signs = np.where(np.logical_xor.accumulate(flips), -1.0, 1.0)
+        quaternions *= signs[:, np.newaxis]
+        theta = np.arccos(np.clip(np.abs(dot), -1.0, 1.0))
+        sin_theta = np.sin(theta)
+        
+        self._times = times
+        self._quats = quaternions
+        self._theta = theta
+        # nearly identical rotations use linear interpolation
+        self._linear = sin_theta < 1e-10
+        self._sin_theta = np.where(self._linear, 1.0, sin_theta)
+        self._positions = positions[idx]
+        self._gaps = _find_gaps(times, max_gap)
+        
+        # the spline is evaluated in seconds from the first record
+        self._spline = CubicSpline((times - times[0]) * 86400.0, 
+                                   self._positions, axis=0)
+    
+    @property
+    def gaps(self):
+        """(list of (float, float)): The gaps in the records, in TJD"""
+        idx = np.flatnonzero(self._gaps)
+        return list(zip(self._times[idx], self._times[idx + 1]))
+
+    @property
+    def num_records(self):
+        """(int): The number of records"""
+        return self._times.size
+    
+    @property
+    def time_range(self):
+        """(float, float): The time range covered by the records, in TJD"""
+        return (self._times[0], self._times[-1])
+
+    def detector_angles(self, ra, dec, times, dets=None):
+        """The angles between a sky position and the detector normals.
+        
+        Args:
+            ra (float or np.array): The RA of the sky position(s)
+            dec (float or np.array): The Dec of the sky position(s)
+            times (float, np.array, or astropy.time.Time): The times
+            dets (list of int, str, or :class:`BatseDetectors`, optional):
+                The detectors.  If not set, uses all 16 detectors.
+        
+        Returns:
+            (np.array): The (N, num_dets) angles in degrees
+        """
+        vectors = self.to_spacecraft(ra, dec, times)
+        if dets is None:
+            return BatseDetectors.angles_to(vectors)
+        
+        nums = [_det_number(det) for det in dets]
+        det_vectors = BatseDetectors.unit_vectors()[nums]
+        cos_angle = np.clip(vectors @ det_vectors.T, -1.0, 1.0)
+        return np.rad2deg(np.arccos(cos_angle))
+
+    def earth_angular_radius(self, times):
+        """The apparent angular radius of the Earth from the spacecraft.
+        
+        Args:
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (np.array): The angular radius in degrees
+        """
+        dist = np.linalg.norm(self.position_at(times), axis=1)
+        return np.rad2deg(np.arcsin(np.clip(_R_EARTH_KM / dist, -1.0, 1.0)))
+
+    def frame_at(self, times):
+        """The spacecraft frame(s) at the requested times.
+        
+        Args:
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (:class:`~gdt.missions.cgro.frame.CgroFrame`)
+        """
+        times = self._check_times(times)
+        quats = self.quaternion_at(times)
+        pos = self.position_at(times)
+        return CgroFrame(quaternion=Quaternion(quats), 
+                         obstime=Time(times, format='cgro'),
+                         obsgeoloc=r.CartesianRepresentation(x=pos[:, 0], 
+                                                             y=pos[:, 1], 
+                                                             z=pos[:, 2],
+                                                             unit='km'),
+                         detectors=BatseDetectors)
+
+    def geocenter_angle(self, ra, dec, times):
+        """The angle between a sky position and the geocenter, as seen from
+        the spacecraft.  This is the geometric angle, which differs from the
+        GCRS separation by the aberration (up to about 20 arcseconds).
+        
+        Args:
+            ra (float or np.array): The RA of the sky position(s)
+            dec (float or np.array): The Dec of the sky position(s)
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (np.array): The angles in degrees
+        """
+        pos = self.position_at(times)
+        geo = -pos / np.linalg.norm(pos, axis=1)[:, np.newaxis]
+        src, geo = _broadcast(_radec_to_vectors(ra, dec), geo)
+        cos_angle = np.clip(np.einsum('ij,ij->i', geo, src), -1.0, 1.0)
+        return np.rad2deg(np.arccos(cos_angle))
+
+    def is_occulted(self, ra, dec, times):
+        """Determine if a sky position is occulted by the Earth.  As in 
+        :meth:`~gdt.core.coords.SpacecraftFrame.location_visible`, a position
+        is occulted if it is within the apparent angular radius of the Earth.
+        
+        Args:
+            ra (float or np.array): The RA of the sky position(s)
+            dec (float or np.array): The Dec of the sky position(s)
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (np.array(dtype=bool)): True where the position is occulted
+        """
+        times = self._check_times(times)
+        return self.geocenter_angle(ra, dec, times) <= \
+               self.earth_angular_radius(times)
+
+    def position_at(self, times):
+        """The interpolated spacecraft position at the requested times.
+        
+        Args:
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (np.array): The (N, 3) positions in km
+        """
+        times = self._check_times(times)
+        return self._spline((times - self._times[0]) * 86400.0)
+
+    def quaternion_at(self, times):
+        """The attitude quaternions at the requested times, interpolated by 
+        SLERP.
+        
+        Args:
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (np.array): The (N, 4) unit quaternions in (x, y, z, w) order
+        """
+        times = self._check_times(times)
+        idx = np.searchsorted(self._times, times, side='right') - 1
+        idx = np.clip(idx, 0, self._times.size - 2)
+        t0 = self._times[idx]
+        frac = (times - t0) / (self._times[idx + 1] - t0)
+        
+        theta = self._theta[idx]
+        w0 = np.sin((1.0 - frac) * theta) / self._sin_theta[idx]
+        w1 = np.sin(frac * theta) / self._sin_theta[idx]
+        linear = self._linear[idx]
+        if linear.any():
+            w0[linear] = 1.0 - frac[linear]
+            w1[linear] = frac[linear]
+        quats = w0[:, np.newaxis] * self._quats[idx] + \
+                w1[:, np.newaxis] * self._quats[idx + 1]
+        quats /= np.sqrt(np.einsum('ij,ij->i', quats, quats))[:, np.newaxis]
+        return quats
+
+    def to_spacecraft(self, ra, dec, times):
+        """The unit vectors of a sky position in the spacecraft frame.
+        
+        Args:
+            ra (float or np.array): The RA of the sky position(s)
+            dec (float or np.array): The Dec of the sky position(s)
+            times (float, np.array, or astropy.time.Time): The times
+        
+        Returns:
+            (np.array): The (N, 3) unit vectors
+        """
+        quats = self.quaternion_at(times)
+        src, quats = _broadcast(_radec_to_vectors(ra, dec), quats)
+        return _rotate_inverse(quats, src)
+
+    @classmethod
+    def from_phaii(cls, phaii_multi, max_gap=None):
+        """Create the interpolator from the records of a BATSE CONT or DISCLA
+        file.
+        
+        Args:
+            phaii_multi (:class:`~gdt.missions.cgro.batse.phaii.BatsePhaiiMulti`):
+                The continuous data containing the attitude and position 
+                records
+            max_gap (float, optional): 
+                The longest interval between records, in seconds, that is 
+                interpolated.  If not set, intervals longer than 10 times the 
+                median interval are gaps.
+        
+        Returns:
+            (:class:`BatseAttitudeInterpolator`)
+        """
+        return cls(*phaii_multi._attitude_records(), max_gap=max_gap)
+
+    def _check_times(self, times):
+        """Convert the times to a TJD array and check they are covered by the 
+        records and are not within a gap.
+        """
+        if isinstance(times, Time):
+            times = times.cgro
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        if times.ndim != 1:
+            raise ValueError('times must be a scalar or 1D array')
+        if times.size > 0:
+            if (times.min() < self._times[0]) or \
+               (times.max() > self._times[-1]):
+                raise ValueError('times must be within the time range of ' \
+                                 'the records: {}'.format(self.time_range))
+            idx = np.searchsorted(self._times, times, side='right') - 1
+            idx = np.clip(idx, 0, self._times.size - 2)
+            in_gap = self._gaps[idx] & (times > self._times[idx]) & \
+                     (times < self._times[idx + 1])
+            if in_gap.any():
+                raise ValueError('times must not be within a gap in the ' \
+                                 'records: {}'.format(self.gaps))
+        return times
+
+    def __repr__(self):
+        return '<BatseAttitudeInterpolator: {0} records; ' \
+               'TJD {1:.6f}-{2:.6f}>'.format(self.num_records, 
+                                             *self.time_range)
+
+
+def _broadcast(vectors1, vectors2):
+    """Broadcast two (N, M) arrays to the same number of rows, where N may be
+    1 for either array.
+    """
+    num = max(vectors1.shape[0], vectors2.shape[0])
+    if (vectors1.shape[0] not in (1, num)) or \
+       (vectors2.shape[0] not in (1, num)):
+        raise ValueError('The number of sky positions and the number of ' \
+                         'times must be equal, or one of them must be 1')
+    return (np.broadcast_to(vectors1, (num, vectors1.shape[1])),
+            np.broadcast_to(vectors2, (num, vectors2.shape[1])))
+
+
+def _find_gaps(times, max_gap=None):
+    """A mask of the intervals between consecutive records that are gaps in 
+    the records.
+    
+    Args:
+        times (np.array): The sorted times of the records in TJD
+        max_gap (float, optional): The longest interval that is not a gap, in 
+                                   seconds.  If not set, 10 times the median 
+                                   interval.
+    
+    Returns:
+        (np.array(dtype=bool)): True for each interval that is a gap
+    """
+    intervals = np.diff(times) * 86400.0
+    if intervals.size == 0:
+        return np.zeros(0, dtype=bool)
+    if max_gap is None:
+        max_gap = _GAP_FACTOR * np.median(intervals)
+    return intervals > max_gap
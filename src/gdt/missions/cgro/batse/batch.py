@@ -0,0 +1,600 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import gzip
+import os
+import pickle
+import re
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+import numpy as np
+from astropy.io.fits import Card
+
+from ..time import day_time_to_cgro
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError: # Windows does not track shared memory
+    resource_tracker = None
+
+__all__ = ['BatchResult', 'iter_batch', 'load_batch', 'scan_headers']
+
+# arrays at least this many bytes are returned through shared memory
+_SHM_THRESHOLD = 1048576
+
+# the FITS block and card sizes
+_BLOCK_SIZE = 2880
+_CARD_SIZE = 80
+
+# the keywords read by scan_headers() and the fields they are stored in
+_scan_keywords = {'FILETYPE': 'filetype', 'BATSE_TR': 'trigger', 
+                  'DET_MODE': 'det_mode', 'DSELECT': 'dselect',
+                  'STRT-DAY': 'strt_day', 'STRT-TIM': 'strt_tim', 
+                  'END-DAY': 'end_day', 'END-TIM': 'end_tim',
+                  'TRIG-DAY': 'trig_day', 'TRIG-TIM': 'trig_tim'}
+# a quoted string value of a keyword card
+_string_re = re.compile(r"'((?:[^']|'')*)'")
+# the keywords that define the size of the data following a header
+_size_keywords = ('BITPIX', 'NAXIS', 'PCOUNT', 'GCOUNT', 'EXTNAME')
+
+# the fields of the scan_headers() record array, other than the path, and the
+# values used when a keyword is not found
+_scan_fields = [('filetype', 'U16', ''), ('trigger', 'i4', -1), 
+                ('det_mode', 'U8', ''), ('dselect', 'U8', ''),
+                ('strt_day', 'f8', np.nan), ('strt_tim', 'f8', np.nan), 
+                ('end_day', 'f8', np.nan), ('end_tim', 'f8', np.nan),
+                ('trig_day', 'f8', np.nan), ('trig_tim', 'f8', np.nan),
+                ('tstart', 'f8', np.nan), ('tstop', 'f8', np.nan), 
+                ('trigtime', 'f8', np.nan)]
+
+class BatchResult():
+    """The result of applying a function to one file in a batch.
+    
+    Parameters:
+        index (int): The index of the file in the batch
+        path (str): The file path
+        value (object, optional): The value returned by the function
+        error (Exception, optional): The exception raised by the function
+        tb (str, optional): The formatted traceback of the exception
+    """
+    def __init__(self, index, path, value=None, error=None, tb=None):
+        self._index = index
+        self._path = path
+        self._value = value
+        self._error = error
+        self._tb = tb
+    
+    @property
+    def error(self):
+        """(Exception): The exception raised while processing the file, or 
+        None if the file was processed successfully"""
+        return self._error
+    
+    @property
+    def index(self):
+        """(int): The index of the file in the batch"""
+        return self._index
+    
+    @property
+    def ok(self):
+        """(bool): True if the file was processed successfully"""
+        return self._error is None
+    
+    @property
+    def path(self):
+        """(str): The file path"""
+        return self._path
+    
+    @property
+    def traceback(self):
+        """(str): The formatted traceback of the exception, or None if the file 
+        was processed successfully"""
+        return self._tb
+    
+    @property
+    def value(self):
+        """(object): The value returned by the function, or None if the file 
+        was not processed successfully"""
+        return self._value
+
+    def __repr__(self):
+        if self.ok:
+            status = 'ok'
+        else:
+            status = '{}: {}'.format(type(self._error).__name__, self._error)
+        return '<BatchResult {0}: {1}; {2}>'.format(self._index, 
+                                                    os.path.basename(
+                                                    str(self._path)), status)
+
+
+def iter_batch(paths, func, num_workers=None, ordered=False, 
+               shm_threshold=_SHM_THRESHOLD):
+    """Apply a function to each file in a batch on a pool of processes, 
+    yielding a :class:`BatchResult` for each file.  An exception raised while
+    processing a file is captured in its result rather than stopping the 
+    batch.
+    
+    The function is called as ``func(path)`` and must be picklable, for 
+    example a module-level function or a class method such as 
+    ``BatsePhaiiTrigger.open``.  Any numpy array in the returned value, or 
+    directly contained in a returned dict, list, or tuple, that is at least
+    ``shm_threshold`` bytes is passed back through shared memory instead of 
+    being pickled.  All other values are pickled.
+    
+    Only a limited number of files are in progress at any one time, so 
+    results that are not yet consumed do not accumulate in memory.
+    
+    Args:
+        paths (list of str): The file paths
+        func (<function>): The function to apply to each file
+        num_workers (int, optional): The number of worker processes. If None,
+                                     uses the number of CPUs.  If 0, the files
+                                     are processed serially in this process.
+        ordered (bool, optional): If True, yield the results in the order of
+                                  ``paths``, otherwise yield them as they 
+                                  complete. Default is False.
+        shm_threshold (int, optional): The minimum size in bytes of an array
+                                       returned through shared memory. If 
+                                       None, all values are pickled. 
+                                       Default is 1 MB.
+    
+    Yields:
+        (:class:`BatchResult`)
+    """
+    if not callable(func):
+        raise TypeError('func must be callable')
+    if num_workers is not None:
+        if num_workers < 0:
+            raise ValueError('num_workers must be non-negative')
+        num_workers = int(num_workers)
+    if shm_threshold is not None:
+        shm_threshold = max(int(shm_threshold), 1)
+    
+    paths = list(paths)
+    if num_workers == 0:
+        for i, path in enumerate(paths):
+            yield _apply(func, i, path, None)
+        return
+    
+    # the worker processes must share our resource tracker so that the 
+    # shared memory blocks are not removed when a worker exits
+    if shm_threshold is not None and resource_tracker is not None:
+        resource_tracker.ensure_running()
+    
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, max(len(paths), 1))
+    max_pending = 2 * num_workers
+    
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        todo = iter(enumerate(paths))
+        pending = deque() if ordered else set()
+        
+        def submit():
+            for i, path in todo:
+                future = executor.submit(_apply, func, i, path, shm_threshold)
+                future.batch_index = i
+                future.batch_path = path
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+                if len(pending) >= max_pending:
+                    break
+        
+        try:
+            submit()
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                    wait(done)
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    pending.difference_update(done)
+                    done = sorted(done, key=lambda f: f.batch_index)
+                submit()
+                for future in done:
+                    yield _collect(future)
+        finally:
+            # if we stop early, release the shared memory of the files that 
+            # have been processed but not consumed
+            for future in pending:
+                if not future.cancel():
+                    _discard(future)
+
+
+def load_batch(paths, func, num_workers=None, shm_threshold=_SHM_THRESHOLD):
+    """Apply a function to each file in a batch on a pool of processes, and 
+    return the results in the order of ``paths``.  See :func:`iter_batch` 
+    for the details.
+    
+    Args:
+        paths (list of str): The file paths
+        func (<function>): The function to apply to each file
+        num_workers (int, optional): The number of worker processes. If None,
+                                     uses the number of CPUs.  If 0, the files
+                                     are processed serially in this process.
+        shm_threshold (int, optional): The minimum size in bytes of an array
+                                       returned through shared memory. If 
+                                       None, all values are pickled. 
+                                       Default is 1 MB.
+    
+    Returns:
+        (list of :class:`BatchResult`)
+    """
+    return list(iter_batch(paths, func, num_workers=num_workers, ordered=True,
+                           shm_threshold=shm_threshold))
+
+
+def scan_headers(paths, num_workers=None, errors='raise'):
+    """Read the key metadata of a batch of BATSE FITS files from their 
+    headers alone, without reading the data tables.
+    
+    Only the header blocks are read.  The headers are read up to and 
+    including the first extension after the energy calibration (e.g. the 
+    count spectra, photon list, or DRM extension), and only the energy 
+    calibration data are skipped over to reach it, so a gzipped file is only 
+    decompressed as far as that header.  The files are scanned in parallel on 
+    a pool of processes.
+    
+    The metadata are returned as a record array with one record per file, in 
+    the order of ``paths``, with the fields:
+    
+        * ``path`` - The file path
+        * ``filetype`` - The FILETYPE keyword
+        * ``trigger`` - The BATSE trigger number (BATSE_TR keyword)
+        * ``det_mode`` - The detector mode (DET_MODE keyword)
+        * ``dselect`` - The detectors selected (DSELECT keyword)
+        * ``strt_day``, ``strt_tim``, ``end_day``, ``end_tim``, 
+          ``trig_day``, ``trig_tim`` - The STRT-DAY, STRT-TIM, END-DAY, 
+          END-TIM, TRIG-DAY, and TRIG-TIM keywords
+        * ``tstart``, ``tstop``, ``trigtime`` - The start, stop, and trigger
+          times in CGRO mission time (TJD)
+    
+    A keyword that is not in the file is set to an empty string, -1 for the
+    trigger number, or NaN for the times.  The CGRO mission times are also NaN
+    if the corresponding day is zero.
+    
+    Args:
+        paths (list of str): The file paths
+        num_workers (int, optional): The number of worker processes. If None,
+                                     uses the number of CPUs.  If 0, the files
+                                     are scanned serially in this process.
+        errors (str, optional): If 'raise', an error reading any of the files
+                                is raised.  If 'ignore', the record of a file
+                                that could not be read contains only the path.
+                                Default is 'raise'.
+    
+    Returns:
+        (np.recarray)
+    """
+    if errors not in ('raise', 'ignore'):
+        raise ValueError("errors must be either 'raise' or 'ignore'")
+    if num_workers is not None:
+        if num_workers < 0:
+            raise ValueError('num_workers must be non-negative')
+        num_workers = int(num_workers)
+    
+    paths = [str(path) for path in paths]
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(paths))
+    
+    if num_workers == 0:
+        scans = [_scan_file(path) for path in paths]
+    else:
+        # the files are sent to the workers in chunks, because scanning a 
+        # single file is too quick to be worth a round trip to a worker
+        chunksize = max(1, min(64, len(paths) // (4 * num_workers)))
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            scans = list(executor.map(_scan_file, paths, chunksize=chunksize))
+    
+    path_len = max([len(path) for path in paths], default=1)
+    dtype = [('path', 'U{}'.format(path_len))] + \
+            [(name, fmt) for name, fmt, _ in _scan_fields]
+    arr = np.recarray(len(paths), dtype=dtype)
+    arr['path'] = paths
+    for name, _, missing in _scan_fields:
+        arr[name] = missing
+    
+    for i, (values, error) in enumerate(scans):
+        if error is not None:
+            if errors == 'raise':
+                raise RuntimeError('Could not read the headers of ' \
+                                   '{0}: {1}'.format(paths[i], error))
+            continue
+        for key, value in values.items():
+            arr[_scan_keywords[key]][i] = value
+    
+    arr['tstart'] = _to_cgro(arr['strt_day'], arr['strt_tim'])
+    arr['tstop'] = _to_cgro(arr['end_day'], arr['end_tim'])
+    arr['trigtime'] = _to_cgro(arr['trig_day'], arr['trig_tim'])
+    return arr
+
+
+class _SharedArray():
+    """Reference to an array stored in a shared memory block"""
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _apply(func, index, path, shm_threshold):
+    """Apply the function to a file, capturing any exception.  If 
+    ``shm_threshold`` is not None, large arrays are moved to shared memory.
+    """
+    try:
+        value = func(path)
+        if shm_threshold is not None:
+            value = _export(value, shm_threshold)
+        return BatchResult(index, path, value=value)
+    except Exception as err:
+        tb = traceback.format_exc()
+        # the exception is sent back to the parent, so it must be picklable
+        try:
+            pickle.loads(pickle.dumps(err))
+        except Exception:
+            err = RuntimeError('{}: {}'.format(type(err).__name__, err))
+        return BatchResult(index, path, error=err, tb=tb)
+
+
+def _collect(future):
+    """Retrieve the result of a future, moving any arrays out of shared 
+    memory.  A failure of the worker process is captured in the result.
+    """
+    try:
+        result = future.result()
+    except Exception as err:
+        return BatchResult(future.batch_index, future.batch_path, error=err,
+                           tb=traceback.format_exc())
+    try:
+        result._value = _import(result.value)
+    except Exception as err:
+        _release(result.value)
+        return BatchResult(future.batch_index, future.batch_path, error=err,
+                           tb=traceback.format_exc())
+    return result
+
+
+def _discard(future):
+    """Wait for a future that will not be consumed and remove any shared 
+    memory blocks in its result.
+    """
+    try:
+        result = future.result()
+    except Exception:
+        return
+    _release(result.value)
+
+
+def _export(value, shm_threshold):
+    """Copy large arrays in the value to shared memory and replace them with
+    a reference.
+    """
+    if type(value) is np.ndarray and not value.dtype.hasobject and \
+       value.nbytes >= shm_threshold:
+        shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+        try:
+            shared = np.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf)
+            shared[...] = value
+            del shared
+        except:
+            shm.close()
+            shm.unlink()
+            raise
+        shm.close()
+        return _SharedArray(shm.name, value.shape, value.dtype)
+    
+    elif type(value) is dict:
+        exported = {}
+        try:
+            for key, val in value.items():
+                exported[key] = _export(val, shm_threshold)
+        except:
+            _release(exported)
+            raise
+        return exported
+    
+    elif type(value) in (list, tuple):
+        exported = []
+        try:
+            for val in value:
+                exported.append(_export(val, shm_threshold))
+        except:
+            _release(exported)
+            raise
+        return type(value)(exported)
+    
+    return value
+
+
+def _import(value):
+    """Copy the arrays referenced in the value out of shared memory and 
+    remove the shared memory blocks.
+    """
+    if isinstance(value, _SharedArray):
+        shm = shared_memory.SharedMemory(name=value.name)
+        try:
+            shared = np.ndarray(value.shape, dtype=value.dtype, 
+                                buffer=shm.buf)
+            arr = shared.copy()
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+        return arr
+    elif type(value) is dict:
+        return {key: _import(val) for key, val in value.items()}
+    elif type(value) in (list, tuple):
+        return type(value)([_import(val) for val in value])
+    return value
+
+
+def _release(value):
+    """Remove the shared memory blocks referenced in the value"""
+    if isinstance(value, _SharedArray):
+        try:
+            shm = shared_memory.SharedMemory(name=value.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+    elif type(value) is dict:
+        for val in value.values():
+            _release(val)
+    elif type(value) in (list, tuple):
+        for val in value:
+            _release(val)
+
+
+def _read_header(fobj):
+    """Read the next header from a file, returning the values of the scan and
+    size keywords and whether the end of the file was reached.
+    """
+    values = {}
+    while True:
+        block = fobj.read(_BLOCK_SIZE)
+        if len(block) < _BLOCK_SIZE:
+            return values, True
+        for i in range(0, _BLOCK_SIZE, _CARD_SIZE):
+            card = block[i:i+_CARD_SIZE]
+            key = card[:8].rstrip().decode('ascii', errors='replace')
+            if key == 'END':
+                return values, False
+            if key in values:
+                continue
+            if key in _scan_keywords or key in _size_keywords or \
+               (key.startswith('NAXIS') and key[5:].isdigit()):
+                values[key] = _card_value(card)
+
+
+def _card_value(card):
+    """Parse the value of a keyword card.  Only the common fixed-format values
+    are parsed here, because astropy's card parsing is comparatively slow; 
+    any other value is parsed by astropy.
+    """
+    if card[8:10] == b'= ':
+        text = card[10:].decode('ascii').strip()
+        if text.startswith("'"):
+            match = _string_re.match(text)
+            if match is not None:
+                return match.group(1).replace("''", "'").strip()
+        else:
+            text = text.split('/', 1)[0].strip()
+            if text == 'T':
+                return True
+            if text == 'F':
+                return False
+            try:
+                return int(text)
+            except ValueError:
+                pass
+            try:
+                return float(text.replace('D', 'E'))
+            except ValueError:
+                pass
+    
+    value = Card.fromstring(card.decode('ascii')).value
+    if isinstance(value, str):
+        value = value.strip()
+    return value
+
+
+def _data_size(values):
+    """The size of the data following a header, padded to the FITS block 
+    size.
+    """
+    naxis = values.get('NAXIS', 0)
+    if naxis == 0:
+        return 0
+    num = 1
+    for i in range(1, naxis+1):
+        num *= values.get('NAXIS{}'.format(i), 0)
+    size = abs(values.get('BITPIX', 8)) // 8 * values.get('GCOUNT', 1) * \
+           (values.get('PCOUNT', 0) + num)
+    return -(-size // _BLOCK_SIZE) * _BLOCK_SIZE
+
+
+def _scan_file(path):
+    """Read the scan keywords from the headers of a file.  Returns the 
+    keyword values and an error message, which is None if the file was read 
+    successfully.
+    """
+    try:
+        with open(path, 'rb') as fobj:
+            compressed = fobj.read(2) == b'\x1f\x8b'
+        opener = gzip.open if compressed else open
+        
+        found = {}
+        with opener(path, 'rb') as fobj:
+            hdu_num = 0
+            while True:
+                values, eof = _read_header(fobj)
+                if eof:
+                    if hdu_num == 0:
+                        raise OSError('No FITS header found')
+                    break
+                for key in _scan_keywords:
+                    if key in values and key not in found:
+                        found[key] = values[key]
+                
+                # stop at the first extension after the energy calibration
+                if hdu_num > 0 and values.get('EXTNAME') != 'BATSE_E_CALIB':
+                    break
+                fobj.seek(_data_size(values), 1)
+                hdu_num += 1
+        return found, None
+    except Exception as err:
+        return {}, '{}: {}'.format(type(err).__name__, err)
+
+
+def _to_cgro(days, secs):
+    """Convert BATSE day and time arrays to CGRO mission time.  Records with
+    a missing day or time are set to NaN.
+    """
+    tjd = np.full(days.shape, np.nan)
+    mask = np.isfinite(days) & np.isfinite(secs) & (days > 0.0)
+    if mask.any():
+        tjd[mask] = day_time_to_cgro(days[mask], secs[mask])
+    return tjd
+
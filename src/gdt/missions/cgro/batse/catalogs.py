@@ -38,54 +38,677 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import hashlib
 import os
+import warnings
+
+import numpy as np
+from astropy.io import fits
+from astropy.time import Time
+from scipy.spatial import cKDTree
 
 from gdt.core import cache_path
 from gdt.core.heasarc import BrowseCatalog
 
-__all__ = ['BatseGrbCatalog', 'BatseGrb4bCatalog', 'BatseSpectralCatalog',
-           'BatseBrightSpectralCatalog', 'BatseEarthOccultationCatalog',
-           'BatsePulsarCatalog', 'BatseTriggerCatalog']
+try:
+    # the string arrays returned by astropy FITS tables
+    from astropy.utils.compat.numpycompat import chararray as _chararray
+except ImportError:
+    _chararray = np.char.chararray
+
+__all__ = ['BatseCatalog', 'BatseCatalogJoin', 'BatseGrbCatalog', 'BatseGrb4bCatalog', 
+           'BatseSpectralCatalog', 'BatseBrightSpectralCatalog', 
+           'BatseEarthOccultationCatalog', 'BatsePulsarCatalog', 
+           'BatseTriggerCatalog']
 
 batse_cache_path = os.path.join(cache_path, 'batse')
 
-class BatseGrbCatalog(BrowseCatalog):
+class BatseCatalog(BrowseCatalog):
+    """Base class for the BATSE catalogs, which adds a local columnar cache
+    and indexed queries to :class:`~gdt.core.heasarc.BrowseCatalog`.
+    
+    The catalog is stored in the cache directory as a NumPy ``.npz`` file 
+    with one typed array per column, next to the FITS file retrieved from 
+    HEASARC, and is read from the ``.npz`` file whenever it is up to date.
+    If HEASARC cannot be reached, the catalog is read from the cache with a 
+    warning instead of raising an error.
+    
+    Lookups by trigger number and time use sorted indexes, and positional 
+    searches use a k-d tree of the source directions.  The indexes are built 
+    the first time they are used.
+    
+    Parameters:
+        cache_path (str): The path where the cached catalog will live.
+        table (str, optional): The name of the HEASARC table
+        verbose (bool, optional): Default is True
+        cached (bool, optional): Set to True to read from the cached file
+                                 instead of querying HEASARC. Default is False.
+    """
+    # the candidate names of the indexed columns, in order of preference
+    _trigger_columns = ('TRIGGER_NUM', 'TRIGGER_ID', 'TRIGGER')
+    _time_columns = ('TRIGGER_TIME', 'TIME', 'START_TIME')
+    _ra_column = 'RA'
+    _dec_column = 'DEC'
+
+    def __init__(self, cache_path, table=None, verbose=True, cached=False):
+        self._indexes = {}
+        try:
+            super().__init__(cache_path, table=table, verbose=verbose, 
+                             cached=cached)
+        except OSError as err:
+            if cached or not self._cache_exists():
+                raise
+            warnings.warn('Could not retrieve {0} from HEASARC ({1}). Using '\
+                          'the local cache.'.format(self._table, err))
+            self._header, self._data = self._read_cache()
+
+    @property
+    def time_column(self):
+        """(str): The name of the column used for time lookups, or None"""
+        return self._find_column(self._time_columns)
+    
+    @property
+    def trigger_column(self):
+        """(str): The name of the column used for trigger number lookups, or 
+        None"""
+        return self._find_column(self._trigger_columns)
+
+    def cone_search(self, ra, dec, radius):
+        """Select the rows within a radius of a position.  Returns a new 
+        catalog object.
+        
+        Args:
+            ra (float): The right ascension, in degrees
+            dec (float): The declination, in degrees
+            radius (float): The search radius, in degrees
+        
+        Returns:
+            (:class:`BatseCatalog`)
+        """
+        _, rows, _ = self.cross_match(ra, dec, radius)
+        return self._subset(np.sort(rows))
+    
+    def cross_match(self, ra, dec, radius):
+        """Find all of the rows within a radius of each of a set of positions.
+        
+        Args:
+            ra (float or np.array): The right ascension, in degrees
+            dec (float or np.array): The declination, in degrees
+            radius (float): The match radius, in degrees
+        
+        Returns:
+            (np.array, np.array, np.array): The index of the position, the \
+            index of the catalog row, and the separation in degrees of each \
+            match
+        """
+        tree, rows = self._position_index()
+        vectors = _radec_to_vectors(ra, dec).reshape(-1, 3)
+        # the k-d tree is searched with the chord length of the radius
+        chord = 2.0 * np.sin(np.deg2rad(min(float(radius), 180.0)) / 2.0)
+        matches = tree.query_ball_point(vectors, chord + 1e-12)
+        
+        num_matches = np.array([len(match) for match in matches], dtype=int)
+        positions = np.repeat(np.arange(vectors.shape[0]), num_matches)
+        if positions.size:
+            points = np.concatenate([np.asarray(match, dtype=int) 
+                                     for match in matches])
+        else:
+            points = np.array([], dtype=int)
+        
+        chords = np.linalg.norm(tree.data[points] - vectors[positions], 
+                                axis=1)
+        separations = np.rad2deg(2.0 * np.arcsin(np.clip(chords / 2.0, 
+                                                         0.0, 1.0)))
+        mask = separations <= radius
+        return positions[mask], rows[points[mask]], separations[mask]
+
+    def select_triggers(self, tnums):
+        """Select the rows for a set of trigger numbers.  Returns a new 
+        catalog object with the rows in order of trigger number.
+        
+        Args:
+            tnums (int, str, or list): The trigger number(s)
+        
+        Returns:
+            (:class:`BatseCatalog`)
+        """
+        keys, order = self._sorted_index('trigger')
+        tnums = np.unique(np.atleast_1d(tnums).astype(float).astype(int))
+        sorted_keys = keys[order]
+        lo = np.searchsorted(sorted_keys, tnums, side='left')
+        hi = np.searchsorted(sorted_keys, tnums, side='right')
+        rows = np.concatenate([order[i:j] for i, j in zip(lo, hi)] + 
+                              [np.array([], dtype=int)])
+        return self._subset(rows)
+
+    def slice(self, column, lo=None, hi=None):
+        """Perform row slices of the data table based on a conditional of a
+        single column. Returns a new catalog object.
+
+        Args:
+            column (str): The column name
+            lo (optional): The minimum (inclusive) value of the slice. If not
+                           set, uses the lowest range of the data in the column.
+            hi (optional): The maximum (inclusive) value of the slice. If not
+                           set, uses the highest range of the data in the column.
+
+        Returns:
+            (:class:`BatseCatalog`)
+        """
+        col = self._data[column]
+        if lo is None:
+            lo, _ = self.column_range(column)
+        if hi is None:
+            _, hi = self.column_range(column)
+        return self._subset((col >= lo) & (col <= hi))
+    
+    def time_slice(self, tstart, tstop):
+        """Select the rows within a time range.  Returns a new catalog object
+        with the rows in order of time.
+        
+        Args:
+            tstart (float or astropy.time.Time): The start of the range, 
+                                                 in MJD if a float
+            tstop (float or astropy.time.Time): The end of the range,
+                                                in MJD if a float
+        
+        Returns:
+            (:class:`BatseCatalog`)
+        """
+        if isinstance(tstart, Time):
+            tstart = tstart.mjd
+        if isinstance(tstop, Time):
+            tstop = tstop.mjd
+        keys, order = self._sorted_index('time')
+        sorted_keys = keys[order]
+        lo = np.searchsorted(sorted_keys, tstart, side='left')
+        hi = np.searchsorted(sorted_keys, tstop, side='right')
+        return self._subset(order[lo:hi])
+
+    def _cache_exists(self):
+        """True if the catalog has a cached file"""
+        return os.path.exists(self._cache_file('.npz')) or \
+               os.path.exists(self._cache_file('.fit'))
+
+    def _cache_file(self, extension):
+        return os.path.join(self._cache_path, self._table + extension)
+    
+    def _find_column(self, candidates):
+        """The first of the candidate column names in the catalog"""
+        columns = [column.upper() for column in self.columns]
+        for candidate in candidates:
+            if candidate in columns:
+                return self.columns[columns.index(candidate)]
+        return None
+
+    def _position_index(self):
+        """The k-d tree of the source directions and the rows of its points"""
+        if 'position' not in self._indexes:
+            ra = _to_float(self._data[self._ra_column])
+            dec = _to_float(self._data[self._dec_column])
+            rows = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+            vectors = _radec_to_vectors(ra[rows], dec[rows]).reshape(-1, 3)
+            self._indexes['position'] = (cKDTree(vectors), rows)
+        return self._indexes['position']
+
+    def _read_cache(self):
+        """Read the cached catalog, from the columnar file if it is up to 
+        date, otherwise from the FITS file, which is then written to the 
+        columnar file.  Columns are read from the columnar file when they are
+        first used."""
+        fit_file = self._cache_file('.fit')
+        npz_file = self._cache_file('.npz')
+        if os.path.exists(npz_file) and (not os.path.exists(fit_file) or \
+           os.path.getmtime(npz_file) >= os.path.getmtime(fit_file)):
+            source = _NpzColumns(npz_file)
+            return source.header, _ColumnTable(source)
+        
+        header, fits_data = super()._read_cache()
+        columns = {name: np.asarray(fits_data[name]) 
+                   for name in fits_data.dtype.names}
+        
+        # write to a temporary file so that an interrupted write is not 
+        # mistaken for the cache
+        names = list(columns.keys())
+        arrays = {'col_' + str(i): columns[name] 
+                  for i, name in enumerate(names)}
+        tmp_file = npz_file + '.tmp.npz'
+        np.savez(tmp_file, header=np.array(header.tostring()), 
+                 names=np.array(names, dtype=str), 
+                 dtypes=np.array([columns[name].dtype.str for name in names]),
+                 num_rows=np.array(len(fits_data)), **arrays)
+        os.replace(tmp_file, npz_file)
+        return header, _ColumnTable(_DictColumns(columns))
+
+    def _sorted_index(self, name):
+        """The typed keys and sorted order of the trigger or time column"""
+        if name not in self._indexes:
+            if name == 'trigger':
+                column = self.trigger_column
+            else:
+                column = self.time_column
+            if column is None:
+                raise ValueError('{0} has no {1} column'.format(
+                                 self.__class__.__name__, name))
+            keys = _to_float(self._data[column])
+            if name == 'trigger':
+                keys[~np.isfinite(keys)] = -1.0
+                keys = keys.astype(int)
+            order = np.argsort(keys, kind='stable')
+            self._indexes[name] = (keys, order)
+        return self._indexes[name]
+
+    def _subset(self, rows):
+        """A new catalog object with a selection of the rows"""
+        obj = type(self).__new__(type(self))
+        obj.__dict__.update(self.__dict__)
+        obj._data = self._data[rows]
+        obj._indexes = {}
+        return obj
+
+
+class BatseCatalogJoin():
+    """A join of BATSE catalogs on trigger number.
+    
+    The join is computed once from the sorted trigger number indexes of the 
+    catalogs, as the row of each catalog for every row of the join, and is 
+    saved in the cache directory, along with the indexes, so that it is 
+    reused for as long as the trigger numbers of the catalogs do not change.
+    Joins of different selections of rows, such as a sliced catalog, are 
+    saved separately.  The joined table itself is
+    never built: :meth:`get_table` only reads the requested columns from each
+    catalog, and filters are evaluated on the rows of each catalog before 
+    they are mapped to the join.
+    
+    A catalog with several rows for a trigger, such as the time-resolved 
+    spectral catalog, contributes one row of the join for each of them.  
+    Columns are named by the column name if it is unique among the catalogs,
+    otherwise by ``'<table>.<column>'``, where ``<table>`` is the HEASARC 
+    table name of the catalog, e.g. ``'batse4b.T90'``.
+    
+    Parameters:
+        catalogs (list of :class:`BatseCatalog`): The catalogs to join
+        how (str, optional): 'inner' to only keep the triggers found in all
+                             of the catalogs, or 'left' to keep all triggers
+                             of the first catalog. Default is 'inner'.
+        cache_path (str, optional): The directory where the join is saved. 
+                                    Default is the cache directory of the 
+                                    first catalog.
+        save (bool, optional): If True, the join is saved and reused. 
+                               Default is True.
+    """
+    def __init__(self, catalogs, how='inner', cache_path=None, save=True):
+        if len(catalogs) < 2:
+            raise ValueError('At least two catalogs are required')
+        if how not in ('inner', 'left'):
+            raise ValueError("how must be either 'inner' or 'left'")
+        tables = [catalog._table for catalog in catalogs]
+        if len(set(tables)) != len(tables):
+            raise ValueError('The catalogs must be different tables')
+        
+        self._catalogs = list(catalogs)
+        self._how = how
+        if cache_path is None:
+            cache_path = self._catalogs[0]._cache_path
+        self._cache_path = cache_path if save else None
+        self._keys, self._rows = self._load_join()
+
+    @property
+    def catalogs(self):
+        """(list of :class:`BatseCatalog`): The joined catalogs"""
+        return list(self._catalogs)
+
+    @property
+    def columns(self):
+        """(list of str): The names of the columns available in the join"""
+        return list(self._column_map().keys())
+
+    @property
+    def how(self):
+        """(str): The type of join"""
+        return self._how
+
+    @property
+    def num_rows(self):
+        """(int): The number of rows in the join"""
+        return self._keys.size
+    
+    @property
+    def trigger_numbers(self):
+        """(np.array): The trigger number of each row of the join"""
+        return self._keys.copy()
+
+    def get_table(self, columns, filters=None):
+        """Return joined columns as a numpy record array, in order of trigger
+        number.  For a left join, the missing values are NaN for floats, -1 
+        for integers, and empty for strings.
+        
+        Args:
+            columns (list of str): The columns to return
+            filters (list of tuples, optional):
+                A list of tuples, where each tuple is (column, lo, hi) and 
+                selects the rows with values of the column between 'lo' and 
+                'hi' (inclusive).  If no low or high bounding is desired, set 
+                to None.  See :meth:`BatseCatalog.slice()`.
+        
+        Returns:
+            (np.recarray)
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        
+        select = np.ones(self.num_rows, dtype=bool)
+        for column, lo, hi in (filters if filters is not None else []):
+            i, name = self._resolve(column)
+            # the filter is evaluated on the rows of the catalog
+            values = self._catalogs[i]._data[name]
+            mask = np.ones(values.shape[0], dtype=bool)
+            if lo is not None:
+                mask &= (values >= lo)
+            if hi is not None:
+                mask &= (values <= hi)
+            rows = self._rows[i]
+            if mask.size == 0:
+                select[:] = False
+                continue
+            select &= (rows >= 0) & mask[np.maximum(rows, 0)]
+        
+        arrays = []
+        for column in columns:
+            i, name = self._resolve(column)
+            arrays.append(_take(self._catalogs[i]._data[name], 
+                                self._rows[i][select]))
+        return np.rec.fromarrays(arrays, names=list(columns))
+    
+    def rows(self, catalog):
+        """The row of a catalog for each row of the join, or -1 if the 
+        trigger is not in the catalog.
+        
+        Args:
+            catalog (int or :class:`BatseCatalog`): The catalog or its index
+        
+        Returns:
+            (np.array)
+        """
+        if not isinstance(catalog, (int, np.integer)):
+            catalog = self._catalogs.index(catalog)
+        return self._rows[catalog].copy()
+    
+    def _column_map(self):
+        """The catalog index and column name of each column name of the 
+        join"""
+        counts = {}
+        for catalog in self._catalogs:
+            for name in catalog.columns:
+                counts[name] = counts.get(name, 0) + 1
+        columns = {}
+        for i, catalog in enumerate(self._catalogs):
+            for name in catalog.columns:
+                if counts[name] == 1:
+                    columns[name] = (i, name)
+                else:
+                    columns['{0}.{1}'.format(catalog._table, name)] = (i, name)
+        return columns
+
+    def _compute_join(self):
+        """Join the sorted trigger number indexes of the catalogs"""
+        keys, order = self._catalogs[0]._sorted_index('trigger')
+        order = order[keys[order] >= 0]
+        join_keys = keys[order]
+        join_rows = [order]
+        
+        for catalog in self._catalogs[1:]:
+            keys, order = catalog._sorted_index('trigger')
+            sorted_keys = keys[order]
+            lo = np.searchsorted(sorted_keys, join_keys, side='left')
+            counts = np.searchsorted(sorted_keys, join_keys, side='right') - lo
+            if self._how == 'left':
+                num = np.maximum(counts, 1)
+            else:
+                num = counts
+            
+            # expand each row of the join by its number of matches
+            expand = np.repeat(np.arange(join_keys.size), num)
+            offsets = np.arange(expand.size) - np.repeat(np.cumsum(num) - num,
+                                                         num)
+            positions = np.repeat(lo, num) + offsets
+            found = np.repeat(counts, num) > 0
+            rows = np.full(expand.size, -1, dtype=int)
+            rows[found] = order[positions[found]]
+            
+            join_keys = join_keys[expand]
+            join_rows = [r[expand] for r in join_rows] + [rows]
+        
+        return join_keys, join_rows
+
+    def _load_join(self):
+        """Load the saved join if it matches the catalogs, otherwise compute
+        and save it.  The trigger number indexes of the catalogs are saved 
+        with the join, so that they are not recomputed when it is loaded."""
+        signature = self._signature()
+        
+        if self._cache_path is not None:
+            path = os.path.join(self._cache_path, 
+                                'join_{0}_{1}_{2}.npz'.format(
+                                '_'.join([catalog._table for catalog in 
+                                          self._catalogs]), self._how, 
+                                signature[:16]))
+            if os.path.exists(path):
+                with np.load(path, allow_pickle=False) as npz:
+                    if str(npz['signature']) == signature:
+                        for i, catalog in enumerate(self._catalogs):
+                            catalog._indexes.setdefault('trigger', 
+                                (npz['index_keys_' + str(i)], 
+                                 npz['index_order_' + str(i)]))
+                        return npz['keys'], [npz['rows_' + str(i)] for i in 
+                                             range(len(self._catalogs))]
+        
+        keys, rows = self._compute_join()
+        if self._cache_path is not None:
+            os.makedirs(self._cache_path, exist_ok=True)
+            arrays = {'rows_' + str(i): r for i, r in enumerate(rows)}
+            for i, catalog in enumerate(self._catalogs):
+                index_keys, index_order = catalog._sorted_index('trigger')
+                arrays['index_keys_' + str(i)] = index_keys
+                arrays['index_order_' + str(i)] = index_order
+            tmp_file = path + '.tmp.npz'
+            np.savez(tmp_file, signature=np.array(signature), keys=keys, 
+                     **arrays)
+            os.replace(tmp_file, path)
+        return keys, rows
+
+    def _signature(self):
+        """A digest of the type of join and the trigger number column of each
+        catalog.  The raw column is hashed, which is much faster than building
+        the trigger number index."""
+        digest = hashlib.sha1(self._how.encode())
+        for catalog in self._catalogs:
+            column = catalog.trigger_column
+            if column is None:
+                # raises the error for a catalog without trigger numbers
+                catalog._sorted_index('trigger')
+            values = np.ascontiguousarray(catalog._data[column])
+            digest.update(catalog._table.encode())
+            digest.update(values.dtype.str.encode())
+            digest.update(values.tobytes())
+        return digest.hexdigest()
+
+    def _resolve(self, column):
+        """The catalog index and column name of a column of the join"""
+        columns = self._column_map()
+        if column not in columns:
+            raise KeyError('{} is not a column of the join'.format(column))
+        return columns[column]
+    
+    def __repr__(self):
+        return '<BatseCatalogJoin: {0}; {1} rows>'.format(
+               ', '.join([catalog._table for catalog in self._catalogs]), 
+               self.num_rows)
+
+
+class _ColumnTable():
+    """A table stored as one array per column, with the interface of a 
+    FITS record array used by the catalogs: a column is returned by name,
+    and a selection of rows is returned as a new table.  Columns are only 
+    read from the source, and the row selection only applied, when the column
+    is used.
+    
+    String columns are returned as character arrays, the same as a FITS 
+    table, so that comparisons ignore trailing whitespace.
+    
+    Parameters:
+        source (:class:`_DictColumns` or :class:`_NpzColumns`): 
+            The columns of the full table
+        rows (np.array, optional): The indices of the selected rows
+    """
+    def __init__(self, source, rows=None):
+        self._source = source
+        self._rows = rows
+        self._columns = {}
+    
+    @property
+    def dtype(self):
+        return self._source.dtype
+    
+    @property
+    def size(self):
+        if self._rows is None:
+            return self._source.size
+        return self._rows.size
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._columns:
+                array = self._source.column(key)
+                if self._rows is not None:
+                    array = array[self._rows]
+                if array.dtype.kind in 'US':
+                    array = array.view(_chararray)
+                self._columns[key] = array
+            return self._columns[key]
+        
+        rows = np.arange(self.size)[key]
+        if self._rows is not None:
+            rows = self._rows[rows]
+        return _ColumnTable(self._source, rows=rows)
+    
+    def __len__(self):
+        return self.size
+
+
+class _DictColumns():
+    """Columns held in memory"""
+    def __init__(self, columns):
+        self._columns = columns
+        self.dtype = np.dtype([(name, array.dtype) for name, array in 
+                               columns.items()])
+        first = next(iter(columns.values()), np.array([]))
+        self.size = first.shape[0]
+    
+    def column(self, name):
+        return self._columns[name]
+
+
+class _NpzColumns():
+    """Columns in a columnar cache file, each read on first use"""
+    def __init__(self, path):
+        self._path = path
+        self._columns = {}
+        with np.load(path, allow_pickle=False) as npz:
+            self.header = fits.Header.fromstring(str(npz['header']))
+            self._names = [str(name) for name in npz['names']]
+            self.dtype = np.dtype([(name, np.dtype(str(dtype))) for 
+                                   name, dtype in zip(self._names, 
+                                                      npz['dtypes'])])
+            self.size = int(npz['num_rows'])
+    
+    def column(self, name):
+        if name not in self._columns:
+            if name not in self._names:
+                raise KeyError(name)
+            key = 'col_' + str(self._names.index(name))
+            with np.load(self._path, allow_pickle=False) as npz:
+                self._columns[name] = npz[key]
+        return self._columns[name]
+
+
+def _radec_to_vectors(ra, dec):
+    """Unit vectors of positions in degrees"""
+    ra = np.deg2rad(np.asarray(ra, dtype=float))
+    dec = np.deg2rad(np.asarray(dec, dtype=float))
+    cos_dec = np.cos(dec)
+    return np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), 
+                     np.sin(dec)], axis=-1)
+
+
+def _take(column, rows):
+    """Select rows of a column, where a row of -1 is a missing value"""
+    values = np.asarray(column)[np.maximum(rows, 0)]
+    missing = rows < 0
+    if np.any(missing):
+        if values.dtype.kind == 'f':
+            values[missing] = np.nan
+        elif values.dtype.kind in 'iu':
+            values = values.astype(np.int64)
+            values[missing] = -1
+        elif values.dtype.kind in 'US':
+            values[missing] = ''
+        else:
+            values[missing] = 0
+    return values
+
+
+def _to_float(column):
+    """Convert a column to floats, with NaN for values that are not 
+    numbers"""
+    if column.dtype.kind in 'iuf':
+        return np.asarray(column, dtype=float)
+    values = np.full(column.shape[0], np.nan)
+    for i, value in enumerate(column):
+        try:
+            values[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return values
+
+
+class BatseGrbCatalog(BatseCatalog):
     """The BATSE GRB trigger Catalog.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
         super().__init__(cache_path, table='batsegrb', **kwargs)
 
-class BatseGrb4bCatalog(BrowseCatalog):
+class BatseGrb4bCatalog(BatseCatalog):
     """The BATSE 4B catalog of localizations and durations.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
         super().__init__(cache_path, table='batse4b', **kwargs)
 
-class BatseSpectralCatalog(BrowseCatalog):
+class BatseSpectralCatalog(BatseCatalog):
     """The BATSE 5B spectral catalog.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
         super().__init__(cache_path, table='bat5bgrbsp', **kwargs)
 
-class BatseBrightSpectralCatalog(BrowseCatalog):
+class BatseBrightSpectralCatalog(BatseCatalog):
     """The BATSE time-resolved spectral catalog of bright GRBs.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
         super().__init__(cache_path, table='batsegrbsp', **kwargs)
 
-class BatseEarthOccultationCatalog(BrowseCatalog):
+class BatseEarthOccultationCatalog(BatseCatalog):
     """The BATSE Earth Occultation Catalog of Low-Energy Gamma-ray Sources.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
         super().__init__(cache_path, table='batseeocat', **kwargs)
 
-class BatsePulsarCatalog(BrowseCatalog):
+class BatsePulsarCatalog(BatseCatalog):
     """The BATSE Pulsar Observations Catalog.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
         super().__init__(cache_path, table='batsepulsr', **kwargs)
 
-class BatseTriggerCatalog(BrowseCatalog):
+class BatseTriggerCatalog(BatseCatalog):
     """The BATSE Trigger Catalog.
     """
     def __init__(self, cache_path=batse_cache_path, **kwargs):
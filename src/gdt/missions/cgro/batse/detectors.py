@@ -38,6 +38,7 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import numpy as np
 import astropy.units as u
 from gdt.core.detector import Detectors
 
@@ -59,15 +60,19 @@ class BatseDetectors(Detectors):
 
     .. autosummary::
       
+      angles_to
       from_full_name
       from_num
       from_str
       is_lad
       is_sd
       lad
+      lad_mask
       pointing
       sd
+      sd_mask
       skycoord
+      unit_vectors
   
     .. rubric:: Attributes Documentation
 
@@ -79,15 +84,19 @@ class BatseDetectors(Detectors):
 
     .. rubric:: Methods Documentation
 
+    .. automethod:: angles_to
     .. automethod:: from_full_name
     .. automethod:: from_num
     .. automethod:: from_str
     .. automethod:: is_lad
     .. automethod:: is_sd
     .. automethod:: lad
+    .. automethod:: lad_mask
     .. automethod:: pointing
     .. automethod:: sd
+    .. automethod:: sd_mask
     .. automethod:: skycoord
+    .. automethod:: unit_vectors
     """
     LAD0 = ('LAD0', 0,  45.0 * u.deg, 35.26 * u.deg)
     LAD1 = ('LAD1', 1, 135.0 * u.deg, 35.26 * u.deg)
@@ -109,6 +118,27 @@ class BatseDetectors(Detectors):
     SD6 = ('SD6', 14, 225.0 * u.deg, 125.73 * u.deg)
     SD7 = ('SD7', 15, 315.0 * u.deg, 125.73 * u.deg)
 
+    @classmethod
+    def angles_to(cls, source_vectors_sc):
+        """Calculate the angles between source directions and all 16 
+        detector normals.
+        
+        Args:
+            source_vectors_sc (np.array): 
+                The (N, 3) or (3,) cartesian vectors of the source directions 
+                in the spacecraft frame.  The vectors need not be normalized.
+        
+        Returns:
+            (np.array): The (N, 16) angles in degrees, ordered by detector 
+                        number
+        """
+        vectors = np.atleast_2d(np.asarray(source_vectors_sc, dtype=float))
+        if (vectors.ndim != 2) or (vectors.shape[1] != 3):
+            raise ValueError('source_vectors_sc must have shape (N, 3)')
+        norm = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+        cos_angles = (vectors @ _UNIT_VECTORS.T) / norm[:, np.newaxis]
+        return np.rad2deg(np.arccos(np.clip(cos_angles, -1.0, 1.0)))
+
     @classmethod
     def all_lads(cls):
         """Get all detectors that are Large Area Detectors (LADs).
@@ -127,6 +157,34 @@ class BatseDetectors(Detectors):
         """
         return [x for x in cls if x.is_sd()]
 
+    @classmethod
+    def lad_mask(cls):
+        """A boolean mask of the LAD detectors, ordered by detector number.
+        
+        Returns:
+            (np.array(dtype=bool)): The read-only (16,) mask
+        """
+        return _LAD_MASK
+
+    @classmethod
+    def sd_mask(cls):
+        """A boolean mask of the SD detectors, ordered by detector number.
+        
+        Returns:
+            (np.array(dtype=bool)): The read-only (16,) mask
+        """
+        return _SD_MASK
+
+    @classmethod
+    def unit_vectors(cls):
+        """The unit vectors of the detector normals in the spacecraft frame,
+        ordered by detector number.
+        
+        Returns:
+            (np.array): The read-only (16, 3) cartesian unit vectors
+        """
+        return _UNIT_VECTORS
+
     def is_lad(self):
         """Check if detector is a LAD.
     
@@ -143,3 +201,18 @@ class BatseDetectors(Detectors):
         """
         return self.name[0] == 'S'
 
+
+def _detector_table():
+    """Compute the detector unit vectors and LAD/SD masks"""
+    dets = sorted(BatseDetectors, key=lambda det: det.number)
+    az = np.array([det.azimuth.to_value('rad') for det in dets])
+    zen = np.array([det.zenith.to_value('rad') for det in dets])
+    vectors = np.stack((np.sin(zen) * np.cos(az), np.sin(zen) * np.sin(az),
+                        np.cos(zen)), axis=1)
+    lad_mask = np.array([det.is_lad() for det in dets])
+    sd_mask = np.array([det.is_sd() for det in dets])
+    for arr in (vectors, lad_mask, sd_mask):
+        arr.flags.writeable = False
+    return vectors, lad_mask, sd_mask
+
+_UNIT_VECTORS, _LAD_MASK, _SD_MASK = _detector_table()
@@ -0,0 +1,423 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+import gzip
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ftplib import FTP_TLS
+from pathlib import Path
+from typing import List, Union
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from gdt.core.heasarc import BaseProtocol, Ftp, Http, ProgressMixin
+
+__all__ = ['BatseDownloader']
+
+class BatseDownloader(ProgressMixin):
+    """Downloads a set of files from the archive concurrently.
+    
+    Each file is downloaded by one of a bounded pool of workers, each with its
+    own connection to the archive.  The data are written to a ``.part`` file 
+    next to the destination, which is renamed once the download is complete 
+    and verified, so an interrupted download never leaves a truncated file 
+    under the final name.  A failed download is retried with an exponential 
+    backoff, and resumes from the end of the partial file when the server 
+    supports it (HTTP range requests or FTP ``REST``).  A partial file left by
+    an earlier, interrupted call is resumed in the same way.
+    
+    A completed download is verified against the size reported by the 
+    server and, for gzip-compressed files, against the CRC-32 checksum and 
+    size stored in the gzip trailer.
+    
+    HTTP(S) (including AWS) and FTP protocols are supported.
+    
+    Parameters:
+        num_workers (int, optional): The maximum number of concurrent 
+                                     downloads. Default is 4.
+        retries (int, optional): The number of times a failed download is 
+                                 retried. Default is 3.
+        backoff (float, optional): The wait in seconds before the first retry.
+                                   The wait doubles for each later retry. 
+                                   Default is 1.
+        verify (bool, optional): If True, verify the checksum of gzip files.
+                                 Default is True.
+        chunk_size (int, optional): The number of bytes read at a time. 
+                                    Default is 65536.
+    """
+    def __init__(self, num_workers=4, retries=3, backoff=1.0, verify=True,
+                 chunk_size=65536):
+        if int(num_workers) < 1:
+            raise ValueError('num_workers must be at least 1')
+        if int(retries) < 0:
+            raise ValueError('retries must be non-negative')
+        self._num_workers = int(num_workers)
+        self._retries = int(retries)
+        self._backoff = float(backoff)
+        self._verify = bool(verify)
+        self._chunk_size = int(chunk_size)
+    
+    @property
+    def backoff(self):
+        """(float): The wait in seconds before the first retry"""
+        return self._backoff
+    
+    @property
+    def num_workers(self):
+        """(int): The maximum number of concurrent downloads"""
+        return self._num_workers
+    
+    @property
+    def retries(self):
+        """(int): The number of times a failed download is retried"""
+        return self._retries
+    
+    @property
+    def verify(self):
+        """(bool): True if the checksum of gzip files is verified"""
+        return self._verify
+    
+    def get(self, protocol: BaseProtocol, remote_dir: str, files: List[str],
+            dest_dir: Union[str, Path], verbose: bool = True) -> List[Path]:
+        """Download a list of files from a directory in the archive.  
+        
+        All files are attempted, even if some of them fail.
+        
+        Args:
+            protocol (:class:`~gdt.core.heasarc.BaseProtocol`): 
+                The protocol of the archive
+            remote_dir (str): The archive directory containing the files
+            files (list of str): The file names
+            dest_dir (str, Path): The download directory
+            verbose (bool, optional): If True, will output the combined 
+                                      download status. Default is True.
+        
+        Returns:
+            (list of Path): The downloaded files, in the order of ``files``
+        """
+        if not isinstance(files, list):
+            raise ValueError("files argument must be a list.")
+        remote_paths = [Path(remote_dir, file).as_posix() for file in files]
+        return self.get_paths(protocol, remote_paths, dest_dir, verbose=verbose)
+
+    def get_paths(self, protocol: BaseProtocol, remote_paths: List[str],
+                  dest_dir: Union[str, Path, List], verbose: bool = True,
+                  errors: str = 'raise') -> List[Path]:
+        """Download a list of files from anywhere in the archive.  
+        
+        All files are attempted, even if some of them fail.
+        
+        Args:
+            protocol (:class:`~gdt.core.heasarc.BaseProtocol`): 
+                The protocol of the archive
+            remote_paths (list of str): The archive paths of the files
+            dest_dir (str, Path, or list): The download directory, or a 
+                                           download directory for each file
+            verbose (bool, optional): If True, will output the combined 
+                                      download status. Default is True.
+            errors (str, optional): If 'raise', a RuntimeError listing the 
+                                    failed files is raised once all files 
+                                    have been attempted.  If 'ignore', 
+                                    failed files are returned as None. 
+                                    Default is 'raise'.
+        
+        Returns:
+            (list of Path): The downloaded files, in the order of 
+                            ``remote_paths``
+        """
+        if not self.supports(protocol):
+            raise TypeError('{} is not a supported protocol'.format(
+                            type(protocol).__name__))
+        if not isinstance(remote_paths, list):
+            raise ValueError("remote_paths argument must be a list.")
+        if errors not in ('raise', 'ignore'):
+            raise ValueError("errors must be either 'raise' or 'ignore'")
+        
+        if isinstance(dest_dir, (list, tuple)):
+            if len(dest_dir) != len(remote_paths):
+                raise ValueError('dest_dir must have one directory per file')
+            dest_dirs = [Path(d) for d in dest_dir]
+        else:
+            dest_dirs = [Path(dest_dir)] * len(remote_paths)
+        for d in set(dest_dirs):
+            d.mkdir(parents=True, exist_ok=True)
+        if len(remote_paths) == 0:
+            return []
+        
+        progress = None
+        local_progress = False
+        if verbose:
+            progress = getattr(protocol, '_progress', None)
+            local_progress = progress is None
+            if local_progress:
+                progress = self._create_progress()
+                progress.start()
+        tracker = _Tracker(progress, len(remote_paths))
+        
+        results = [None] * len(remote_paths)
+        failed = []
+        try:
+            num_workers = min(self._num_workers, len(remote_paths))
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = {executor.submit(self._download, protocol, 
+                                           remote_path, dest_dirs[i],
+                                           tracker): i 
+                           for i, remote_path in enumerate(remote_paths)}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as err:
+                        failed.append((remote_paths[i], err))
+        finally:
+            if local_progress:
+                progress.stop()
+        
+        if len(failed) and (errors == 'raise'):
+            msg = '; '.join(['{0} ({1})'.format(Path(path).name, err) 
+                             for path, err in failed])
+            raise RuntimeError('Failed to download {0} of {1} files: ' \
+                               '{2}'.format(len(failed), len(remote_paths), 
+                                            msg)) from failed[0][1]
+        
+        return results
+
+    @staticmethod
+    def supports(protocol):
+        """Check if a protocol is supported.
+        
+        Args:
+            protocol (:class:`~gdt.core.heasarc.BaseProtocol`): The protocol
+        
+        Returns:
+            (bool)
+        """
+        return isinstance(protocol, (Http, Ftp))
+
+    def _download(self, protocol, remote_path, dest_dir, tracker):
+        """Download a single file, retrying on failure"""
+        file = Path(remote_path).name
+        file_path = dest_dir.joinpath(file)
+        part_path = dest_dir.joinpath(file + '.part')
+        
+        task = tracker.add_file(file)
+        try:
+            for attempt in range(self._retries + 1):
+                try:
+                    self._transfer(protocol, remote_path, part_path, tracker, 
+                                   task)
+                    if self._verify and file.endswith('.gz'):
+                        _verify_gzip(part_path)
+                    os.replace(part_path, file_path)
+                    break
+                except Exception as err:
+                    # a partial file that cannot be resumed is started over
+                    if isinstance(err, (HTTPError, _VerifyError)) and \
+                       part_path.exists():
+                        part_path.unlink()
+                    if attempt == self._retries:
+                        raise
+                    time.sleep(self._backoff * 2 ** attempt)
+        finally:
+            tracker.remove_file(task)
+        
+        return file_path
+    
+    def _open(self, protocol, remote_path, offset):
+        """Open a stream of the file starting at offset"""
+        if isinstance(protocol, Http):
+            return _HttpStream(protocol, remote_path, offset)
+        return _FtpStream(protocol, remote_path, offset)
+
+    def _transfer(self, protocol, remote_path, part_path, tracker, task):
+        """Transfer a file into the partial file, resuming when possible"""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        stream = self._open(protocol, remote_path, offset)
+        try:
+            tracker.start_file(task, stream.total, stream.offset)
+            mode = 'ab' if stream.offset > 0 else 'wb'
+            with part_path.open(mode) as fp:
+                while True:
+                    data = stream.read(self._chunk_size)
+                    if not data:
+                        break
+                    fp.write(data)
+                    tracker.advance(task, len(data))
+        finally:
+            stream.close()
+        
+        size = part_path.stat().st_size
+        if (stream.total is not None) and (size != stream.total):
+            if size > stream.total:
+                part_path.unlink()
+            raise IOError('Expected {0} bytes, received {1}'.format(
+                          stream.total, size))
+
+
+class _HttpStream():
+    """A stream of a file from a HTTP(S) archive, optionally starting at an 
+    offset using a range request"""
+    def __init__(self, protocol, remote_path, offset):
+        request = Request(protocol.urljoin(remote_path))
+        if offset > 0:
+            request.add_header('Range', 'bytes={}-'.format(offset))
+        self._response = urlopen(request, context=protocol._context,
+                                 timeout=protocol._timeout)
+        
+        self.offset = 0
+        self.total = None
+        if self._response.status == 206:
+            # e.g. 'bytes 100-999/1000'
+            content_range = self._response.headers['Content-Range'].split()[1]
+            start = int(content_range.split('-')[0])
+            total = content_range.split('/')[1]
+            if start != offset:
+                self._response.close()
+                raise IOError('Server returned an unexpected range')
+            self.offset = start
+            self.total = int(total) if total != '*' else None
+        elif self._response.headers['Content-Length'] is not None:
+            self.total = int(self._response.headers['Content-Length'])
+    
+    def close(self):
+        self._response.close()
+    
+    def read(self, size):
+        return self._response.read(size)
+
+
+class _FtpStream():
+    """A stream of a file from a FTP archive, using a new connection and 
+    optionally starting at an offset"""
+    def __init__(self, protocol, remote_path, offset):
+        self._ftp = FTP_TLS(host=protocol._host, timeout=protocol._timeout)
+        try:
+            self._ftp.login()
+            self._ftp.prot_p()
+            self._ftp.voidcmd('TYPE I')
+            self.total = self._ftp.size(remote_path)
+            self.offset = offset if offset > 0 else 0
+            self._conn = self._ftp.transfercmd('RETR ' + remote_path, 
+                                               rest=offset or None)
+        except Exception:
+            self._ftp.close()
+            raise
+    
+    def close(self):
+        try:
+            self._conn.close()
+            self._ftp.voidresp()
+            self._ftp.quit()
+        except Exception:
+            pass
+        finally:
+            self._ftp.close()
+    
+    def read(self, size):
+        return self._conn.recv(size)
+
+
+class _Tracker():
+    """Combined progress of concurrent downloads.  The overall task counts 
+    the bytes of all files, and a task is shown for each active download."""
+    def __init__(self, progress, num_files):
+        self._progress = progress
+        self._lock = threading.Lock()
+        self._files = {}
+        self._total = 0
+        if progress is not None:
+            self._overall = progress.add_task('download', total=None,
+                                    filename='{} files'.format(num_files))
+    
+    def add_file(self, file):
+        if self._progress is None:
+            return None
+        return self._progress.add_task('download', filename=file, total=None,
+                                       visible=False)
+    
+    def advance(self, task, num_bytes):
+        if self._progress is None:
+            return
+        with self._lock:
+            total, completed = self._files[task]
+            self._files[task] = (total, completed + num_bytes)
+            self._progress.update(self._overall, advance=num_bytes)
+        self._progress.update(task, advance=num_bytes)
+    
+    def remove_file(self, task):
+        if self._progress is None:
+            return
+        self._progress.remove_task(task)
+    
+    def start_file(self, task, total, offset):
+        if self._progress is None:
+            return
+        # the overall total grows as the file sizes become known, and an 
+        # earlier attempt at the file is replaced by this one
+        with self._lock:
+            old_total, old_completed = self._files.get(task, (None, 0))
+            self._total += (total or 0) - (old_total or 0)
+            self._files[task] = (total, offset)
+            self._progress.update(self._overall, total=self._total, 
+                                  advance=offset - old_completed)
+        self._progress.update(task, total=total, completed=offset, 
+                              visible=True)
+
+
+class _VerifyError(IOError):
+    """A downloaded file failed verification"""
+    pass
+
+
+def _verify_gzip(path):
+    """Verify the CRC-32 checksum and size of a gzip file.
+    
+    Args:
+        path (Path): The file path
+    """
+    try:
+        with gzip.open(path, 'rb') as fp:
+            while fp.read(1048576):
+                pass
+    except (OSError, EOFError, zlib.error) as err:
+        raise _VerifyError('{0} failed verification: {1}'.format(
+                           Path(path).name, err))
@@ -38,16 +38,174 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 import os
+import re
+import time
 from math import floor
-from gdt.core.heasarc import BaseFinder
+from pathlib import Path
+from gdt.core.heasarc import BaseFinder, BaseProtocol, Ftp, Http
 from ..time import *
+from .download import BatseDownloader
+from .mirror import BatseMirror
 
-__all__ = ['BatseTriggerFinder', 'BatseContinuousFinder']
+__all__ = ['BatseTriggerFinder', 'BatseContinuousFinder', 'PrefetchSummary']
 
 class BatseFinder(BaseFinder):
     """Subclassing FtpFinder to enable _file_filter() to take a list of
-    BATSE detectors.
-    """    
+    BATSE detectors, to download files concurrently, and to optionally use a 
+    local mirror of the archive.
+    
+    Parameters:
+        args: The set of parameters needed to define the data path
+        protocol (str or :class:`~gdt.core.heasarc.BaseProtocol`, optional): 
+            The connection protocol, either the name of the protocol or a 
+            protocol object. Default is HTTPS.
+        mirror (str, optional): The directory of a local mirror of the 
+                                archive.  If set, the directory listings are
+                                indexed and the downloaded files are kept in
+                                the mirror (see 
+                                :class:`~gdt.missions.cgro.batse.mirror.BatseMirror`).
+        offline (bool, optional): If True, only use the mirror and never 
+                                  access the archive. Default is False.
+        max_age (float, optional): The time in seconds after which an indexed
+                                   directory listing is refreshed from the 
+                                   archive.
+        num_workers (int, optional): The maximum number of concurrent 
+                                     downloads. Default is 4.
+        retries (int, optional): The number of times a failed download is 
+                                 retried. Default is 3.
+        **kwargs: Options passed to the protocol class
+    """
+    def __init__(self, *args, protocol='HTTPS', mirror=None, offline=False,
+                 max_age=None, num_workers=4, retries=3, **kwargs):
+        if offline and (mirror is None):
+            raise ValueError('offline requires a mirror')
+        self._downloader = BatseDownloader(num_workers=num_workers, 
+                                           retries=retries)
+        self._index = None
+        
+        if isinstance(protocol, BaseProtocol):
+            super().__init__(**kwargs)
+            if isinstance(protocol, Http):
+                self.protocol = 'HTTPS'
+            elif isinstance(protocol, Ftp):
+                self.protocol = 'FTP'
+            else:
+                self.protocol = type(protocol).__name__
+            self._protocol = protocol
+        else:
+            super().__init__(protocol=protocol, **kwargs)
+        
+        if len(args) and not self._protocol.initialized:
+            raise ValueError('*args were given while host or url kwarg was '
+                             'None')
+        
+        if mirror is not None:
+            self._protocol = BatseMirror(mirror, self._protocol, 
+                                         offline=offline, max_age=max_age)
+        
+        if len(args):
+            self.cd(*args)
+
+    @property
+    def downloader(self):
+        """(:class:`~gdt.missions.cgro.batse.download.BatseDownloader`): The 
+        concurrent download engine"""
+        return self._downloader
+    
+    @downloader.setter
+    def downloader(self, val):
+        if not isinstance(val, BatseDownloader):
+            raise TypeError('downloader must be a BatseDownloader')
+        self._downloader = val
+
+    @property
+    def mirror(self):
+        """(:class:`~gdt.missions.cgro.batse.mirror.BatseMirror`): The local 
+        mirror, or None if a mirror is not used"""
+        if isinstance(self._protocol, BatseMirror):
+            return self._protocol
+        return None
+
+    def get(self, download_dir, files, verbose=True):
+        """Downloads a list of files from the current directory.  The files 
+        are downloaded concurrently for HTTP(S) and FTP protocols.  If a 
+        mirror is used, only the files not yet in the mirror are downloaded 
+        from the archive.
+
+        Args:
+            download_dir (str, Path): The download directory location
+            files (list of str): The list of files to download
+            verbose (bool, optional): If True, will output the download status.
+                                      Default is True.
+
+        Returns:
+            (list)
+        """
+        if not isinstance(files, list):
+            raise ValueError("files argument must be a list.")
+        remote_paths = [Path(self._cwd, file).as_posix() for file in files]
+        return self._fetch(remote_paths, download_dir, verbose)
+
+    def _fetch(self, remote_paths, download_dir, verbose=True, 
+               errors='raise'):
+        """Download files by their archive paths, concurrently when the 
+        protocol is supported.  If errors is 'ignore', failed files are 
+        returned as None.
+        """
+        mirror = self.mirror
+        remote = self._protocol if mirror is None else mirror.remote
+        concurrent = self._downloader.supports(remote) and \
+                     not ((mirror is not None) and mirror.offline)
+        
+        if mirror is None:
+            if concurrent:
+                return self._downloader.get_paths(remote, remote_paths, 
+                                                  download_dir, verbose, 
+                                                  errors)
+            return self._fetch_serial(remote_paths, download_dir, verbose,
+                                      errors)
+        
+        # fill the mirror, then copy from the mirror
+        failed = set()
+        if concurrent:
+            missing = [path for path in remote_paths 
+                       if not mirror.mirror_path(path).is_file()]
+            files = self._downloader.get_paths(remote, missing, 
+                                    [mirror.mirror_path(path).parent 
+                                     for path in missing], 
+                                    verbose, errors)
+            failed = {path for path, file in zip(missing, files) 
+                      if file is None}
+        files = self._fetch_serial([path for path in remote_paths 
+                                    if path not in failed], 
+                                   download_dir, verbose, errors)
+        files = iter(files)
+        return [None if path in failed else next(files) 
+                for path in remote_paths]
+
+    def _fetch_serial(self, remote_paths, download_dir, verbose, errors):
+        """Download files by their archive paths one at a time with the 
+        protocol"""
+        files = []
+        cwd = self._cwd
+        try:
+            for remote_path in remote_paths:
+                remote_dir, file = os.path.split(remote_path)
+                if remote_dir != cwd:
+                    self._protocol._cd(remote_dir)
+                    cwd = remote_dir
+                try:
+                    files.append(self._protocol.download(file, download_dir, 
+                                                         verbose))
+                except Exception:
+                    if errors == 'raise':
+                        raise
+                    files.append(None)
+        finally:
+            if (cwd != self._cwd) and self._cwd:
+                self._protocol._cd(self._cwd)
+        return files
+
     def _file_filter(self, file_list, filetype, extension, dets=None):
         """Filters the directory for the requested filetype, extension, and 
         detectors
@@ -61,16 +219,15 @@ class BatseFinder(BaseFinder):
         Returns:
             (list): The filtered file list
         """
-        files = super()._file_filter(file_list, filetype, extension)
-
-        if dets is not None:
-            if not isinstance(dets, (list, tuple)):
-                dets = [dets]
-            files = [f for f in files if
-                     any(f'_{det}_' in f for det in dets) or 
-                     any(f'_{det}.' in f for det in dets)]
-
-        return files
+        # the index of the directory listing is kept until the listing changes
+        index = self._index
+        if (index is None) or not index.indexes(file_list):
+            index = _FilenameIndex(file_list)
+            self._index = index
+        
+        if (dets is not None) and not isinstance(dets, (list, tuple)):
+            dets = [dets]
+        return index.filter(filetype, extension, dets=dets)
     
 
 class BatseTriggerFinder(BatseFinder):
@@ -93,6 +250,24 @@ class BatseTriggerFinder(BatseFinder):
     """
     _root = '/compton/data/batse/trigger'
     
+    # the file name filters of each data type for prefetch():
+    # (filetype, extension, filter by detector, required first character)
+    _prefetch_types = {'cont': ('cont_bfits', 'fits.gz', True, None),
+                       'discsc': ('discsc_bfits', 'fits.gz', True, None),
+                       'discsp': ('discsp_bfits', 'fits.gz', True, None),
+                       'drm': ('_drm', 'fits.gz', True, None),
+                       'dsherb': ('dsherb_bfits', 'fits.gz', True, None),
+                       'her': ('her_bfits', 'fits.gz', True, 'h'),
+                       'herb': ('herb_bfits', 'fits.gz', True, 'h'),
+                       'ibdb': ('_ibdb', 'fits.gz', False, None),
+                       'lightcurves': ('', 'gif', False, None),
+                       'mer': ('mer_bfits', 'fits.gz', False, None),
+                       'sdisc': ('sdisc_bfits', 'fits.gz', True, None),
+                       'sher': ('sher_bfits', 'fits.gz', True, None),
+                       'sherb': ('sherb_bfits', 'fits.gz', True, 's'),
+                       'tte': ('tte_bfits', 'fits.gz', False, None),
+                       'tts': ('tts_bfits', 'fits.gz', True, None)}
+    
     def _validate(self, tnum):
         tnum = '{:05d}'.format(int(tnum))
         return super()._validate(tnum)
@@ -412,6 +587,104 @@ class BatseTriggerFinder(BatseFinder):
         files = self._file_filter(self.files, 'tts_bfits', 'fits.gz', dets=dets)
         return self.get(download_dir, files, **kwargs)
 
+    def prefetch(self, tnums, filetypes, download_dir, dets=None, 
+                 verbose=True):
+        """Download the data of many triggers.  
+        
+        The whole set of files is planned before anything is downloaded: the
+        trigger directories are found by listing each 200-trigger directory 
+        of the archive once, and each trigger directory is listed once for 
+        all of the data types.  Files that are already in the download 
+        directory are skipped, and the remaining files of each data type are 
+        downloaded concurrently.  The current directory of the finder is not 
+        changed.
+        
+        The data types are the same as the ``get_*`` methods:
+        
+          'cont', 'discsc', 'discsp', 'drm', 'dsherb', 'her', 'herb', 'ibdb',
+          'lightcurves', 'mer', 'sdisc', 'sher', 'sherb', 'tte', 'tts'
+        
+        Triggers that are not found in the archive, triggers whose directory 
+        could not be listed, and files that fail to download are recorded in 
+        the returned summary instead of raising an exception.
+        
+        Args:
+            tnums (list): The trigger numbers
+            filetypes (str or list of str): The data type(s) to download
+            download_dir (str): The download directory
+            dets (list, optional): The detectors' data to download, for the 
+                                   data types that are per detector. 
+                                   If omitted, will download all.
+            verbose (bool, optional): If True, will output the download status. 
+                                      Default is True.
+        
+        Returns:
+            (:class:`PrefetchSummary`)
+        """
+        if isinstance(filetypes, str):
+            filetypes = [filetypes]
+        filetypes = list(dict.fromkeys(filetypes))
+        for filetype in filetypes:
+            if filetype not in self._prefetch_types:
+                raise ValueError('{} is an invalid type.'.format(filetype))
+        download_dir = Path(download_dir)
+        
+        tnums = sorted({'{:05d}'.format(int(tnum)) for tnum in tnums})
+        buckets = {}
+        for tnum in tnums:
+            buckets.setdefault(self._bucket_path(tnum), []).append(tnum)
+        
+        # plan the downloads
+        summary = PrefetchSummary()
+        planned = {filetype: [] for filetype in filetypes}
+        for bucket, bucket_tnums in buckets.items():
+            try:
+                trigger_dirs = self._protocol.ls(bucket, fullpath=True)
+            except Exception:
+                summary._listing_failed.extend(bucket_tnums)
+                continue
+            
+            for tnum in bucket_tnums:
+                trigger_dir = self._match_trigger(trigger_dirs, tnum)
+                if trigger_dir is None:
+                    summary._missing.append(tnum)
+                    continue
+                try:
+                    files = self._protocol.ls(trigger_dir)
+                except Exception:
+                    summary._listing_failed.append(tnum)
+                    continue
+                
+                for filetype in filetypes:
+                    planned[filetype].extend([Path(trigger_dir, file).as_posix()
+                                              for file in self._prefetch_filter(
+                                              files, filetype, dets)])
+        
+        # download each data type concurrently
+        for filetype in filetypes:
+            present = []
+            remote_paths = []
+            for remote_path in planned[filetype]:
+                file_path = download_dir.joinpath(Path(remote_path).name)
+                if file_path.is_file():
+                    present.append(file_path)
+                else:
+                    remote_paths.append(remote_path)
+            
+            t0 = time.perf_counter()
+            files = []
+            if len(remote_paths):
+                files = self._fetch(remote_paths, download_dir, verbose, 
+                                    errors='ignore')
+            elapsed = time.perf_counter() - t0
+            
+            failed = [Path(remote_path).name for remote_path, file in 
+                      zip(remote_paths, files) if file is None]
+            summary._add(filetype, [file for file in files if file is not None],
+                         present, failed, elapsed)
+        
+        return summary
+
     def ls_cont(self):
         """List the continuous data for the trigger. 
 
@@ -544,29 +817,44 @@ class BatseTriggerFinder(BatseFinder):
         Returns:
             str: The path of the FTP directory for the trigger
         """
-        # BATSE trigger numbers are separated into directories spanning 200
-        # trigger numbers with 5 digit padding (e.g. 00001_00200; 00201_00400)
-        beg = ( floor(float(str_trigger_num)/200.0) * 200 ) + 1
-        end = beg + 199
-        subdir = '{0:05d}_{1:05d}'.format(beg, end)
-        
-        path = os.path.join(self._root, subdir)
+        path = self._bucket_path(str_trigger_num)
         try:
             trigger_dirs = self._protocol.ls(path, fullpath=True)
         except:
             raise FileExistsError
         
-        the_path = ''
-        for trigger_dir in trigger_dirs:
-            if os.path.basename(trigger_dir).startswith(str_trigger_num):
-                the_path = trigger_dir
-                break
-        
-        if the_path == '':
+        the_path = self._match_trigger(trigger_dirs, str_trigger_num)
+        if the_path is None:
             raise FileExistsError
                 
         return the_path
 
+    def _bucket_path(self, str_trigger_num):
+        """The path of the directory that contains the trigger directory"""
+        # BATSE trigger numbers are separated into directories spanning 200
+        # trigger numbers with 5 digit padding (e.g. 00001_00200; 00201_00400)
+        beg = ( floor(float(str_trigger_num)/200.0) * 200 ) + 1
+        end = beg + 199
+        subdir = '{0:05d}_{1:05d}'.format(beg, end)
+        return os.path.join(self._root, subdir)
+
+    def _match_trigger(self, trigger_dirs, str_trigger_num):
+        """The trigger directory of a trigger from a directory listing, or 
+        None if it is not found"""
+        for trigger_dir in trigger_dirs:
+            if os.path.basename(trigger_dir).startswith(str_trigger_num):
+                return trigger_dir
+        return None
+
+    def _prefetch_filter(self, file_list, filetype, dets):
+        """Filters a trigger directory listing for a prefetch data type"""
+        prefix, extension, per_det, first = self._prefetch_types[filetype]
+        files = self._file_filter(file_list, prefix, extension, 
+                                  dets=dets if per_det else None)
+        if first is not None:
+            files = [file for file in files if file.startswith(first)]
+        return files
+
 
 class BatseContinuousFinder(BatseFinder):
     """A class that interfaces with the HEASARC FTP continuous daily data
@@ -718,3 +1006,237 @@ class BatseContinuousFinder(BatseFinder):
         path = os.path.join(self._root, subdir, subsubdir, daydir)
         
         return path
+
+
+class PrefetchSummary():
+    """The summary of a :meth:`BatseTriggerFinder.prefetch`: the files, the 
+    number of bytes, and the download time of each data type, and the 
+    triggers that were not found in the archive or could not be listed.
+    """
+    def __init__(self):
+        self._records = {}
+        self._missing = []
+        self._listing_failed = []
+    
+    @property
+    def filetypes(self):
+        """(list of str): The data types"""
+        return list(self._records.keys())
+    
+    @property
+    def listing_failed(self):
+        """(list of str): The triggers that were not downloaded because their 
+        directory, or the 200-trigger directory containing them, could not be 
+        listed"""
+        return sorted(self._listing_failed)
+    
+    @property
+    def missing_triggers(self):
+        """(list of str): The triggers that were not found in the archive"""
+        return list(self._missing)
+    
+    def downloaded(self, filetype=None):
+        """The files that were downloaded.
+        
+        Args:
+            filetype (str, optional): The data type. If omitted, the files of 
+                                      all data types are returned.
+        
+        Returns:
+            (list of Path)
+        """
+        return self._collect('downloaded', filetype)
+
+    def failed(self, filetype=None):
+        """The files that failed to download.
+        
+        Args:
+            filetype (str, optional): The data type. If omitted, the files of 
+                                      all data types are returned.
+        
+        Returns:
+            (list of str)
+        """
+        return self._collect('failed', filetype)
+    
+    def files(self, filetype=None):
+        """The files that are in the download directory, both downloaded and
+        already present.
+        
+        Args:
+            filetype (str, optional): The data type. If omitted, the files of 
+                                      all data types are returned.
+        
+        Returns:
+            (list of Path)
+        """
+        return sorted(self.downloaded(filetype) + self.skipped(filetype))
+    
+    def num_bytes(self, filetype=None):
+        """The number of bytes downloaded.
+        
+        Args:
+            filetype (str, optional): The data type. If omitted, the total of 
+                                      all data types is returned.
+        
+        Returns:
+            (int)
+        """
+        return sum([file.stat().st_size for file in 
+                    self.downloaded(filetype)])
+    
+    def skipped(self, filetype=None):
+        """The files that were skipped because they were already present.
+        
+        Args:
+            filetype (str, optional): The data type. If omitted, the files of 
+                                      all data types are returned.
+        
+        Returns:
+            (list of Path)
+        """
+        return self._collect('skipped', filetype)
+
+    def time(self, filetype=None):
+        """The time in seconds spent downloading.
+        
+        Args:
+            filetype (str, optional): The data type. If omitted, the total of 
+                                      all data types is returned.
+        
+        Returns:
+            (float)
+        """
+        filetypes = self.filetypes if filetype is None else [filetype]
+        return sum([self._records[filetype]['time'] 
+                    for filetype in filetypes])
+
+    def _add(self, filetype, downloaded, skipped, failed, time):
+        self._records[filetype] = {'downloaded': list(downloaded), 
+                                   'skipped': list(skipped), 
+                                   'failed': list(failed), 'time': time}
+
+    def _collect(self, key, filetype):
+        filetypes = self.filetypes if filetype is None else [filetype]
+        return [item for filetype in filetypes 
+                for item in self._records[filetype][key]]
+    
+    def __repr__(self):
+        return '<PrefetchSummary: {0} files; {1} skipped; {2} failed; ' \
+               '{3:.1f} MB>'.format(len(self.downloaded()), 
+                                    len(self.skipped()), len(self.failed()),
+                                    self.num_bytes() / 1e6)
+    
+    def __str__(self):
+        line = '{0:<12s}{1:>11}{2:>9}{3:>8}{4:>12}{5:>10}{6:>10}'
+        lines = [line.format('filetype', 'downloaded', 'skipped', 'failed', 
+                             'MB', 'time (s)', 'MB/s')]
+        for filetype in self.filetypes + [None]:
+            num_bytes = self.num_bytes(filetype)
+            elapsed = self.time(filetype)
+            rate = num_bytes / 1e6 / elapsed if elapsed > 0.0 else 0.0
+            lines.append(line.format('total' if filetype is None else filetype,
+                                     len(self.downloaded(filetype)), 
+                                     len(self.skipped(filetype)), 
+                                     len(self.failed(filetype)),
+                                     '{:.2f}'.format(num_bytes / 1e6),
+                                     '{:.2f}'.format(elapsed), 
+                                     '{:.2f}'.format(rate)))
+        if len(self._missing):
+            lines.append('{} triggers not found'.format(len(self._missing)))
+        if len(self._listing_failed):
+            lines.append('{} triggers could not be listed'.format(
+                         len(self._listing_failed)))
+        return '\n'.join(lines)
+
+
+class _FilenameIndex():
+    """An index of a directory listing that answers the file name filters of
+    :meth:`BatseFinder._file_filter` with dictionary and set lookups.
+    
+    Each file name is parsed once into its pattern, which is the name with 
+    each run of digits replaced by ``#`` (e.g. ``cont_bfits_#_#.fits.gz``), and
+    its tokens, which are the parts of the name that follow an underscore and 
+    end at an underscore or period (e.g. ``bfits``, ``3`` and ``105``).  A 
+    directory has few distinct patterns, so a file type and extension without
+    digits is matched against the patterns instead of every file, and a 
+    detector is a token lookup.  The results are the same as the substring 
+    tests they replace, and filters that cannot be answered from the index 
+    fall back to those tests.
+    
+    Parameters:
+        file_list (list of str): The directory listing
+    """
+    _digits = re.compile(r'\d+')
+    _token = re.compile(r'_([^_.]+)(?=[_.])')
+    
+    def __init__(self, file_list):
+        self._source = file_list
+        self._files = list(file_list)
+        self._patterns = {}
+        self._tokens = {}
+        self._results = {}
+        for i, file in enumerate(self._files):
+            pattern = self._digits.sub('#', file)
+            self._patterns.setdefault(pattern, []).append(i)
+            for token in self._token.findall(file):
+                self._tokens.setdefault(token, set()).add(i)
+    
+    def filter(self, filetype, extension, dets=None):
+        """The files containing the file type, ending with the extension, 
+        and, if set, containing ``_<det>_`` or ``_<det>.`` for any of the
+        detectors.
+        
+        Args:
+            filetype (str): The type of file, e.g. 'cont'
+            extension (str): The file extension, e.g. '.fit'
+            dets (list, optional): The detectors
+        
+        Returns:
+            (list of str): The files in the order of the listing
+        """
+        if dets is not None:
+            dets = tuple([f'{det}' for det in dets])
+        key = (filetype, extension, dets)
+        if key not in self._results:
+            selected = self._select(filetype, extension)
+            if dets is not None:
+                selected &= self._select_dets(dets)
+            self._results[key] = [self._files[i] for i in sorted(selected)]
+        return list(self._results[key])
+    
+    def indexes(self, file_list):
+        """Check if this is the index of a directory listing.
+        
+        Args:
+            file_list (list of str): The directory listing
+        
+        Returns:
+            (bool)
+        """
+        return (file_list is self._source) and \
+               (len(file_list) == len(self._files))
+    
+    def _select(self, filetype, extension):
+        """The positions of the files matching the file type and extension"""
+        if self._digits.search(filetype + extension) or \
+           ('#' in filetype + extension):
+            return {i for i, f in enumerate(self._files) 
+                    if (filetype in f) and f.endswith(extension)}
+        
+        selected = set()
+        for pattern, positions in self._patterns.items():
+            if (filetype in pattern) and pattern.endswith(extension):
+                selected.update(positions)
+        return selected
+    
+    def _select_dets(self, dets):
+        """The positions of the files matching any of the detectors"""
+        selected = set()
+        for det in dets:
+            if (len(det) == 0) or ('_' in det) or ('.' in det):
+                selected.update([i for i, f in enumerate(self._files) 
+                                 if (f'_{det}_' in f) or (f'_{det}.' in f)])
+            else:
+                selected.update(self._tokens.get(det, ()))
+        return selected
@@ -38,12 +38,13 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+from functools import lru_cache
 from gdt.core.headers import Header, FileHeaders
 
 __all__ = ['PhaiiContHeaders', 'PhaiiContHeadersAlt1', 'PhaiiContHeadersAlt2',
            'PhaiiDisclaHeaders', 'PhaiiDisclaHeadersAlt1', 'PhaiiDisclaHeadersAlt2',
            'PhaiiTriggerHeaders', 'PhaiiTriggerTtsHeaders', 'TteTriggerHeaders',
-           'RspHeaders', 'RspHeadersAlt']
+           'RspHeaders', 'RspHeadersAlt', 'detect_headers']
 
 # mission definitions
 _telescope = 'COMPTON GRO'
@@ -339,4 +340,84 @@ class RspHeaders(FileHeaders):
 
 class RspHeadersAlt(FileHeaders):
     """Alternate FITS headers for BATSE DRM files."""
-    _header_templates = [PrimaryRspHeader(), DrmHeaderAlt()]
\ No newline at end of file
+    _header_templates = [PrimaryRspHeader(), DrmHeaderAlt()]
+
+
+# -----------------------------------------------------------------------------
+
+_commentary_keys = ('COMMENT', 'HISTORY')
+
+def detect_headers(headers, candidates):
+    """Select the FileHeaders class that matches a set of file headers.
+    
+    Rather than attempting to build each candidate in turn, the keywords of
+    each header are compared once against the templates of the candidates. A
+    candidate matches if it has the same number of headers as the file and if
+    the file has at least as many COMMENT and HISTORY cards as each of the 
+    candidate's templates.  Among the matches, the one missing the fewest 
+    keywords is selected, and ties are resolved by the order of 
+    ``candidates``.  The decision is cached for each header layout, 
+    so files with the same layout are only inspected once.  If no candidate
+    matches, the last candidate is returned so that its validation error is
+    raised by :meth:`~gdt.core.headers.FileHeaders.from_headers`.
+    
+    Args:
+        headers (list): A list of FITS headers read from a file
+        candidates (list): The FileHeaders classes to choose from, in order of
+                           preference
+    
+    Returns:
+        (:class:`~gdt.core.headers.FileHeaders` class)
+    """
+    candidates = tuple(candidates)
+    if len(candidates) == 0:
+        raise ValueError('At least one candidate must be provided')
+    layout = tuple(tuple(hdr.keys()) for hdr in headers)
+    return _match_layout(candidates, layout)
+
+
+@lru_cache(maxsize=128)
+def _match_layout(candidates, layout):
+    """Select the best candidate for a header layout, where the layout is a
+    tuple of the keywords in each header.
+    """
+    file_keys = [set(keys) for keys in layout]
+    file_counts = [[keys.count(key) for key in _commentary_keys] \
+                   for keys in layout]
+    
+    best = None
+    best_missing = None
+    for candidate in candidates:
+        schema = _template_schema(candidate)
+        if len(schema) != len(layout):
+            continue
+        
+        # the commentary cards are copied by position, so the file must have
+        # at least as many as the template
+        if any(count < template_count \
+               for (_, template_counts), counts in zip(schema, file_counts) \
+               for template_count, count in zip(template_counts, counts)):
+            continue
+        
+        missing = sum(len(template_keys - keys) \
+                      for (template_keys, _), keys in zip(schema, file_keys))
+        if best is None or missing < best_missing:
+            best = candidate
+            best_missing = missing
+    
+    if best is None:
+        best = candidates[-1]
+    return best
+
+
+@lru_cache(maxsize=None)
+def _template_schema(cls):
+    """The keywords and the number of COMMENT and HISTORY cards in each of the
+    header templates of a FileHeaders class.
+    """
+    schema = []
+    for template in cls._header_templates:
+        keys = list(template.keys())
+        schema.append((set(keys) - set(_commentary_keys), 
+                       tuple(keys.count(key) for key in _commentary_keys)))
+    return tuple(schema)
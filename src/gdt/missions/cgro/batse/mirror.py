@@ -0,0 +1,369 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Union
+
+from gdt.core.heasarc import BaseProtocol
+
+__all__ = ['BatseMirror', 'LocalArchive']
+
+class LocalArchive(BaseProtocol):
+    """A protocol that serves a local directory tree with the same layout as
+    the HEASARC archive, such as a mounted or partial copy of the archive.
+    
+    Parameters:
+        root (str): The local directory corresponding to the root of the 
+                    archive
+        progress (Progress, optional): The progress bar object
+        timeout (float, optional): Not used
+    """
+    def __init__(self, root, progress=None, timeout=90.0):
+        super().__init__(progress, timeout)
+        self._root = Path(root)
+        self._cwd = None
+    
+    @property
+    def initialized(self):
+        """(bool): True if the archive root exists"""
+        return self._root.is_dir()
+    
+    @property
+    def root(self):
+        """(Path): The local directory of the archive root"""
+        return self._root
+    
+    def download(self, file: str, dest_dir: Union[str, Path], 
+                 verbose: bool = True):
+        """Copy a file from the current directory.
+
+        Args:
+            file (str): The file name to copy
+            dest_dir (str, Path): The destination directory
+            verbose (bool, optional): Not used
+        
+        Returns:
+            (Path)
+        """
+        if self._cwd is None:
+            raise ValueError("User must first cd() into a directory.")
+        return self.download_url(os.path.join(self._cwd, file), dest_dir)
+
+    def download_url(self, url: str, dest_dir: Union[str, Path], 
+                     verbose: bool = True):
+        """Copy a file by its path in the archive.
+
+        Args:
+            url (str): The archive path of the file
+            dest_dir (str, Path): The destination directory
+            verbose (bool, optional): Not used
+        
+        Returns:
+            (Path)
+        """
+        src = self._local_path(url)
+        if not src.is_file():
+            raise FileNotFoundError('{} does not exist'.format(url))
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        file_path = dest_dir.joinpath(src.name)
+        shutil.copyfile(src, file_path)
+        return file_path
+    
+    def _cd(self, path: str):
+        if not self._local_path(path).is_dir():
+            raise FileNotFoundError('{} does not exist'.format(path))
+        self._cwd = path
+    
+    def _local_path(self, path):
+        return self._root.joinpath(str(path).lstrip('/'))
+
+    def _ls(self, path: str):
+        local_path = self._local_path(path)
+        return [os.path.join(path, entry.name) for entry in 
+                os.scandir(local_path)]
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit current context"""
+        pass
+    
+    def __repr__(self):
+        return '<LocalArchive: {}>'.format(self._root)
+
+
+class BatseMirror(BaseProtocol):
+    """A protocol that keeps a persistent local mirror of the archive in 
+    front of another protocol.
+    
+    The directory listings are stored in a SQLite index, so that listing or
+    changing to a directory that has been seen before does not need to access
+    the archive.  Downloaded files are stored in the mirror directory with 
+    the same layout as the archive, and are served from the mirror for any 
+    later request.
+    
+    Parameters:
+        mirror_dir (str): The local mirror directory.  The index is stored in 
+                          this directory as ``index.sqlite``.
+        remote (:class:`~gdt.core.heasarc.BaseProtocol`, optional): 
+            The protocol used to access the archive.  If not set, only the 
+            index and the files already in the mirror are available.
+        offline (bool, optional): If True, never access the archive. 
+                                  Default is False.
+        max_age (float, optional): The time in seconds after which a directory
+                                   listing in the index is refreshed from the
+                                   archive.  If not set, the listings are used
+                                   until :meth:`refresh` is called.
+    """
+    _index_name = 'index.sqlite'
+    
+    def __init__(self, mirror_dir, remote=None, offline=False, max_age=None):
+        super().__init__(getattr(remote, '_progress', None), 
+                         getattr(remote, '_timeout', 90.0))
+        self._mirror_dir = Path(mirror_dir)
+        self._mirror_dir.mkdir(parents=True, exist_ok=True)
+        self._remote = remote
+        self._offline = bool(offline) or (remote is None)
+        self._max_age = max_age
+        self._cwd = None
+        self._remote_cwd = None
+        
+        self._execute('CREATE TABLE IF NOT EXISTS listings (' \
+                      'path TEXT PRIMARY KEY, entries TEXT NOT NULL, ' \
+                      'updated REAL NOT NULL)')
+    
+    @property
+    def index_path(self):
+        """(Path): The path of the SQLite index"""
+        return self._mirror_dir.joinpath(self._index_name)
+    
+    @property
+    def initialized(self):
+        """(bool): True if the mirror can be used"""
+        return True
+    
+    @property
+    def mirror_dir(self):
+        """(Path): The local mirror directory"""
+        return self._mirror_dir
+
+    @property
+    def offline(self):
+        """(bool): True if the archive is never accessed"""
+        return self._offline
+    
+    @property
+    def remote(self):
+        """(:class:`~gdt.core.heasarc.BaseProtocol`): The protocol used to 
+        access the archive"""
+        return self._remote
+
+    def download(self, file: str, dest_dir: Union[str, Path], 
+                 verbose: bool = True):
+        """Retrieve a file from the current directory.  If the file is not 
+        already in the mirror, it is downloaded into the mirror from the 
+        archive.  The file is then copied to the destination directory.
+
+        Args:
+            file (str): The file name
+            dest_dir (str, Path): The destination directory
+            verbose (bool, optional): If True, will output the download status
+                                      of files downloaded from the archive.
+                                      Default is True.
+        
+        Returns:
+            (Path)
+        """
+        if self._cwd is None:
+            raise ValueError("User must first cd() into a directory.")
+        
+        mirror_path = self.mirror_path(os.path.join(self._cwd, file))
+        if not mirror_path.is_file():
+            if self._offline:
+                raise FileNotFoundError('{} is not in the mirror'.format(file))
+            if self._remote_cwd != self._cwd:
+                self._remote._cd(self._cwd)
+                self._remote_cwd = self._cwd
+            
+            # download to a temporary directory so that an interrupted 
+            # download is not mistaken for a complete file
+            mirror_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=mirror_path.parent) as tmp:
+                tmp_path = self._remote.download(file, tmp, verbose)
+                os.replace(tmp_path, mirror_path)
+        
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        file_path = dest_dir.joinpath(mirror_path.name)
+        if not (file_path.exists() and file_path.samefile(mirror_path)):
+            shutil.copyfile(mirror_path, file_path)
+        return file_path
+
+    def download_url(self, url: str, dest_dir: Union[str, Path], 
+                     verbose: bool = True):
+        """Download a file from a url with the remote protocol.  These files
+        are not stored in the mirror.
+
+        Args:
+            url (str): The url of a file to download
+            dest_dir (str, Path): The destination directory
+            verbose (bool, optional): If True, will output the download status. 
+                                      Default is True.
+        
+        Returns:
+            (Path)
+        """
+        if self._offline:
+            raise RuntimeError('The mirror is offline')
+        return self._remote.download_url(url, dest_dir, verbose)
+
+    def indexed_paths(self):
+        """The directories in the index.
+        
+        Returns:
+            (list of str)
+        """
+        rows = self._execute('SELECT path FROM listings ORDER BY path')
+        return [row[0] for row in rows]
+
+    def mirror_path(self, path):
+        """The local path in the mirror of a path in the archive.
+        
+        Args:
+            path (str): The archive path
+        
+        Returns:
+            (Path)
+        """
+        return self._mirror_dir.joinpath(str(path).lstrip('/'))
+
+    def refresh(self, path=None, max_age=None):
+        """Refresh directory listings in the index from the archive.
+        
+        Args:
+            path (str or list of str, optional): 
+                The directories to refresh.  If not set, refreshes all indexed
+                directories.
+            max_age (float, optional): Only refresh the listings older than 
+                                       this many seconds
+        
+        Returns:
+            (list of str): The directories whose listing changed
+        """
+        if self._offline:
+            raise RuntimeError('The mirror is offline')
+        if path is None:
+            paths = self.indexed_paths()
+        elif isinstance(path, str):
+            paths = [path]
+        else:
+            paths = list(path)
+        
+        changed = []
+        for path in paths:
+            path = self._normalize(path)
+            entry = self._lookup(path)
+            if (entry is not None) and (max_age is not None) and \
+               (time.time() - entry[1] < max_age):
+                continue
+            entries = self._remote_ls(path)
+            if (entry is None) or (sorted(entry[0]) != sorted(entries)):
+                changed.append(path)
+        return changed
+    
+    def _cd(self, path: str):
+        self._cwd = path
+
+    def _execute(self, sql, params=()):
+        """Execute a statement on the index and return all rows"""
+        conn = sqlite3.connect(self.index_path, timeout=30.0)
+        try:
+            with conn:
+                rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        return rows
+
+    def _lookup(self, path):
+        """The indexed listing and update time of a directory, or None"""
+        rows = self._execute('SELECT entries, updated FROM listings ' \
+                             'WHERE path = ?', (path,))
+        if len(rows) == 0:
+            return None
+        return (json.loads(rows[0][0]), rows[0][1])
+
+    def _ls(self, path: str):
+        path = self._normalize(path)
+        entry = self._lookup(path)
+        if entry is not None:
+            if self._offline or (self._max_age is None) or \
+               (time.time() - entry[1] < self._max_age):
+                return entry[0]
+        if self._offline:
+            raise FileNotFoundError('{} is not in the index'.format(path))
+        return self._remote_ls(path)
+    
+    def _normalize(self, path):
+        path = str(path)
+        if len(path) > 1:
+            path = path.rstrip('/')
+        return path
+
+    def _remote_ls(self, path):
+        """List a directory in the archive and store it in the index"""
+        entries = self._remote.ls(path, fullpath=True)
+        self._execute('INSERT OR REPLACE INTO listings VALUES (?, ?, ?)',
+                      (path, json.dumps(entries), time.time()))
+        return entries
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit current context"""
+        if self._remote is not None:
+            return self._remote.__exit__(exc_type, exc_value, traceback)
+    
+    def __repr__(self):
+        return '<BatseMirror: {0}; {1}>'.format(self._mirror_dir, 
+                                      'offline' if self._offline else 
+                                      repr(self._remote))
@@ -0,0 +1,255 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import numpy as np
+
+from ..frame import _radec_to_vectors, _rotate_inverse
+from .attitude import _R_EARTH_KM, _find_gaps
+from .detectors import BatseDetectors
+
+__all__ = ['BatseOccultation']
+
+class BatseOccultation():
+    """The Earth occultation of one or more sky positions, and the angles 
+    from the sky positions to the detectors, at each record of BATSE 
+    continuous data.  All records and sky positions are evaluated together.
+    
+    A sky position is occulted when it is within the apparent angular radius
+    of the Earth, as in 
+    :meth:`~gdt.core.coords.SpacecraftFrame.location_visible`.  Rise and set
+    times are not reported within gaps in the records, such as SAA passages
+    or telemetry losses.
+    
+    Parameters:
+        times (np.array): The times of the records in TJD
+        quaternions (np.array): The (N, 4) attitude quaternions, in 
+                                (x, y, z, w) order
+        positions (np.array): The (N, 3) spacecraft positions in km
+        ra (float or np.array): The RA of the sky position(s) in degrees
+        dec (float or np.array): The Dec of the sky position(s) in degrees
+        max_gap (float, optional): 
+            The longest interval between records, in seconds, that is not a 
+            gap.  If not set, intervals longer than 10 times the median 
+            interval are gaps.
+    """
+    def __init__(self, times, quaternions, positions, ra, dec, max_gap=None):
+        times = np.asarray(times, dtype=float).reshape(-1)
+        quaternions = np.asarray(quaternions, dtype=float).reshape(-1, 4)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        if (quaternions.shape[0] != times.size) or \
+           (positions.shape[0] != times.size):
+            raise ValueError('times, quaternions, and positions must have ' \
+                             'the same number of records')
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if ra.shape != dec.shape or ra.ndim != 1:
+            raise ValueError('ra and dec must be scalars or 1D arrays of the ' \
+                             'same size')
+        
+        # sort the records by time
+        order = np.argsort(times, kind='stable')
+        self._times = times[order]
+        self._quats = quaternions[order]
+        self._ra = ra
+        self._dec = dec
+        self._sources = _radec_to_vectors(ra, dec)
+        self._gaps = _find_gaps(self._times, max_gap)
+        
+        # cosine of the angle between each source and the geocenter, and of
+        # the angular radius of the Earth
+        positions = positions[order]
+        dist = np.sqrt(np.einsum('ij,ij->i', positions, positions))
+        geo = -positions / dist[:, np.newaxis]
+        self._cos_geo = geo @ self._sources.T
+        self._cos_radius = np.sqrt(1.0 - np.clip(_R_EARTH_KM / dist, 0.0, 1.0)**2)
+        self._occulted = self._cos_geo >= self._cos_radius[:, np.newaxis]
+        
+        self._det_angles = None
+    
+    @property
+    def dec(self):
+        """(np.array): The Dec of the sky positions"""
+        return self._dec
+
+    @property
+    def detector_angles(self):
+        """(np.array): The (num_records, num_sources, 16) angles in degrees
+        between each sky position and each detector normal"""
+        if self._det_angles is None:
+            vectors = self.source_vectors()
+            angles = BatseDetectors.angles_to(vectors.reshape(-1, 3))
+            self._det_angles = angles.reshape(self.num_records, 
+                                              self.num_sources, -1)
+        return self._det_angles
+
+    @property
+    def earth_angular_radius(self):
+        """(np.array): The apparent angular radius of the Earth in degrees 
+        at each record"""
+        return np.rad2deg(np.arccos(self._cos_radius))
+    
+    @property
+    def geocenter_angles(self):
+        """(np.array): The (num_records, num_sources) angles in degrees 
+        between each sky position and the geocenter"""
+        return np.rad2deg(np.arccos(np.clip(self._cos_geo, -1.0, 1.0)))
+
+    @property
+    def num_records(self):
+        """(int): The number of records"""
+        return self._times.size
+    
+    @property
+    def num_sources(self):
+        """(int): The number of sky positions"""
+        return self._ra.size
+    
+    @property
+    def occulted(self):
+        """(np.array(dtype=bool)): The (num_records, num_sources) mask that is
+        True where the sky position is occulted by the Earth"""
+        return self._occulted
+    
+    @property
+    def ra(self):
+        """(np.array): The RA of the sky positions"""
+        return self._ra
+    
+    @property
+    def times(self):
+        """(np.array): The times of the records in TJD"""
+        return self._times
+
+    @property
+    def visible(self):
+        """(np.array(dtype=bool)): The (num_records, num_sources) mask that is
+        True where the sky position is not occulted by the Earth"""
+        return ~self._occulted
+
+    def detector_visibility(self, max_angle=90.0):
+        """A mask of the records where each sky position is not occulted and
+        is within an angle of each detector normal.
+        
+        Args:
+            max_angle (float, optional): The maximum angle in degrees between
+                                         the sky position and the detector 
+                                         normal. Default is 90.
+        
+        Returns:
+            (np.array(dtype=bool)): The (num_records, num_sources, 16) mask
+        """
+        return (self.detector_angles < max_angle) & \
+               ~self._occulted[:, :, np.newaxis]
+
+    def rise_times(self, source=0):
+        """The times at which a sky position rises from behind the Earth, 
+        interpolated between the records.
+        
+        Args:
+            source (int, optional): The index of the sky position. Default is 0.
+        
+        Returns:
+            (np.array): The rise times in TJD
+        """
+        return self._transition_times(source, rising=True)
+
+    def set_times(self, source=0):
+        """The times at which a sky position sets behind the Earth, 
+        interpolated between the records.
+        
+        Args:
+            source (int, optional): The index of the sky position. Default is 0.
+        
+        Returns:
+            (np.array): The set times in TJD
+        """
+        return self._transition_times(source, rising=False)
+
+    def source_vectors(self):
+        """The unit vectors of the sky positions in the spacecraft frame at 
+        each record.
+        
+        Returns:
+            (np.array): The (num_records, num_sources, 3) unit vectors
+        """
+        return _rotate_inverse(self._quats[:, np.newaxis, :], 
+                               self._sources[np.newaxis, :, :])
+
+    @classmethod
+    def from_phaii(cls, phaii_multi, ra, dec, max_gap=None):
+        """Calculate the occultation from the records of a BATSE CONT or 
+        DISCLA file.
+        
+        Args:
+            phaii_multi (:class:`~gdt.missions.cgro.batse.phaii.BatsePhaiiMulti`):
+                The continuous data containing the attitude and position 
+                records
+            ra (float or np.array): The RA of the sky position(s) in degrees
+            dec (float or np.array): The Dec of the sky position(s) in degrees
+            max_gap (float, optional): 
+                The longest interval between records, in seconds, that is not
+                a gap.  If not set, intervals longer than 10 times the median 
+                interval are gaps.
+        
+        Returns:
+            (:class:`BatseOccultation`)
+        """
+        return cls(*phaii_multi._attitude_records(), ra, dec, max_gap=max_gap)
+
+    def _transition_times(self, source, rising):
+        """The times the occultation of a sky position changes, found by 
+        linear interpolation of the cosine of the geocenter angle relative
+        to the Earth's angular radius.  Changes across a gap in the records 
+        are not reported, since the time of the change is unknown.
+        """
+        occulted = self._occulted[:, source]
+        if rising:
+            change = occulted[:-1] & ~occulted[1:]
+        else:
+            change = ~occulted[:-1] & occulted[1:]
+        idx = np.flatnonzero(change & ~self._gaps)
+        
+        diff = self._cos_geo[:, source] - self._cos_radius
+        frac = diff[idx] / (diff[idx] - diff[idx + 1])
+        return self._times[idx] + frac * (self._times[idx + 1] - self._times[idx])
+
+    def __repr__(self):
+        return '<BatseOccultation: {0} records; {1} sources>'.format(
+                                           self.num_records, self.num_sources)
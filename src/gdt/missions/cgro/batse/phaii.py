@@ -39,18 +39,24 @@
 # the License.
 
 import os
+import mmap
+import json
+import shutil
+import hashlib
+import tempfile
+import warnings
+from collections import namedtuple
+from pathlib import Path
 import numpy as np
 import astropy.io.fits as fits
-from astropy.coordinates import SkyCoord
 import astropy.coordinates.representation as r
 
-from gdt.core.coords import SpacecraftAxes
 from gdt.core.coords.spacecraft import SpacecraftFrameModelMixin
 from gdt.core.file import FitsFileContextManager
 from gdt.core.phaii import Phaii
 from gdt.core.data_primitives import Ebounds, Gti, TimeEnergyBins, TimeBins
 from ..frame import *
-from ..time import Time, from_day_time, to_day_time
+from ..time import Time, from_day_time, to_day_time, day_time_to_cgro
 from .detectors import BatseDetectors
 from .headers import *
 
@@ -58,6 +64,41 @@ from .headers import *
 __all__ = ['BatsePhaii', 'BatsePhaiiMulti', 'BatsePhaiiCont', 
            'BatsePhaiiDiscla', 'BatsePhaiiTrigger', 'BatseEnergyCalib']
 
+# columns always read from multi-detector files
+_required_columns = ('MID_TIME', 'COUNTS', 'DEADTIME')
+# columns with a detector axis
+_detector_columns = ('COUNTS', 'DEADTIME')
+# columns needed to build the spacecraft frame
+_frame_columns = ('X_RA', 'X_DEC', 'Z_RA', 'Z_DEC', 'X_POS', 'Y_POS', 'Z_POS')
+
+# the header definitions for non-trigger files, in order of preference
+_cont_headers = (PhaiiContHeaders, PhaiiContHeadersAlt1, PhaiiContHeadersAlt2)
+_discla_headers = (PhaiiDisclaHeaders, PhaiiDisclaHeadersAlt1, 
+                   PhaiiDisclaHeadersAlt2)
+
+# the version of the binary cache format; caches of other versions are rebuilt
+_cache_version = 1
+# the suffix of the cache directory of a file
+_cache_suffix = '.npcache'
+
+# the units and descriptions of the energy calibration columns
+_ecalib_columns = {
+    'CAL_DET': (None, 'Detector number: use to index cal. data'),
+    'CAL_STRT': ('TJD', 'Start time of the calibration record'),
+    'CAL_STOP': ('TJD', 'Stop time of the calibration record'),
+    'E_EDGES': ('keV', 'Energy edges for each selected detector'),
+    'WIDTH64': (None, 'Integer value of Width64 (SDs only)'),
+    'LINE_NRG': ('keV', 'Centroid energy of 4 calibration lines'),
+    'LINECHAN': (None, 'Centroid channel of 4 calibration lines'),
+    'DET_S_ZN': ('deg', 'Zenith of the source in detector coords'),
+    'DET_E_ZN': ('deg', 'Zenith of the Earth in detector coords'),
+    'CAL_NAME': (None, 'Name of the channel-to-energy scheme used')}
+
+# the indexed energy calibration of a detector
+_DetectorCalib = namedtuple('_DetectorCalib', ['time_edges', 'starts', 
+                                               'start_order', 'stops', 
+                                               'stop_order', 'e_edges'])
+
 class BatseTimeEnergyBins(TimeEnergyBins):
     """Sub-class from gdt-core to add a tolerance in the calculating segments.
     Eventually this should be addressed in gdt-core.
@@ -241,9 +282,100 @@ class BatsePhaii(Phaii):
                                   detector=self.detector)
 
     def _build_headers(self, trigtime, tstart, tstop, num_chans):
+        return self._update_headers(self.headers.copy(), trigtime, tstart, 
+                                    tstop, num_chans)
+
+    def _build_hdulist(self):
+        headers = self._file_headers()
+
+        # create FITS and primary header
+        hdulist = fits.HDUList()
+        primary_hdu = fits.PrimaryHDU(header=headers['PRIMARY'])
+        hdulist.append(primary_hdu)
         
-        headers = self.headers.copy()
+        # the ecalib extension
+        ecalib_hdu = self._ecalib_table(headers)
+        hdulist.append(ecalib_hdu)
         
+        # the spectrum extension
+        spectrum_hdu = self._spectrum_table(headers)
+        hdulist.append(spectrum_hdu)        
+        
+        return hdulist
+        
+    def _ecalib_table(self, headers):
+        if self.ecalib is None:
+            raise RuntimeError('An energy calibration is required to write ' \
+                               'the PHAII file')
+        e_edges = np.append(self.data.emin, self.data.emax[-1])
+        return self.ecalib.to_data_hdu(e_edges, *self.data.time_range,
+                                       header=headers['BATSE_E_CALIB'])
+
+    def _file_headers(self):
+        """The headers of the burst spectra file.  Headers of continuous data
+        are converted to the burst spectra headers.
+        """
+        if isinstance(self.headers, (PhaiiTriggerHeaders, 
+                                     PhaiiTriggerTtsHeaders)):
+            headers = self.headers.copy()
+        else:
+            headers = PhaiiTriggerHeaders()
+            if self.headers is not None:
+                for key, val in self.headers['PRIMARY'].items():
+                    if key in headers['PRIMARY'] and \
+                       key not in ('COMMENT', 'HISTORY', 'DATE'):
+                        headers['PRIMARY'][key] = val
+            
+            dets = self.detector
+            if not isinstance(dets, (list, tuple)):
+                dets = [dets]
+            dets = [det for det in dets if det is not None]
+            if len(dets) > 0:
+                spec_header = headers['BATSE BURST SPECTRA']
+                spec_header['DSELECT'] = _dselect([det.number for det in dets])
+                spec_header['DET_MODE'] = 'SD' if dets[0].number > 7 else 'LAD'
+        
+        # times of data without a trigger are relative to the reference epoch
+        if self.trigtime is None:
+            headers['BATSE BURST SPECTRA']['BASETIME'] = self.data.tstart[0]
+        
+        return self._update_headers(headers, self.trigtime, 
+                                    *self.data.time_range, self.num_chans)
+
+    def _spectrum_table(self, headers):
+        tstart = self.data.tstart
+        tstop = self.data.tstop
+        if self.trigtime is None:
+            basetime = headers['BATSE BURST SPECTRA']['BASETIME']
+            tstart = (tstart - basetime) * 86400.0
+            tstop = (tstop - basetime) * 86400.0
+        times = np.column_stack((tstart, tstop))
+        rates = self.data.rates
+        errors = self.data.rate_uncertainty
+        
+        times_col = fits.Column(name='TIMES', format=_float_format(times, 2), 
+                                unit='s', array=times)
+        rates_col = fits.Column(name='RATES', unit='count /s',
+                                format=_float_format(rates, self.num_chans),
+                                array=rates)
+        errors_col = fits.Column(name='ERRORS', unit='count /s',
+                                 format=_float_format(errors, self.num_chans),
+                                 array=errors)        
+        
+        hdu = fits.BinTableHDU.from_columns([times_col, rates_col, errors_col], 
+                                     header=headers['BATSE BURST SPECTRA'])
+
+        for key, val in headers['BATSE BURST SPECTRA'].items():
+            hdu.header[key] = val
+        hdu.header.comments['TTYPE1'] = 'Array of rate start and stop times'
+        hdu.header.comments['TUNIT1'] = 'Seconds since BSTST'
+        hdu.header.comments['TTYPE2'] = 'N_Channel X N_Times array of rates'
+        hdu.header.comments['TTYPE3'] = 'N_Channel X N_Times array of errors'
+        return hdu
+
+    def _update_headers(self, headers, trigtime, tstart, tstop, num_chans):
+        """Update the time range and channel keywords of the headers.
+        """
         trig_day, trig_secs = (None, None)
         if trigtime is not None:
             time_obj = Time(trigtime, format='cgro')
@@ -272,107 +404,6 @@ class BatsePhaii(Phaii):
                    
         return headers
 
-    def _build_hdulist(self):
-        raise NotImplementedError
-        
-        # create FITS and primary header
-        hdulist = fits.HDUList()
-        primary_hdu = fits.PrimaryHDU(header=self.headers['PRIMARY'])
-        for key, val in self.headers['PRIMARY'].items():
-            primary_hdu.header[key] = val
-        hdulist.append(primary_hdu)
-        
-        # the ecalib extension
-        ecalib_hdu = self._ecalib_table()
-        hdulist.append(ecalib_hdu)
-        
-        # the spectrum extension
-        spectrum_hdu = self._spectrum_table()
-        hdulist.append(spectrum_hdu)        
-        
-        return hdulist
-        
-    def _ecalib_table(self):
-        raise NotImplementedError
-        
-        num_det = self.ecalib.num_det
-        cal_det_col = fits.Column(name='CAL_DET', format='{}I'.format(num_det),
-                                  array=self.ecalib.det)
-        cal_strt_col = fits.Column(name='CAL_STRT', 
-                                   format='{}D'.format(num_det), unit='TJD',
-                                   array=self.ecalib.cal_start)
-        cal_stop_col = fits.Column(name='CAL_STOP', 
-                                   format='{}D'.format(num_det), unit='TJD', 
-                                   array=self.ecalib.cal_start)
-        
-        e_edges = np.append(self.ebounds.low_edges(), self.ebounds.range[1])
-        
-        e_edges_col = fits.Column(name='E_EDGES', unit='keV',
-                                  format='{}E'.format(e_edges.size),
-                                 array=e_edges.reshape(self.ecalib.num_det, -1))
-        width64_col = fits.Column(name='WIDTH64', format='{}I'.format(num_det), 
-                                  array=self.ecalib.width64)
-        line_nrg_col = fits.Column(name='LINE_NRG', format='4E', unit='keV',
-                                   array=self.ecalib.line_energy)
-        line_chan_col = fits.Column(name='LINECHAN', format='4E',
-                                    array=self.ecalib.line_chan)
-        det_s_zn_col = fits.Column(name='DET_S_ZN',
-                                   format='{}E'.format(num_det), unit='deg',
-                                   array=self.ecalib.det_s_zn)
-        det_e_zn_col = fits.Column(name='DET_E_ZN', 
-                                   format='{}E'.format(num_det), unit='deg',
-                                   array=self.ecalib.det_e_zn)
-        cal_name_col = fits.Column(name='CAL_NAME', format='16A',
-                                   array=self.ecalib.cal_name)
-
-        hdu = fits.BinTableHDU.from_columns([cal_det_col, cal_strt_col, 
-                                             cal_stop_col, e_edges_col, 
-                                             width64_col, line_nrg_col, 
-                                             line_chan_col, det_s_zn_col,
-                                             det_e_zn_col, cal_name_col], 
-                                           header=self.headers['BATSE_E_CALIB'])
-        for key, val in self.headers['BATSE_E_CALIB'].items():
-            hdu.header[key] = val
-        hdu.header.comments['TTYPE1'] = 'Detector number: use to index cal. data'
-        hdu.header.comments['TTYPE2'] = 'Start time of the calibration record'
-        hdu.header.comments['TUNIT2'] = 'Truncated Julian days'
-        hdu.header.comments['TTYPE3'] = 'Stop time of the calibration record'
-        hdu.header.comments['TUNIT3'] = 'Truncated Julian days'
-        hdu.header.comments['TTYPE4'] = 'Energy edges for each selected detector'
-        hdu.header.comments['TTYPE5'] = 'Integer value of Width64 (SDs only)'
-        hdu.header.comments['TTYPE6'] = 'Centroid energy of 4 calibration lines'
-        hdu.header.comments['TTYPE7'] = 'Centroid channel of 4 calibration lines'
-        hdu.header.comments['TTYPE8'] = 'Zenith of the source in detector coords'
-        hdu.header.comments['TTYPE9'] = 'Zenith of the Earth in detector coords'
-        hdu.header.comments['TTYPE10'] = 'Name of the channel-to-energy scheme used'
-        return hdu
-
-    def _spectrum_table(self):
-        raise NotImplementedError
-
-        tstart = np.copy(self.data.tstart)
-        tstop = np.copy(self.data.tstop)
-        times = np.vstack((tstart, tstop)).T
-        times_col = fits.Column(name='TIMES', format='2E', unit='s',
-                                array=times)
-        rates_col = fits.Column(name='RATES', unit='count /s',
-                                format='{}E'.format(self.num_chans),
-                                array=self.data.rates)
-        errors_col = fits.Column(name='ERRORS', unit='count /s',
-                                 format='{}E'.format(self.num_chans),
-                                 array=self.data.rate_uncertainty)        
-        
-        hdu = fits.BinTableHDU.from_columns([times_col, rates_col, errors_col], 
-                                     header=self.headers['BATSE BURST SPECTRA'])
-
-        for key, val in self.headers['BATSE BURST SPECTRA'].items():
-            hdu.header[key] = val
-        hdu.header.comments['TTYPE1'] = 'Array of rate start and stop times'
-        hdu.header.comments['TUNIT1'] = 'Seconds since BSTST'
-        hdu.header.comments['TTYPE2'] = 'N_Channel X N_Times array of rates'
-        hdu.header.comments['TTYPE3'] = 'N_Channel X N_Times array of errors'
-        return hdu
-
 
 class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
     """BATSE data containing PHAII from multiple detectors.  This is typically
@@ -389,15 +420,20 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
         self._tstop = None
         self._exposure = None
         self._frame = None
+        self._det_index = None
 
     @property
     def detectors(self):
         """(list): The detectors in the file"""
+        if self._det_index is not None:
+            return sorted(self._det_index.keys())
         return self._ecalib.detectors
 
     @property
     def num_dets(self):
         """(int): Number of detectors in the file"""
+        if self._det_index is not None:
+            return len(self._det_index)
         return self._ecalib.num_dets
     
     def get_detector(self, det_var):
@@ -409,15 +445,8 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
         Returns:
             (:class:`BatsePhaii``)
         """
-        if isinstance(det_var, BatseDetectors):
-            num = det_var.number
-        elif isinstance(det_var, str):
-            num = BatseDetectors.from_str(det_var).number
-        elif isinstance(det_var, int):
-            num = det_var
-        else:
-            raise TypeError('det_var must be a str, int, or BatseDetectors ' \
-                            'object')
+        num = _det_number(det_var)
+        idx = self._plane_index(num)
 
         ecalib_det = self._ecalib.get_detector(num)
         e_edges = ecalib_det.edges_over_timespan(num, self._tstart[0], 
@@ -425,9 +454,9 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
         
         if self._filetype == 'cont':
         
-            teb = BatseTimeEnergyBins(self._data['COUNTS'][:,:,num], 
+            teb = BatseTimeEnergyBins(self._data['COUNTS'][:,:,idx], 
                                       self._tstart, self._tstop, 
-                                      self._exposure[:,num], 
+                                      self._exposure[:,idx], 
                                       e_edges[:-1], e_edges[1:])
 
             return BatsePhaiiCont.from_data(teb, headers=self._headers, 
@@ -439,16 +468,16 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
             # in DISCLA, the first 4 channels are the discriminator channels,
             # channel 5 is the uncoincidenced total LAD rate (counts?), and the 
             # channel 6 is the total CPD rate (counts?)
-            teb = BatseTimeEnergyBins(self._data['COUNTS'][:,:4,num], 
+            teb = BatseTimeEnergyBins(self._data['COUNTS'][:,:4,idx], 
                                       self._tstart, self._tstop, 
-                                      self._exposure[:,num], 
+                                      self._exposure[:,idx], 
                                       e_edges[:-1], e_edges[1:])
 
-            lad_lc = BatseTimeBins(self._data['COUNTS'][:,4,num], self._tstart, 
-                                   self._tstop, self._exposure[:,num])
+            lad_lc = BatseTimeBins(self._data['COUNTS'][:,4,idx], self._tstart, 
+                                   self._tstop, self._exposure[:,idx])
             
-            cpd_lc = BatseTimeBins(self._data['COUNTS'][:,5,num], self._tstart, 
-                                   self._tstop, self._exposure[:,num])
+            cpd_lc = BatseTimeBins(self._data['COUNTS'][:,5,idx], self._tstart, 
+                                   self._tstop, self._exposure[:,idx])
                     
             return BatsePhaiiDiscla.from_data(teb, headers=self._headers, 
                                               ecalib=ecalib_det, 
@@ -462,53 +491,93 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
         Returns:
             (:class:`CgroFrame`)
         """
-        x_axis = SkyCoord(self._data['X_RA'], self._data['X_DEC'], unit='deg')
-        z_axis = SkyCoord(self._data['Z_RA'], self._data['Z_DEC'], unit='deg')
-        axes = SpacecraftAxes(x_pointing=x_axis, z_pointing=z_axis)
-        sc_frame = CgroFrame(obstime=Time(self._data['MID_TIME'], format='cgro'),
+        self._check_frame_columns()
+        sc_frame = CgroFrame.from_pointings(self._data['X_RA'], 
+                                            self._data['X_DEC'],
+                                            self._data['Z_RA'], 
+                                            self._data['Z_DEC'],
+                             obstime=Time(self._data['MID_TIME'], format='cgro'),
                              obsgeoloc = r.CartesianRepresentation(
                                              x=self._data['X_POS'], 
                                              y=self._data['Y_POS'],
                                              z=self._data['Z_POS'], unit='km'),
-                            axes=axes, detectors=BatseDetectors)
+                             detectors=BatseDetectors)
         return sc_frame
 
     @classmethod
-    def open(cls, file_path, **kwargs):
+    def open(cls, file_path, dets=None, columns=None, cache=False, 
+             cache_dir=None, **kwargs):
         """Open a BATSE file containing PHA time series from multiple detectors.
         
+        If ``dets`` or ``columns`` are set, only the requested detectors and
+        columns are read from the file and the remainder of the data table is
+        released.  If the file is uncompressed, the data are memory-mapped and 
+        are only read from disk when accessed.  In this mode, the count arrays 
+        are read-only and the detectors returned by :meth:`get_detector` are 
+        views of the file data, so they must be copied before being modified.
+        
+        If ``cache`` is True, the decoded headers, energy calibration, and data 
+        table are written to an uncompressed binary cache the first time the 
+        file is opened, and are memory-mapped from the cache on later opens 
+        instead of decompressing and parsing the file.  The cache is keyed by 
+        the checksum of the file, so it is rebuilt if the file changes.  Data 
+        read from the cache are read-only, as for an uncompressed file, and 
+        the :attr:`hdulist` of the file is not available.
+        
         Args:
             file_path (str): The file path
+            dets (list of str, int, or :class:`BatseDetectors`, optional):
+                The detectors to read.  If not set, reads all detectors.
+            columns (list of str, optional): 
+                The columns to read in addition to MID_TIME, COUNTS, and 
+                DEADTIME.  If not set, reads all columns.  The spacecraft frame 
+                requires the X_RA, X_DEC, Z_RA, Z_DEC, X_POS, Y_POS, and Z_POS
+                columns.
+            cache (bool, optional): If True, use the binary cache of the file.
+                                    Default is False.
+            cache_dir (str, optional): 
+                The directory of the cache.  If not set, the cache is stored 
+                next to the file.
         
         Returns:
             (:class:`BatsePhaiiMulti`)
         """
-        obj = super().open(file_path, **kwargs)
+        store = None
+        if cache:
+            cache_path = _cache_path(file_path, cache_dir)
+            checksum = _file_checksum(file_path)
+            store = _read_cache(cache_path, checksum)
+        
+        if store is not None:
+            obj = cls()
+            obj._filename = Path(file_path).name
+            hdrs, ecalib_data, table = store
+        else:
+            obj = super().open(file_path, **kwargs)
+            hdrs = [hdu.header for hdu in obj.hdulist]
+            ecalib_data = obj.hdulist[1].data
+            table = obj.hdulist[2].data
         
-        hdrs = [hdu.header for hdu in obj.hdulist]
         if 'cont_' in obj.filename:
-            try:
-                headers = PhaiiContHeaders.from_headers(hdrs)
-            except:
-                try:
-                    headers = PhaiiContHeadersAlt1.from_headers(hdrs)
-                except:
-                    headers = PhaiiContHeadersAlt2.from_headers(hdrs)
+            headers = detect_headers(hdrs, _cont_headers).from_headers(hdrs)
             filetype = 'cont'
         elif 'discla_' in obj.filename:
-            try:
-                headers = PhaiiDisclaHeaders.from_headers(hdrs)
-            except:
-                try:
-                    headers = PhaiiDisclaHeadersAlt1.from_headers(hdrs)
-                except:
-                    headers = PhaiiDisclaHeadersAlt2.from_headers(hdrs)
+            headers = detect_headers(hdrs, _discla_headers).from_headers(hdrs)
             filetype = 'discla'
         else:
             raise RuntimeError('Unsupported filetype or not a PHAII file.')
         
-        obj._ecalib = BatseEnergyCalib.from_hdu(obj.hdulist[1].data)
-        obj._data = obj.hdulist[2].data
+        if cache and store is None:
+            _write_cache(cache_path, checksum, hdrs, ecalib_data, table)
+        
+        obj._ecalib = BatseEnergyCalib.from_hdu(ecalib_data)
+        if dets is None and columns is None:
+            obj._data = table
+        else:
+            obj._data = obj._read_columns(table, dets, columns)
+            if obj._hdulist is not None:
+                # release the full table; only the columns read are referenced
+                del obj._hdulist[2].data
         obj._headers = headers
         obj._filetype = filetype
 
@@ -525,7 +594,7 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
         obj.close()
         return obj
         
-    def sum_detectors(self, det_var_list=None):
+    def sum_detectors(self, det_var_list=None, weights=None):
         """Sum data over multiple detectors and return a Phaii object.
         
         Note::
@@ -535,41 +604,74 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
         Args:
             det_var_list (list of str, int, or :class:`BatseDetectors`, optional)
                 If not set, will sum all available detectors.
+            weights (np.array, optional):
+                The weight of each detector in the sum, either one weight per
+                detector or an array of shape (num_times, num_dets) for weights
+                that change with time, such as the cosine of the source angle.
+                If set, the count uncertainties are propagated from the 
+                weights.  If not set, the counts are summed without weights.
         
         Returns:
             (:class:`BatsePhaii``)
         """
         if det_var_list is None:
             det_var_list = self.detectors
-        phaiis = [self.get_detector(det_var) for det_var in det_var_list]
-        num_phaiis = len(phaiis)
-        
-        counts = np.copy(phaiis[0].data.counts)
-        exposure = np.copy(phaiis[0].data.exposure)
+        nums = [_det_number(det_var) for det_var in det_var_list]
+        idx = [self._plane_index(num) for num in nums]
+        num_dets = len(idx)
+        
+        # (num_times, num_chans, num_dets) for the selected detectors
+        counts = self._data['COUNTS'][:,:,idx]
+        exposure = self._exposure[:,idx].sum(axis=1) / num_dets
+        
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            if weights.shape not in [(num_dets,), (counts.shape[0], num_dets)]:
+                raise ValueError('weights must have shape (num_dets,) or ' \
+                                 '(num_times, num_dets)')
+            # broadcast over the channel axis
+            if weights.ndim == 2:
+                weights = weights[:,np.newaxis,:]
+            count_var = (counts * weights**2).sum(axis=2)
+            counts = (counts * weights).sum(axis=2)
+            count_uncerts = np.sqrt(count_var)
+        else:
+            counts = counts.sum(axis=2)
+            count_uncerts = None
         
-        for i in range(1, num_phaiis):
-            counts += phaiis[i].data.counts
-            exposure += phaiis[i].data.exposure
-        exposure /= num_phaiis
-
-        ecalibs = [phaii.ecalib for phaii in phaiis]
+        ecalibs = [self._ecalib.get_detector(num) for num in nums]
         ecalib_sum = BatseEnergyCalib.combine_detectors(ecalibs)
-        e_edges = ecalib_sum.edges_over_timespan(det_var_list[0], self._tstart[0], 
-                                                    self._tstop[-1])
-        
-        data = BatseTimeEnergyBins(counts, phaiis[0].data.tstart, 
-                                   phaiis[0].data.tstop, exposure, e_edges[:-1],
-                                   e_edges[1:])
+        e_edges = ecalib_sum.edges_over_timespan(nums[0], self._tstart[0], 
+                                                 self._tstop[-1])
         
-        dets = [phaii.detector for phaii in phaiis]
+        dets = [BatseDetectors.from_num(num) for num in nums]
         
         if self._filetype == 'cont':
-            obj = BatsePhaiiCont.from_data(data, headers=phaiis[0].headers,
+            data = BatseTimeEnergyBins(counts, self._tstart, self._tstop, 
+                                       exposure, e_edges[:-1], e_edges[1:],
+                                       count_uncerts=count_uncerts)
+            obj = BatsePhaiiCont.from_data(data, headers=self._headers,
                                            ecalib=ecalib_sum, detector=dets)
         elif self._filetype == 'discla':
-            lad_lc = BatseTimeBins.sum([phaii.lad_lightcurve for phaii in phaiis])
-            cpd_lc = BatseTimeBins.sum([phaii.cpd_lightcurve for phaii in phaiis])
-            obj = BatsePhaiiDiscla.from_data(data, headers=phaiis[0].headers,
+            # in DISCLA, the first 4 channels are the discriminator channels, 
+            # and channels 5 and 6 are the total LAD and CPD rates
+            if count_uncerts is None:
+                spec_uncerts = None
+                count_uncerts = np.sqrt(counts)
+            else:
+                spec_uncerts = count_uncerts[:,:4]
+            data = BatseTimeEnergyBins(counts[:,:4], self._tstart, self._tstop, 
+                                       exposure, e_edges[:-1], e_edges[1:],
+                                       count_uncerts=spec_uncerts)
+            
+            lad_lc = BatseTimeBins(counts[:,4].astype(float), self._tstart, 
+                                   self._tstop, exposure, 
+                                   count_uncerts=count_uncerts[:,4])
+            cpd_lc = BatseTimeBins(counts[:,5].astype(float), self._tstart, 
+                                   self._tstop, exposure, 
+                                   count_uncerts=count_uncerts[:,5])
+            
+            obj = BatsePhaiiDiscla.from_data(data, headers=self._headers,
                                              ecalib=ecalib_sum, 
                                              detector=dets,
                                              data_lad_tot=lad_lc,
@@ -580,6 +682,127 @@ class BatsePhaiiMulti(FitsFileContextManager, SpacecraftFrameModelMixin):
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.num_dets} detectors>'
  
+    
+    def _attitude_records(self):
+        """The times, attitude quaternions, and positions of the records.
+        
+        Returns:
+            (np.array, np.array, np.array): The times in TJD, the (N, 4) 
+            quaternions in (x, y, z, w) order, and the (N, 3) positions in km
+        """
+        self._check_frame_columns()
+        quats = pointings_to_quaternion(self._data['X_RA'], 
+                                        self._data['X_DEC'], 
+                                        self._data['Z_RA'], 
+                                        self._data['Z_DEC'])
+        positions = np.stack((self._data['X_POS'], self._data['Y_POS'], 
+                              self._data['Z_POS']), axis=1)
+        return (self._data['MID_TIME'], quats, positions)
+
+    def _check_frame_columns(self):
+        """Check that the columns of the spacecraft frame were read"""
+        if isinstance(self._data, dict):
+            missing = [col for col in _frame_columns if col not in self._data]
+        else:
+            missing = []
+        if len(missing) > 0:
+            raise RuntimeError('Columns {} were not read from the ' \
+                               'file'.format(', '.join(missing)))
+    
+    def _detector_arrays(self, num, tstart, tstop):
+        """The counts, time edges, and exposure of a detector for the bins 
+        overlapping a time range.
+        
+        Args:
+            num (int): The detector number
+            tstart (float): The start of the time range
+            tstop (float): The end of the time range
+        
+        Returns:
+            (np.array, np.array, np.array, np.array): The counts, bin start 
+            times, bin stop times, and exposure
+        """
+        idx = self._plane_index(num)
+        mask = (self._tstop > tstart) & (self._tstart < tstop)
+        return (self._data['COUNTS'][mask,:,idx], self._tstart[mask], 
+                self._tstop[mask], self._exposure[mask,idx])
+    
+    def _plane_index(self, num):
+        """The index of a detector into the detector axis of the data.
+        
+        Args:
+            num (int): The detector number
+        
+        Returns:
+            (int)
+        """
+        if self._det_index is None:
+            return num
+        try:
+            return self._det_index[num]
+        except KeyError:
+            raise ValueError('Detector {} was not read from the ' \
+                             'file'.format(num))
+    
+    def _read_columns(self, table, dets, columns):
+        """Read the requested detectors and columns from the data table.  The
+        columns are views of the file if it is memory-mapped, otherwise only 
+        the requested columns and detector planes are copied from the table.
+        
+        Args:
+            table (astropy.io.fits.FITS_rec or dict): The data table
+            dets (list or None): The detectors to read
+            columns (list or None): The additional columns to read
+        
+        Returns:
+            (dict)
+        """
+        if isinstance(table, dict):
+            table_names = list(table.keys())
+        else:
+            table_names = table.names
+        if columns is None:
+            columns = table_names
+        names = list(_required_columns) + \
+                [col for col in columns if col not in _required_columns]
+        missing = [name for name in names if name not in table_names]
+        if len(missing) > 0:
+            raise ValueError('Columns {} are not in the ' \
+                             'file'.format(', '.join(missing)))
+        
+        all_dets = self._ecalib.detectors
+        if dets is None:
+            nums = all_dets
+        else:
+            nums = [_det_number(det) for det in dets]
+            for num in nums:
+                if num not in all_dets:
+                    raise ValueError('Detector {} is not in the ' \
+                                     'file'.format(num))
+        
+        # the detector columns are indexed the same way, so they are either 
+        # all views on the map or all copies of the requested detectors
+        det_memmapped = all([_is_memmap(table[name]) for name in names 
+                             if name in _detector_columns])
+        data = {}
+        for name in names:
+            col = table[name]
+            if name in _detector_columns:
+                if det_memmapped:
+                    # views on the map: only the pages accessed are read
+                    col = col.view()
+                else:
+                    col = col[..., nums]
+                col.flags.writeable = False
+            elif not _is_memmap(col):
+                col = np.array(col)
+            data[name] = col
+        
+        if det_memmapped:
+            self._det_index = {num: num for num in nums}
+        else:
+            self._det_index = {num: i for i, num in enumerate(nums)}
+        return data
 
 class BatsePhaiiCont(BatsePhaii):
     """The continuous CONT data."""
@@ -744,19 +967,29 @@ class BatsePhaiiTrigger(BatsePhaii):
         else:
             headers = PhaiiTriggerHeaders.from_headers(hdrs)
         
-        trigtime = from_day_time(hdrs[0]['TRIG-DAY'], hdrs[0]['TRIG-TIM'])
-
         ecalib = BatseEnergyCalib.from_hdu(obj.hdulist[1].data)
         
         tstart, tstop = obj.column(2, 'TIMES').astype(np.float64).T
         tstart = tstart.astype(float)
         tstop = tstop.astype(float)
         rates = obj.column(2, 'RATES').astype(float)
-        e_edges = ecalib.edges_over_timespan(ecalib.detectors[0], tstart[0],
-                                             tstop[-1])
                 
         #mark: FIXME exposures are not stored, so assume binwidths
         exposure = tstop - tstart
+        
+        # the times are relative to the trigger, or, for data written without
+        # a trigger, relative to the reference epoch
+        if hdrs[0]['TRIG-DAY'] > 0.0:
+            trigtime = day_time_to_cgro(hdrs[0]['TRIG-DAY'], 
+                                        hdrs[0]['TRIG-TIM'])
+        else:
+            trigtime = None
+            basetime = hdrs[2]['BASETIME']
+            tstart = basetime + tstart / 86400.0
+            tstop = basetime + tstop / 86400.0
+        
+        e_edges = ecalib.edges_over_timespan(ecalib.detectors[0], tstart[0],
+                                             tstop[-1])
         if rates.ndim == 2:
             counts = rates * exposure[:,np.newaxis]
         else:
@@ -767,7 +1000,7 @@ class BatsePhaiiTrigger(BatsePhaii):
         
         det = BatseDetectors.from_num(ecalib.detectors[0])
         obj.close()
-        return cls.from_data(teb, trigger_time=trigtime.cgro, ecalib=ecalib,
+        return cls.from_data(teb, trigger_time=trigtime, ecalib=ecalib,
                              headers=headers, filename=obj.filename, 
                              detector=det)
                 
@@ -782,11 +1015,13 @@ class BatseEnergyCalib():
     """
     def __init__(self):
         self._data = None
+        self._detectors = []
+        self._index = {}
     
     @property
     def detectors(self):
         """(list): The detectors in the calibration"""
-        return [int(d) for d in list(set(self._data['CAL_DET']))]
+        return list(self._detectors)
     
     @property
     def num_dets(self):
@@ -831,13 +1066,23 @@ class BatseEnergyCalib():
         # find the closest time interval that has a calibration
         tidx = self._time_index(det, time)
         
-        # mask the array for the detector
-        mask = self._data['CAL_DET'] == det
-        
         # retrieve the calibrated energy edges for detector and time
-        e_edges = self._data['E_EDGES'][mask,:][tidx,:]
+        e_edges = self._detector_calib(det).e_edges[tidx,:]
         return e_edges
 
+    def edges_at_times(self, det, times):
+        """The energy edges for a given detector at many times.
+        
+        Args:
+            det (int): The detector number
+            times (np.array): The CGRO METs
+        
+        Returns:
+            (np.array): Array of shape (num_times, num_edges)
+        """
+        tidx = self._time_indices(det, np.atleast_1d(times))
+        return self._detector_calib(det).e_edges[tidx,:]
+
     def edges_over_timespan(self, det, t0, t1):
         """The energy edges for a given detector covering a timespan.
         The timespan may cover multiple energy calibrations, so the energy
@@ -877,12 +1122,10 @@ class BatseEnergyCalib():
         dt = time_edges[1,:] - time_edges[0,:]
         weights = dt / dt.sum()
 
-        # mask the array for the detector
-        mask = self._data['CAL_DET'] == det
-        
-        e_edges = np.zeros_like(self._data['E_EDGES'][0,:])
+        det_edges = self._detector_calib(det).e_edges
+        e_edges = np.zeros_like(det_edges[0,:])
         for i in range(len(tidx)):
-            e_edges += self._data['E_EDGES'][mask,:][tidx[i],:] * weights[i]
+            e_edges += det_edges[tidx[i],:] * weights[i]
             
         return e_edges
     
@@ -897,9 +1140,79 @@ class BatseEnergyCalib():
             (:class:`BatseEnergyCalib`)
         """
         obj = cls()
+        if isinstance(hdu_data, fits.FITS_rec):
+            # a plain structured array is much faster to mask and copy
+            cols = {name: hdu_data[name] for name in hdu_data.names}
+            data = np.empty(len(hdu_data), dtype=[(name, col.dtype, col.shape[1:]) \
+                                                  for name, col in cols.items()])
+            for name, col in cols.items():
+                data[name] = col
+            hdu_data = data
         obj._data = hdu_data
+        obj._build_index()
         return obj        
 
+    def to_hdu(self, header=None, e_edges=None):
+        """Create a FITS HDU of the energy calibration table.  The table is 
+        written directly from the calibration data, so all of the columns 
+        read from a file are preserved.
+        
+        Args:
+            header (astropy.io.fits.Header, optional): The header of the HDU
+            e_edges (np.array, optional): 
+                If set, replaces the energy edges of all calibrations, e.g. 
+                for data that have been rebinned in energy.
+        
+        Returns:
+            (astropy.io.fits.BinTableHDU)
+        """
+        data = self._data
+        if e_edges is not None:
+            e_edges = np.asarray(e_edges)
+            if np.array_equal(e_edges.astype(np.float32), e_edges):
+                e_edges = e_edges.astype(np.float32)
+            dtype = [(name, e_edges.dtype, e_edges.shape) if name == 'E_EDGES' \
+                     else (name, data.dtype[name]) for name in data.dtype.names]
+            data = np.empty(data.size, dtype=dtype)
+            for name in data.dtype.names:
+                data[name] = e_edges if name == 'E_EDGES' else self._data[name]
+        
+        hdu = fits.BinTableHDU(data=data, header=header)
+        if header is not None:
+            for key, val in header.items():
+                hdu.header[key] = val
+        
+        for i, name in enumerate(data.dtype.names):
+            if name in _ecalib_columns:
+                unit, comment = _ecalib_columns[name]
+                hdu.header.comments['TTYPE{}'.format(i+1)] = comment
+                if unit is not None:
+                    hdu.header['TUNIT{}'.format(i+1)] = unit
+        return hdu
+
+    def to_data_hdu(self, e_edges, tstart, tstop, header=None):
+        """Create a FITS HDU of the energy calibration table for data with
+        the given energy edges.  The energy edges are recomputed from the 
+        calibration when a file is read, so the edges of the calibration are 
+        replaced if they differ from those of the data over the time span, 
+        e.g. for data that have been rebinned or sliced in energy.
+        
+        Args:
+            e_edges (np.array): The energy edges of the data
+            tstart (float): The start of the data time span
+            tstop (float): The end of the data time span
+            header (astropy.io.fits.Header, optional): The header of the HDU
+        
+        Returns:
+            (astropy.io.fits.BinTableHDU)
+        """
+        calib_edges = self.edges_over_timespan(self.detectors[0], tstart, 
+                                               tstop)
+        if calib_edges.size == e_edges.size and \
+           np.allclose(calib_edges, e_edges, rtol=1e-6, atol=0.0):
+            e_edges = None
+        return self.to_hdu(header=header, e_edges=e_edges)
+
     def get_detector(self, det):
         """Return a new :class:`BatseEnergyCalib` containing only the requested
         detector calibration.
@@ -913,32 +1226,277 @@ class BatseEnergyCalib():
         mask = self._data['CAL_DET'] == det
         return self.from_hdu(self._data[mask])
     
+    def _build_index(self):
+        """Index the calibration for each detector: the time edges, the 
+        sorted calibration start and stop times, and the energy edges.
+        """
+        cal_det = np.asarray(self._data['CAL_DET'])
+        self._detectors = [int(d) for d in list(set(cal_det))]
+        
+        self._index = {}
+        for det in self._detectors:
+            mask = cal_det == det
+            time_edges = np.vstack([self._data['CAL_STRT'][mask],
+                                    self._data['CAL_STOP'][mask]])
+            start_order = np.argsort(time_edges[0,:], kind='stable')
+            stop_order = np.argsort(time_edges[1,:], kind='stable')
+            self._index[det] = _DetectorCalib(time_edges, 
+                                              time_edges[0,start_order],
+                                              start_order, 
+                                              time_edges[1,stop_order], 
+                                              stop_order, 
+                                              self._data['E_EDGES'][mask,:])
+    
+    def _detector_calib(self, det):
+        """Return the indexed calibration for a detector
+        """
+        try:
+            return self._index[int(det)]
+        except KeyError:
+            raise ValueError(f'Detector {det} is not in the calibration')
+
     def _time_edges(self, det):
         """Return the calibration time edges for a detector
         """
-        # mask the array for the detector
-        mask = self._data['CAL_DET'] == det
-        time_edges = np.vstack([self._data['CAL_STRT'][mask],
-                                self._data['CAL_STOP'][mask]])
-
-        return time_edges
+        return self._detector_calib(det).time_edges
     
     def _time_index(self, det, time):
         """Retrieve the index into the calibration of the closest time interval.
         """
-        time_edges = self._time_edges(det)
-        
-        # find the closest time interval that has a calibration
-        idx0, idx1 = np.abs(time_edges - time).argmin(axis=1)
-        if idx0 != idx1:
-            idx_test = np.argmin([np.abs(time_edges[0,idx0] - time), 
-                                  np.abs(time_edges[1,idx1] - time)])
-            tidx = [idx0, idx1][idx_test]
-        else:
-            tidx = idx0
+        return int(self._time_indices(det, np.array([time]))[0])
+
+    def _time_indices(self, det, times):
+        """Retrieve the indices into the calibration of the closest time 
+        interval for each time.  The closest calibration start and stop are
+        found, and the closer of the two is chosen.
+        """
+        calib = self._detector_calib(det)
+        idx0 = _nearest_index(calib.starts, calib.start_order, times)
+        idx1 = _nearest_index(calib.stops, calib.stop_order, times)
         
-        return tidx   
+        dist0 = np.abs(calib.time_edges[0,idx0] - times)
+        dist1 = np.abs(calib.time_edges[1,idx1] - times)
+        return np.where(dist1 < dist0, idx1, idx0)
     
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.num_times} calibrations>'
   
+
+
+def _det_number(det_var):
+    """Convert a detector specification to a detector number.
+    
+    Args:
+        det_var (str, int, or :class:`BatseDetectors`)
+    
+    Returns:
+        (int)
+    """
+    if isinstance(det_var, BatseDetectors):
+        return det_var.number
+    elif isinstance(det_var, str):
+        return BatseDetectors.from_str(det_var).number
+    elif isinstance(det_var, (int, np.integer)):
+        return int(det_var)
+    else:
+        raise TypeError('det_var must be a str, int, or BatseDetectors ' \
+                        'object')
+
+
+def _dselect(nums):
+    """The DSELECT bit string of the selected detectors, with detector 0 or 8
+    as the last bit.
+    
+    Args:
+        nums (list of int): The detector numbers
+    
+    Returns:
+        (str)
+    """
+    dselect = ['0'] * 8
+    for num in nums:
+        dselect[7 - num % 8] = '1'
+    return ''.join(dselect)
+
+
+def _float_format(arr, num):
+    """The FITS column format of a float array with ``num`` values per row. 
+    Single precision is used, as in the BATSE files, unless it would lose
+    precision.
+    
+    Args:
+        arr (np.array): The array
+        num (int): The number of values in each row
+    
+    Returns:
+        (str)
+    """
+    arr = np.asarray(arr)
+    if np.array_equal(arr.astype(np.float32), arr, equal_nan=True):
+        return '{}E'.format(num)
+    return '{}D'.format(num)
+
+
+def _cache_path(file_path, cache_dir):
+    """The path of the binary cache directory of a file.
+    
+    Args:
+        file_path (str): The file path
+        cache_dir (str or None): The directory of the cache.  If None, the 
+                                 directory of the file.
+    
+    Returns:
+        (Path)
+    """
+    file_path = Path(file_path)
+    if cache_dir is None:
+        cache_dir = file_path.parent
+    return Path(cache_dir) / (file_path.name + _cache_suffix)
+
+
+def _file_checksum(file_path, block_size=1048576):
+    """The SHA-1 checksum of a file.
+    
+    Args:
+        file_path (str): The file path
+        block_size (int, optional): The number of bytes read at a time
+    
+    Returns:
+        (str)
+    """
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def _native(arr):
+    """A contiguous array in the native byte order.
+    
+    Args:
+        arr (np.array): The array
+    
+    Returns:
+        (np.array)
+    """
+    return np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('='))
+
+
+def _read_cache(cache_path, checksum):
+    """Read the binary cache of a file.  The data table is memory-mapped.
+    
+    Args:
+        cache_path (Path): The cache directory
+        checksum (str): The checksum of the file
+    
+    Returns:
+        (list, np.array, dict): The headers, energy calibration table, and 
+        data table columns, or None if there is no valid cache for the file
+    """
+    try:
+        with open(cache_path / 'meta.json') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != _cache_version or \
+       meta.get('checksum') != checksum:
+        return None
+    
+    try:
+        hdrs = [fits.Header.fromstring(hdr) for hdr in meta['headers']]
+        ecalib_data = np.load(cache_path / 'ecalib.npy')
+        table = {name: np.load(cache_path / f'column{i}.npy', mmap_mode='r') \
+                 for i, name in enumerate(meta['columns'])}
+    except (OSError, ValueError, KeyError):
+        return None
+    return (hdrs, ecalib_data, table)
+
+
+def _write_cache(cache_path, checksum, hdrs, ecalib_data, table):
+    """Write the binary cache of a file.  The cache is written to a temporary
+    directory which then replaces any existing cache, so a partially written 
+    cache is never read.  If the cache cannot be written, a warning is raised.
+    
+    Args:
+        cache_path (Path): The cache directory
+        checksum (str): The checksum of the file
+        hdrs (list): The headers of the file
+        ecalib_data (astropy.io.fits.FITS_rec): The energy calibration table
+        table (astropy.io.fits.FITS_rec): The data table
+    """
+    ecalib_data = BatseEnergyCalib.from_hdu(ecalib_data)._data
+    meta = {'version': _cache_version, 'checksum': checksum, 
+            'headers': [hdr.tostring() for hdr in hdrs],
+            'columns': list(table.names)}
+    
+    try:
+        temp_path = Path(tempfile.mkdtemp(prefix=cache_path.name + '.',
+                                          dir=cache_path.parent))
+    except OSError as err:
+        warnings.warn(f'Could not write the cache {cache_path}: {err}')
+        return
+    
+    try:
+        np.save(temp_path / 'ecalib.npy', _native(ecalib_data))
+        for i, name in enumerate(table.names):
+            np.save(temp_path / f'column{i}.npy', _native(table[name]))
+        # the metadata are written last and mark the cache as complete
+        with open(temp_path / 'meta.json', 'w') as f:
+            json.dump(meta, f)
+        
+        if cache_path.exists():
+            shutil.rmtree(cache_path, ignore_errors=True)
+        os.rename(temp_path, cache_path)
+    except OSError as err:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        # another process may have written the cache at the same time
+        if not (cache_path / 'meta.json').exists():
+            warnings.warn(f'Could not write the cache {cache_path}: {err}')
+
+
+def _is_memmap(arr):
+    """Check if an array is backed by a memory-mapped file.
+    
+    Args:
+        arr (np.array): The array
+    
+    Returns:
+        (bool)
+    """
+    base = arr
+    while base is not None:
+        if isinstance(base, (mmap.mmap, np.memmap)):
+            return True
+        base = getattr(base, 'base', None)
+    return False
+
+
+def _nearest_index(sorted_vals, order, times):
+    """Find the index of the closest value for each time.  Ties are resolved
+    to the lowest original index, the same as ``np.abs(vals - time).argmin()``.
+    
+    Args:
+        sorted_vals (np.array): The values, sorted
+        order (np.array): The original index of each sorted value
+        times (np.array): The times
+    
+    Returns:
+        (np.array)
+    """
+    num = sorted_vals.size
+    if num == 1:
+        return np.zeros(times.size, dtype=int)
+    
+    right = np.searchsorted(sorted_vals, times, side='left').clip(1, num-1)
+    left = right - 1
+    dist_left = np.abs(sorted_vals[left] - times)
+    dist_right = np.abs(sorted_vals[right] - times)
+    
+    # first original index of the (possibly repeated) neighboring values
+    idx_left = order[np.searchsorted(sorted_vals, sorted_vals[left])]
+    idx_right = order[np.searchsorted(sorted_vals, sorted_vals[right])]
+    
+    return np.where(dist_left < dist_right, idx_left, 
+                    np.where(dist_right < dist_left, idx_right, 
+                             np.minimum(idx_left, idx_right)))
@@ -39,6 +39,8 @@
 # the License.
 
 import os
+import threading
+from collections import OrderedDict, namedtuple
 import astropy.io.fits as fits
 import numpy as np
 
@@ -46,10 +48,18 @@ from gdt.core.response import Rsp
 from gdt.core.data_primitives import Ebounds, ResponseMatrix
 from gdt.core.file import FitsFileContextManager
 from .detectors import BatseDetectors
-from .headers import RspHeaders, RspHeadersAlt
+from .headers import RspHeaders, RspHeadersAlt, detect_headers
 from ..time import *
 
-__all__ = ['BatseRsp', 'BatseRspMulti']
+__all__ = ['BatseRsp', 'BatseRspMulti', 'DrmCache']
+
+# the DRM column for each matrix type
+_matrix_columns = {1: 'DRM_DIR', 2: 'DRM_SCT', 3: 'DRM_SUM'}
+
+# the header definitions for DRM files, in order of preference
+_rsp_headers = (RspHeaders, RspHeadersAlt)
+
+_CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
 
 class BatseRsp(Rsp):
     """Class for BATSE single-DRM response files
@@ -67,10 +77,7 @@ class BatseRsp(Rsp):
         obj = super().open(file_path, **kwargs)
         
         hdrs = [hdu.header for hdu in obj.hdulist]
-        try:
-            headers = RspHeaders.from_headers(hdrs)
-        except:
-            headers = RspHeadersAlt.from_headers(hdrs)
+        headers = detect_headers(hdrs, _rsp_headers).from_headers(hdrs)
         
         # check the detector number and make sure this is a single-detector file
         det_num = obj.column(1, 'DET_NUM')
@@ -83,11 +90,11 @@ class BatseRsp(Rsp):
         det = BatseDetectors.from_full_name(headers[0]['DET_MODE']+str(det_num))            
         
         
-        tstart = from_day_time(hdrs[0]['STRT-DAY'], hdrs[0]['STRT-TIM']).cgro
-        tstop = from_day_time(hdrs[0]['END-DAY'], hdrs[0]['END-TIM']).cgro
+        tstart = day_time_to_cgro(hdrs[0]['STRT-DAY'], hdrs[0]['STRT-TIM'])
+        tstop = day_time_to_cgro(hdrs[0]['END-DAY'], hdrs[0]['END-TIM'])
         try:
-            trigtime = from_day_time(hdrs[0]['TRIG-DAY'], 
-                                     hdrs[0]['TRIG-TIM']).cgro
+            trigtime = day_time_to_cgro(hdrs[0]['TRIG-DAY'], 
+                                        hdrs[0]['TRIG-TIM'])
         except:
             trigtime = None
                 
@@ -108,38 +115,192 @@ class BatseRsp(Rsp):
     def _decompress(drm_data, index):
         """Decompresses a BATSE DRM.
         """
-        mat_type = drm_data['MAT_TYPE']
-        mat_type = mat_type[index]
-        if mat_type == 1:
-            matrix = drm_data['DRM_DIR'][index]
-        elif mat_type == 2:
-            matrix = drm_data['DRM_SCT'][index]
-        elif mat_type == 3:
-            matrix = drm_data['DRM_SUM'][index]
-        
-        n_zeros = drm_data['N_ZEROS'][index]
         num_ebins = drm_data['NUMEBINS'][index]
-        num_chans = drm_data['NUMCHAN'][index]
-        num_zeros = drm_data['NUMZERO'][index]
-        
-        sidx = 0
-        drm = np.zeros((num_ebins-1, num_zeros))
-        for ichan in range(num_zeros):
-            eidx = sidx + (num_ebins-n_zeros[ichan])
-            drm[n_zeros[ichan]-1:,ichan] = matrix[sidx:eidx]
-            sidx = eidx
+        num_chans = drm_data['NUMZERO'][index]
+        drm = BatseRsp._decompress_matrices(drm_data, [index])[0]
+        drm = drm[:num_ebins-1, :num_chans]
 
         chan_edges = drm_data['E_EDGES'][index]
         phot_edges = drm_data['PHT_EDGE'][index]
         matrix = ResponseMatrix(drm, phot_edges[:-1], phot_edges[1:],
                                 chan_edges[:-1], chan_edges[1:])
         return matrix
+    
+    @staticmethod
+    def _decompress_matrices(drm_data, indices):
+        """Decompresses a set of BATSE DRMs into a single array.
+        
+        Each channel of a compressed DRM is stored as a contiguous segment 
+        starting at the first non-zero photon bin, given by N_ZEROS.  The 
+        segments of all DRMs are scattered into the output array at once.  
+        If the DRMs have different sizes, the smaller DRMs are zero-padded.
+        
+        Args:
+            drm_data (astropy.io.fits.FITS_rec): The DRM table
+            indices (list of int): The rows of the table to decompress
+        
+        Returns:
+            (np.array): Array of shape (num_drms, num_photon_bins, num_chans)
+        """
+        indices = np.asarray(indices, dtype=int)
+        mat_types = drm_data['MAT_TYPE'][indices]
+        matrices = [drm_data[_matrix_columns[mat_type]][index] \
+                    for index, mat_type in zip(indices, mat_types)]
+        
+        num_ebins = drm_data['NUMEBINS'][indices].astype(int) - 1
+        num_chans = drm_data['NUMZERO'][indices].astype(int)
+        max_chans = num_chans.max()
+        
+        # first non-zero photon bin and segment length for each channel
+        first = drm_data['N_ZEROS'][indices][:, :max_chans].astype(int) - 1
+        chan_mask = np.arange(max_chans)[np.newaxis,:] < num_chans[:,np.newaxis]
+        lengths = np.where(chan_mask, num_ebins[:,np.newaxis] - first, 0)
+        
+        # the segments are contiguous in a (drm, channel, photon bin) layout, 
+        # so calculate the flat index of every compressed element in that 
+        # layout and scatter them all at once
+        num_drms = indices.size
+        max_ebins = num_ebins.max()
+        sizes = lengths.sum(axis=1)
+        lengths = lengths.ravel()
+        seg_start = np.cumsum(lengths) - lengths
+        seg_offset = np.arange(num_drms * max_chans) * max_ebins + \
+                     first.ravel() - seg_start
+        flat_idx = np.repeat(seg_offset, lengths) + np.arange(lengths.sum())
+        
+        values = np.concatenate([matrix[:size] for matrix, size in \
+                                 zip(matrices, sizes)])
+        drms = np.zeros((num_drms, max_chans, max_ebins))
+        drms.reshape(-1)[flat_idx] = values
+        drms = np.ascontiguousarray(drms.transpose(0, 2, 1))
+        return drms
         
 
+class DrmCache():
+    """A least-recently-used cache of decompressed DRMs, keyed by the file 
+    identity and detector.  When the cache is full, the least recently 
+    used DRM is evicted.
+    
+    Parameters:
+        maxsize (int, optional): The maximum number of DRMs in the cache. 
+                                 Default is 32.
+    """
+    def __init__(self, maxsize=32):
+        self._maxsize = None
+        self._items = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+    
+    @property
+    def hits(self):
+        """(int): The number of cache hits"""
+        return self._hits
+    
+    @property
+    def maxsize(self):
+        """(int): The maximum number of DRMs in the cache"""
+        return self._maxsize
+    
+    @maxsize.setter
+    def maxsize(self, val):
+        try:
+            val = int(val)
+        except:
+            raise TypeError('maxsize must be an integer')
+        if val < 0:
+            raise ValueError('maxsize must be non-negative')
+        with self._lock:
+            self._maxsize = val
+            self._evict()
+    
+    @property
+    def misses(self):
+        """(int): The number of cache misses"""
+        return self._misses
+    
+    @property
+    def size(self):
+        """(int): The number of DRMs in the cache"""
+        return len(self._items)
+    
+    def clear(self, file_id=None):
+        """Clear the cache and reset the statistics.
+        
+        Args:
+            file_id (tuple, optional): If set, only clear the DRMs for this
+                                       file and keep the statistics.
+        """
+        with self._lock:
+            if file_id is None:
+                self._items.clear()
+                self._hits = 0
+                self._misses = 0
+            else:
+                for key in [key for key in self._items if key[0] == file_id]:
+                    del self._items[key]
+    
+    def get(self, key):
+        """Retrieve a DRM from the cache.
+        
+        Args:
+            key (tuple): The (file identity, detector) key
+        
+        Returns:
+            (:class:`~gdt.core.data_primitives.ResponseMatrix` or None)
+        """
+        with self._lock:
+            try:
+                item = self._items[key]
+            except KeyError:
+                self._misses += 1
+                return None
+            self._items.move_to_end(key)
+            self._hits += 1
+            return item
+    
+    def info(self):
+        """The cache statistics.
+        
+        Returns:
+            (namedtuple): (hits, misses, maxsize, currsize)
+        """
+        return _CacheInfo(self._hits, self._misses, self._maxsize, self.size)
+    
+    def put(self, key, drm):
+        """Add a DRM to the cache.
+        
+        Args:
+            key (tuple): The (file identity, detector) key
+            drm (:class:`~gdt.core.data_primitives.ResponseMatrix`): The DRM
+        """
+        with self._lock:
+            self._items[key] = drm
+            self._items.move_to_end(key)
+            self._evict()
+    
+    def _evict(self):
+        while len(self._items) > self._maxsize:
+            self._items.popitem(last=False)
+    
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.size}/{self.maxsize} DRMs; ' \
+               f'{self.hits} hits, {self.misses} misses>'
+
+
 class BatseRspMulti(FitsFileContextManager):
     """BATSE response file for multiple detectors.  This is typically DISCSC, 
     MER, STTE or TTE data.
+    
+    Decompressed DRMs are cached, so retrieving the same detector again does 
+    not decompress the DRM again.  By default, each object has its own cache, 
+    but the process-wide cache :attr:`shared_cache` can be used instead so 
+    that objects opened from the same file share their DRMs.
     """
+    shared_cache = DrmCache()
+    """(:class:`DrmCache`): The process-wide DRM cache"""
+    
     def __init__(self):
         self._data = None
         self._headers = None
@@ -147,6 +308,13 @@ class BatseRspMulti(FitsFileContextManager):
         self._tstart = None
         self._tstop = None
         self._trigtime = None
+        self._file_id = None
+        self._cache = None
+    
+    @property
+    def cache(self):
+        """(:class:`DrmCache`): The DRM cache used by this object"""
+        return self._cache
     
     @property
     def detectors(self):
@@ -183,10 +351,11 @@ class BatseRspMulti(FitsFileContextManager):
         except ValueError:
             raise ValueError(f'The DRM for {det_var} is not contained in this file.')
         
-        # ebounds
-        eedges = self._data['E_EDGES'][idx]
-        ebounds = Ebounds.from_bounds(eedges[:-1], eedges[1:])
-        drm = BatseRsp._decompress(self._data, idx)
+        key = (self._file_id, name)
+        drm = self._cache.get(key)
+        if drm is None:
+            drm = BatseRsp._decompress(self._data, idx)
+            self._cache.put(key, drm)
         
         # update the filename for the extracted response
         det_num = BatseDetectors.from_str(name).number
@@ -199,37 +368,80 @@ class BatseRspMulti(FitsFileContextManager):
                                  headers=self._headers, detector=name)
                 
         return obj
+    
+    def cache_info(self):
+        """The statistics of the DRM cache used by this object.
+        
+        Returns:
+            (namedtuple): (hits, misses, maxsize, currsize)
+        """
+        return self._cache.info()
+    
+    def clear_cache(self):
+        """Clear the cached DRMs.  If this object uses the process-wide 
+        cache, only the DRMs from this file are removed.
+        """
+        if self._cache is BatseRspMulti.shared_cache:
+            self._cache.clear(file_id=self._file_id)
+        else:
+            self._cache.clear()
+    
+    def get_matrices(self):
+        """Decompress the DRMs for all detectors in the file into a single 
+        array.  The DRMs are in the same order as :attr:`detectors`.
+        
+        Returns:
+            (np.array): Array of shape (num_dets, num_photon_bins, num_chans)
+        """
+        return BatseRsp._decompress_matrices(self._data, range(self.num_dets))
         
     @classmethod
-    def open(cls, file_path, **kwargs):
+    def open(cls, file_path, cache_size=16, shared_cache=False, **kwargs):
         """Open a response file containing DRMs from multiple detectors.
         
         Args:
             file_path (str): The file path
+            cache_size (int, optional): 
+                The maximum number of decompressed DRMs kept by this object.
+                Set to 0 to disable caching.  Default is 16.
+            shared_cache (bool, optional):
+                If True, use the process-wide :attr:`shared_cache` instead of 
+                a cache for this object, and ``cache_size`` is ignored.
+                Default is False.
         
         Returns:
             (:class:`BatseDrmMulti`)
         """
         obj = super().open(file_path, **kwargs)
+        
+        # the file identity is used for the cache keys
+        stat = os.stat(file_path)
+        obj._file_id = (os.path.realpath(file_path), stat.st_size, 
+                        stat.st_mtime_ns)
+        if shared_cache:
+            obj._cache = cls.shared_cache
+        else:
+            obj._cache = DrmCache(maxsize=cache_size)
+
         hdrs = [hdu.header for hdu in obj.hdulist]
-        try:
-            headers = RspHeaders.from_headers(hdrs)
-        except:
-            headers = RspHeadersAlt.from_headers(hdrs)
+        headers = detect_headers(hdrs, _rsp_headers).from_headers(hdrs)
         
         det_mode = headers[0]['DET_MODE']
         obj._dets = [det_mode + str(num) for num in obj.column(1, 'DET_NUM')]
         obj._headers = headers
         
-        obj._tstart = from_day_time(hdrs[0]['STRT-DAY'], hdrs[0]['STRT-TIM']).cgro
-        obj._tstop = from_day_time(hdrs[0]['END-DAY'], hdrs[0]['END-TIM']).cgro
+        obj._tstart = day_time_to_cgro(hdrs[0]['STRT-DAY'], hdrs[0]['STRT-TIM'])
+        obj._tstop = day_time_to_cgro(hdrs[0]['END-DAY'], hdrs[0]['END-TIM'])
         try:
-            obj._trigtime = from_day_time(hdrs[0]['TRIG-DAY'], 
-                                          hdrs[0]['TRIG-TIM']).cgro
+            obj._trigtime = day_time_to_cgro(hdrs[0]['TRIG-DAY'], 
+                                             hdrs[0]['TRIG-TIM'])
         except:
             pass
 
-        obj._data = obj.hdulist[1].data
+        # extract the columns once so that repeated decompressions do not 
+        # pay the FITS_rec field access overhead
+        drm_data = obj.hdulist[1].data
+        obj._data = {name: drm_data[name] for name in drm_data.names}
         obj.close()
         
         return obj
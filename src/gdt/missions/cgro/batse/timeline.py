@@ -0,0 +1,291 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import os
+import re
+from collections import OrderedDict
+import numpy as np
+
+from gdt.core.data_primitives import Gti
+from ..time import cgro_to_day_time
+from .phaii import BatsePhaiiMulti, BatsePhaiiCont, BatsePhaiiDiscla, \
+                   BatseTimeEnergyBins, BatseTimeBins, BatseEnergyCalib, \
+                   _det_number
+from .detectors import BatseDetectors
+
+__all__ = ['BatseContinuousTimeline']
+
+class BatseContinuousTimeline():
+    """A timeline of BATSE continuous data spanning multiple days, built from a
+    directory of daily CONT or DISCLA files.  Only the days overlapping a 
+    requested time range are read, and the most recently read days are 
+    kept so that repeated requests, such as a sliding-window search, do not
+    need to reopen the files.
+    
+    Parameters:
+        directory (str): The directory containing the daily files
+        filetype (str, optional): Either 'cont' or 'discla'. Default is 'cont'.
+        cache_size (int, optional): The maximum number of days kept in memory.
+                                    Default is 3.
+    """
+    def __init__(self, directory, filetype='cont', cache_size=3):
+        filetype = filetype.lower()
+        if filetype not in ('cont', 'discla'):
+            raise ValueError("filetype must be either 'cont' or 'discla'")
+        if cache_size < 1:
+            raise ValueError('cache_size must be at least 1')
+        
+        self._directory = str(directory)
+        self._filetype = filetype
+        self._cache_size = int(cache_size)
+        self._cache = OrderedDict()
+        
+        # index the daily files by TJD
+        pattern = re.compile(rf'^{filetype}_(\d{{5}})\.fits(\.gz)?$')
+        files = {}
+        for fname in os.listdir(self._directory):
+            match = pattern.match(fname)
+            if match is not None:
+                files[int(match.group(1))] = os.path.join(self._directory, 
+                                                          fname)
+        self._files = OrderedDict(sorted(files.items()))
+
+    @property
+    def cache_size(self):
+        """(int): The maximum number of days kept in memory"""
+        return self._cache_size
+    
+    @property
+    def cached_days(self):
+        """(list): The days currently kept in memory"""
+        return list(self._cache.keys())
+
+    @property
+    def days(self):
+        """(list): The TJD of each daily file in the timeline"""
+        return list(self._files.keys())
+    
+    @property
+    def directory(self):
+        """(str): The directory containing the daily files"""
+        return self._directory
+    
+    @property
+    def filetype(self):
+        """(str): The type of file, either 'cont' or 'discla'"""
+        return self._filetype
+
+    @property
+    def num_days(self):
+        """(int): The number of daily files in the timeline"""
+        return len(self._files)
+
+    @property
+    def time_range(self):
+        """(float, float): The time range spanned by the daily files"""
+        if self.num_days == 0:
+            return None
+        return (float(self.days[0]), float(self.days[-1] + 1))
+    
+    def clear_cache(self):
+        """Release the days kept in memory.
+        """
+        self._cache.clear()
+    
+    def get_day(self, tjd):
+        """Retrieve the data for one day.  The orbit and attitude columns are
+        not read.
+        
+        Args:
+            tjd (int): The TJD of the day
+        
+        Returns:
+            (:class:`BatsePhaiiMulti`)
+        """
+        tjd = int(tjd)
+        if tjd in self._cache:
+            self._cache.move_to_end(tjd)
+            return self._cache[tjd]
+        
+        try:
+            file_path = self._files[tjd]
+        except KeyError:
+            raise ValueError(f'No {self._filetype} file for TJD {tjd}')
+        
+        phaii_multi = BatsePhaiiMulti.open(file_path, columns=[])
+        self._cache[tjd] = phaii_multi
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return phaii_multi
+    
+    def get_range(self, tstart, tstop, dets=None):
+        """Retrieve the data for a time range, which may span multiple days.
+        For each detector, the data from the overlapping days are joined into
+        a single :class:`BatseTimeEnergyBins`, and any gaps in the data are
+        excluded from the Good Time Intervals.  Records at the start of a day 
+        that duplicate or overlap the end of the previous day are removed.  
+        The energy edges are the calibrations over the time range, weighted 
+        by the time each calibration spans.
+        
+        Args:
+            tstart (float): The start of the time range in TJD
+            tstop (float): The end of the time range in TJD
+            dets (list of str, int, or :class:`BatseDetectors`, optional)
+                The detectors to retrieve.  If not set, retrieves the 
+                detectors in the first overlapping day.
+        
+        Returns:
+            (dict): A :class:`BatsePhaiiCont` or :class:`BatsePhaiiDiscla` 
+            for each detector, keyed by the detector number
+        """
+        if tstart >= tstop:
+            raise ValueError('tstart must be less than tstop')
+        
+        days = [tjd for tjd in self._files if (tjd < tstop) and 
+                                              (tjd + 1 > tstart)]
+        days = [self.get_day(tjd) for tjd in days]
+        if len(days) == 0:
+            raise ValueError(f'No data between {tstart} and {tstop}')
+        
+        if dets is None:
+            nums = days[0].detectors
+        else:
+            nums = [_det_number(det) for det in dets]
+        
+        # the headers are shared by all detectors
+        headers = self._update_headers(days[0].headers, 
+                                       max(tstart, days[0]._tstart[0]), 
+                                       min(tstop, days[-1]._tstop[-1]))
+        
+        return {num: self._join_days(days, num, tstart, tstop, headers) \
+                for num in nums}
+
+    def _join_days(self, days, num, tstart, tstop, headers):
+        """Join the data for a detector from multiple days
+        """
+        arrays = [day._detector_arrays(num, tstart, tstop) for day in days]
+        arrays = self._remove_overlaps(arrays)
+        keep = [i for i in range(len(days)) if arrays[i][1].size > 0]
+        if len(keep) == 0:
+            raise ValueError(f'No data between {tstart} and {tstop}')
+        days = [days[i] for i in keep]
+        arrays = [arrays[i] for i in keep]
+        
+        num_chans = set(array[0].shape[1] for array in arrays)
+        if len(num_chans) > 1:
+            raise ValueError('The number of channels changes between days')
+        
+        counts = np.concatenate([array[0] for array in arrays])
+        bin_starts = np.concatenate([array[1] for array in arrays])
+        bin_stops = np.concatenate([array[2] for array in arrays])
+        exposure = np.concatenate([array[3] for array in arrays])
+        
+        # the calibrations over all days for this detector
+        ecalib = np.concatenate([day._ecalib.get_detector(num)._data \
+                                 for day in days])
+        ecalib = BatseEnergyCalib.from_hdu(ecalib)
+        e_edges = ecalib.edges_over_timespan(num, bin_starts[0], bin_stops[-1])
+        
+        detector = BatseDetectors.from_num(num)
+        
+        if self._filetype == 'cont':
+            data = BatseTimeEnergyBins(counts, bin_starts, bin_stops, exposure,
+                                       e_edges[:-1], e_edges[1:])
+            gti = self._gti_from_data(data)
+            obj = BatsePhaiiCont.from_data(data, gti=gti, headers=headers, 
+                                           ecalib=ecalib, detector=detector)
+        else:
+            # in DISCLA, the first 4 channels are the discriminator channels, 
+            # and channels 5 and 6 are the total LAD and CPD rates
+            data = BatseTimeEnergyBins(counts[:,:4], bin_starts, bin_stops, 
+                                       exposure, e_edges[:-1], e_edges[1:])
+            gti = self._gti_from_data(data)
+            lad_lc = BatseTimeBins(counts[:,4], bin_starts, bin_stops, exposure)
+            cpd_lc = BatseTimeBins(counts[:,5], bin_starts, bin_stops, exposure)
+            obj = BatsePhaiiDiscla.from_data(data, gti=gti, headers=headers, 
+                                             ecalib=ecalib, detector=detector,
+                                             data_lad_tot=lad_lc, 
+                                             data_cpd_tot=cpd_lc)
+        return obj
+    
+    @staticmethod
+    def _gti_from_data(data):
+        """The Good Time Intervals are the contiguous segments of the data
+        """
+        return Gti.from_list([bins.time_range for bins in \
+                              data.contiguous_time_bins()])
+    
+    @staticmethod
+    def _remove_overlaps(arrays):
+        """Remove the bins of each day that start before the end of the 
+        previous day's data, which are duplicated or overlapping records at 
+        the day boundaries
+        """
+        # tolerance for the rounding of the bin edges, in days
+        tol = 1e-3 / 86400.0
+        last_stop = None
+        new_arrays = []
+        for array in arrays:
+            if last_stop is not None:
+                mask = array[1] >= last_stop - tol
+                if not mask.all():
+                    array = tuple(arr[mask] for arr in array)
+            if array[2].size > 0:
+                last_stop = array[2][-1] if last_stop is None else \
+                            max(last_stop, array[2][-1])
+            new_arrays.append(array)
+        return new_arrays
+    
+    @staticmethod
+    def _update_headers(headers, tstart, tstop):
+        """Copy the headers of the first day and update the time range
+        """
+        headers = headers.copy()
+        start_day, start_secs = cgro_to_day_time(tstart)
+        stop_day, stop_secs = cgro_to_day_time(tstop)
+        headers['PRIMARY']['STRT-DAY'] = start_day
+        headers['PRIMARY']['STRT-TIM'] = start_secs
+        headers['PRIMARY']['END-DAY'] = stop_day
+        headers['PRIMARY']['END-TIM'] = stop_secs
+        return headers
+        
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.num_days} {self._filetype} ' \
+               f'days; {len(self._cache)} in memory>'
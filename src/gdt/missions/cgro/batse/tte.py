@@ -38,6 +38,8 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import io
+from pathlib import Path
 import numpy as np
 import astropy.io.fits as fits
 
@@ -47,11 +49,20 @@ from gdt.core.tte import PhotonList
 
 from .detectors import BatseDetectors
 from .headers import PhaiiTriggerHeaders, TteTriggerHeaders
-from .phaii import BatsePhaiiTrigger, BatseEnergyCalib
+from .phaii import BatsePhaiiTrigger, BatseEnergyCalib, _dselect
 from ..time import *
 
 __all__ = ['BatseTte', 'BatseTteMulti', 'BatseTteTrigger']
 
+# the FITS block size
+_BLOCK_SIZE = 2880
+# the number of events written to a file at a time
+_CHUNK_SIZE = 1048576
+# the minimum number of detector rows in a photon list
+_NUM_ROWS = 8
+# the value of unused good time interval bounds
+_gti_fill = -1.0e20
+
 class BatseTte(PhotonList):
     """Class for BATSE Time-Tagged Event data.
     
@@ -130,8 +141,22 @@ class BatseTte(PhotonList):
             else:
                 return BatseTteTrigger.open(file_path, **kwargs)
 
+    def rebin_energy(self, method, *args):
+        """Rebin the BatseTte in energy given a rebinning method.
+        Produces a new BatseTte object.
+
+        Args:
+            method (<function>): The rebinning function
+            *args: Arguments to be passed to the rebinning function
+
+        Returns:
+            (:class:`BatseTte`)
+        """
+        return super().rebin_energy(method, *args, ecalib=self.ecalib,
+                                    detector=self.detector)
+
     def slice_energy(self, energy_ranges):
-        """Slice the BatseTte by one or more energy range. 
+        """Slice the BatseTte by one or more energy range.
         Produces a new BatseTte object.
         
         Args:
@@ -211,42 +236,73 @@ class BatseTte(PhotonList):
         obj._detector = self.detector
         return obj
     
+    def write(self, directory, filename=None, overwrite=False, 
+              chunk_size=_CHUNK_SIZE):
+        """Write the TTE to disk as a BATSE photon list file, which can be 
+        read with :class:`BatseTteMulti`.  The event times and channels are 
+        streamed to the file in chunks, so a large event list is not copied 
+        in memory.  Each extension has CHECKSUM and DATASUM keywords.
+        
+        Args:
+            directory (str): The directory to write the file.
+            filename (str, optional): The filename.  If omitted, attempts to 
+                                      use the :attr:`filename` if set.
+            overwrite (bool, optional): If True, overwrite an existing file.
+                                        Default is False.
+            chunk_size (int, optional): The number of events written at a 
+                                        time.  Default is 1048576.
+        """
+        if (self.filename is None) and (filename is None):
+            raise NameError('Filename not set')
+        if filename is None:
+            filename = self.filename
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+        
+        full_path = Path(directory) / filename
+        if full_path.exists() and not overwrite:
+            raise OSError(f'File {full_path} already exists. If you mean to ' \
+                          'replace it then use the argument "overwrite=True".')
+
+        headers = self._file_headers()
+        headers.update()
+        hdulist = fits.HDUList([fits.PrimaryHDU(header=headers['PRIMARY']), 
+                                self._ecalib_table(headers)])
+        
+        with open(full_path, 'wb') as fobj:
+            hdulist.writeto(fobj, checksum=True)
+            self._write_photon_list(fobj, headers, chunk_size)
+
     def _build_hdulist(self):
-        raise NotImplementedError
-        # if trigtime is None, remove from headers
-        if self.trigtime is None:
-            self.headers['PRIMARY'].pop('TRIGTIME', None)
-            self.headers['EBOUNDS'].pop('TRIGTIME', None)
-            self.headers['EVENTS'].pop('TRIGTIME', None)
-            self.headers['GTI'].pop('TRIGTIME', None)
+        headers = self._file_headers()
 
         # create FITS and primary header
         hdulist = fits.HDUList()
-        primary_hdu = fits.PrimaryHDU(header=self.headers['PRIMARY'])
-        primary_hdu.header['TRIGTIME'] = self.trigtime
+        primary_hdu = fits.PrimaryHDU(header=headers['PRIMARY'])
         hdulist.append(primary_hdu)
         
-        # the ebounds extension
-        ebounds_hdu = self._ebounds_table()
-        hdulist.append(ebounds_hdu)
-        
-        # the events extension
-        events_hdu = self._events_table()
-        hdulist.append(events_hdu)        
+        # the ecalib extension
+        ecalib_hdu = self._ecalib_table(headers)
+        hdulist.append(ecalib_hdu)
         
-        # the GTI extension
-        gti_hdu = self._gti_table()
-        hdulist.append(gti_hdu)
+        # the photon list extension
+        photon_list = io.BytesIO()
+        self._write_photon_list(photon_list, headers, _CHUNK_SIZE)
+        photon_list.seek(0)
+        hdulist.append(fits.BinTableHDU.fromstring(photon_list.read()))
         
         return hdulist
 
     def _build_headers(self, trigtime, tstart, tstop, num_chans):
 
-        headers = self.headers.copy()
-        time_obj = Time(trigtime, format='cgro')
+        if self.headers is not None:
+            headers = self.headers.copy()
+        else:
+            headers = TteTriggerHeaders()
 
         trig_day, trig_secs = (None, None)
         if trigtime is not None:
+            time_obj = Time(trigtime, format='cgro')
             trig_day, trig_secs = to_day_time(time_obj)
             headers['PRIMARY']['TRIG-DAY'] = trig_day
             headers['PRIMARY']['TRIG-TIM'] = trig_secs
@@ -269,82 +325,148 @@ class BatseTte(PhotonList):
         
         return headers
     
-    def _ecalib_table(self):
-        raise NotImplementedError
-        num_det = self.ecalib.num_det
-        cal_det_col = fits.Column(name='CAL_DET', format='{}I'.format(num_det),
-                                  array=self.ecalib.det)
-        cal_strt_col = fits.Column(name='CAL_STRT', 
-                                   format='{}D'.format(num_det), unit='TJD',
-                                   array=self.ecalib.cal_start)
-        cal_stop_col = fits.Column(name='CAL_STOP', 
-                                   format='{}D'.format(num_det), unit='TJD', 
-                                   array=self.ecalib.cal_start)
-        
-        e_edges = np.append(self.ebounds.low_edges(), self.ebounds.range[1])
-        
-        e_edges_col = fits.Column(name='E_EDGES', unit='keV',
-                                  format='{}E'.format(e_edges.size),
-                                 array=e_edges.reshape(self.ecalib.num_det, -1))
-        width64_col = fits.Column(name='WIDTH64', format='{}I'.format(num_det), 
-                                  array=self.ecalib.width64)
-        line_nrg_col = fits.Column(name='LINE_NRG', format='4E', unit='keV',
-                                   array=self.ecalib.line_energy)
-        line_chan_col = fits.Column(name='LINECHAN', format='4E',
-                                    array=self.ecalib.line_chan)
-        det_s_zn_col = fits.Column(name='DET_S_ZN',
-                                   format='{}E'.format(num_det), unit='deg',
-                                   array=self.ecalib.det_s_zn)
-        det_e_zn_col = fits.Column(name='DET_E_ZN', 
-                                   format='{}E'.format(num_det), unit='deg',
-                                   array=self.ecalib.det_e_zn)
-        cal_name_col = fits.Column(name='CAL_NAME', format='16A',
-                                   array=self.ecalib.cal_name)
-
-        hdu = fits.BinTableHDU.from_columns([cal_det_col, cal_strt_col, 
-                                             cal_stop_col, e_edges_col, 
-                                             width64_col, line_nrg_col, 
-                                             line_chan_col, det_s_zn_col,
-                                             det_e_zn_col, cal_name_col], 
-                                           header=self.headers['BATSE_E_CALIB'])
-        for key, val in self.headers['BATSE_E_CALIB'].items():
-            hdu.header[key] = val
-        hdu.header.comments['TTYPE1'] = 'Detector number: use to index cal. data'
-        hdu.header.comments['TTYPE2'] = 'Start time of the calibration record'
-        hdu.header.comments['TUNIT2'] = 'Truncated Julian days'
-        hdu.header.comments['TTYPE3'] = 'Stop time of the calibration record'
-        hdu.header.comments['TUNIT3'] = 'Truncated Julian days'
-        hdu.header.comments['TTYPE4'] = 'Energy edges for each selected detector'
-        hdu.header.comments['TTYPE5'] = 'Integer value of Width64 (SDs only)'
-        hdu.header.comments['TTYPE6'] = 'Centroid energy of 4 calibration lines'
-        hdu.header.comments['TTYPE7'] = 'Centroid channel of 4 calibration lines'
-        hdu.header.comments['TTYPE8'] = 'Zenith of the source in detector coords'
-        hdu.header.comments['TTYPE9'] = 'Zenith of the Earth in detector coords'
-        hdu.header.comments['TTYPE10'] = 'Name of the channel-to-energy scheme used'
-        return hdu
-
-    def _spectrum_table(self):
-        raise NotImplementedError
-        times = np.copy(self.data.times)
-        times_col = fits.Column(name='TIMES', format='2E', unit='s',
-                                array=times)
-        rates_col = fits.Column(name='RATES', unit='count /s',
-                                format='{}E'.format(self.num_chans),
-                                array=self.data.rates)
-        errors_col = fits.Column(name='ERRORS', unit='count /s',
-                                 format='{}E'.format(self.num_chans),
-                                 array=self.data.rate_uncertainty)        
-        
-        hdu = fits.BinTableHDU.from_columns([times_col, rates_col, errors_col], 
-                                     header=self.headers['BATSE BURST SPECTRA'])
-
-        for key, val in self.headers['BATSE BURST SPECTRA'].items():
-            hdu.header[key] = val
-        hdu.header.comments['TTYPE1'] = 'Array of rate start and stop times'
-        hdu.header.comments['TUNIT1'] = 'Seconds since BSTST'
-        hdu.header.comments['TTYPE2'] = 'N_Channel X N_Times array of rates'
-        hdu.header.comments['TTYPE3'] = 'N_Channel X N_Times array of errors'
-        return hdu
+    def _detector_numbers(self):
+        """The numbers of the detectors in the data"""
+        dets = self.detector
+        if not isinstance(dets, (list, tuple)):
+            dets = [dets]
+        return [det.number for det in dets if det is not None]
+
+    def _ecalib_table(self, headers):
+        if self.ecalib is None:
+            raise RuntimeError('An energy calibration is required to write ' \
+                               'the TTE file')
+        
+        # the calibration is evaluated over the time range in the headers 
+        # when the file is read
+        tstart = day_time_to_cgro(headers[0]['STRT-DAY'], 
+                                  headers[0]['STRT-TIM'])
+        tstop = day_time_to_cgro(headers[0]['END-DAY'], headers[0]['END-TIM'])
+        ebounds = self.data.ebounds
+        e_edges = np.append(ebounds.low_edges(), ebounds.high_edges()[-1])
+        return self.ecalib.to_data_hdu(e_edges, tstart, tstop, 
+                                       header=headers['BATSE_E_CALIB'])
+
+    def _file_headers(self):
+        """The headers of the photon list file, with the time range, channels,
+        and detectors of the data.
+        """
+        if self.trigtime is None:
+            raise RuntimeError('A trigger time is required to write the TTE ' \
+                               'file')
+        
+        tstart, tstop = self.gti.range
+        headers = self._build_headers(self.trigtime, tstart, tstop, 
+                                      self.num_chans)
+        
+        dets = self._detector_numbers()
+        if len(dets) > 0:
+            headers['BATSE PHOTON LIST']['DSELECT'] = _dselect(dets)
+        return headers
+
+    def _write_photon_list(self, fobj, headers, chunk_size):
+        """Write the photon list extension to a file object.  The events are 
+        stored in the row of the detector in the energy calibration, and the 
+        times and channels are written to the heap of the table in chunks.
+        The DATASUM is accumulated over the chunks as they are written, and 
+        the header is then rewritten with the DATASUM and CHECKSUM, so the 
+        file object must be seekable.
+        """
+        times = self.data.times
+        channels = self.data.channels
+        num_events = times.size
+        row = self.ecalib.detectors[0]
+        num_rows = max(row + 1, _NUM_ROWS)
+        
+        # single precision times are used, as in the BATSE files, unless 
+        # that would lose precision
+        single = all(np.array_equal(times[i:i+chunk_size].astype(np.float32),
+                                    times[i:i+chunk_size]) \
+                     for i in range(0, num_events, chunk_size))
+        time_dtype = np.dtype('>f4') if single else np.dtype('>f8')
+        if num_events > 0 and channels.max() > np.iinfo(np.int16).max:
+            chan_dtype = np.dtype('>i4')
+        else:
+            chan_dtype = np.dtype('>i2')
+        
+        # the 32-bit array descriptors can only address a 2 GB heap
+        heap_size = num_events * (time_dtype.itemsize + chan_dtype.itemsize)
+        desc = 'P' if heap_size < 2**31 else 'Q'
+        desc_dtype = np.dtype('>i4') if desc == 'P' else np.dtype('>i8')
+        
+        gti = np.array(self.gti.as_list(), dtype=float).reshape(-1, 2)
+        num_gti = gti.shape[0]
+        table = np.zeros(num_rows, dtype=[('N_PHOTON', '>i4'), 
+                                          ('TIMES', desc_dtype, (2,)),
+                                          ('CHANNELS', desc_dtype, (2,)),
+                                          ('T_START', '>f8', (num_gti,)),
+                                          ('T_STOP', '>f8', (num_gti,))])
+        table['T_START'] = _gti_fill
+        table['T_STOP'] = _gti_fill
+        table['N_PHOTON'][row] = num_events
+        table['TIMES'][row] = (num_events, 0)
+        table['CHANNELS'][row] = (num_events, num_events*time_dtype.itemsize)
+        table['T_START'][row] = gti[:,0]
+        table['T_STOP'][row] = gti[:,1]
+        
+        time_format = 'E' if single else 'D'
+        chan_format = 'I' if chan_dtype.itemsize == 2 else 'J'
+        columns = [fits.Column(name='N_PHOTON', format='J'),
+                   fits.Column(name='TIMES', unit='s',
+                               format='1{0}{1}({2})'.format(desc, time_format,
+                                                            num_events)),
+                   fits.Column(name='CHANNELS', 
+                               format='1{0}{1}({2})'.format(desc, chan_format,
+                                                            num_events)),
+                   fits.Column(name='T_START', format='{}D'.format(num_gti), 
+                               unit='s'),
+                   fits.Column(name='T_STOP', format='{}D'.format(num_gti),
+                               unit='s')]
+        hdu = fits.BinTableHDU.from_columns(columns, nrows=0,
+                                      header=headers['BATSE PHOTON LIST'])
+        header = hdu.header
+        for key, val in headers['BATSE PHOTON LIST'].items():
+            header[key] = val
+        header['NAXIS2'] = num_rows
+        header['PCOUNT'] = heap_size
+        header.comments['TTYPE1'] = 'Number of photons for each detector'
+        header.comments['TTYPE2'] = 'Photon arrival times'
+        header.comments['TUNIT2'] = 'Seconds since the trigger'
+        header.comments['TTYPE3'] = 'Photon energy channels'
+        header.comments['TTYPE4'] = 'Start times of the good time intervals'
+        header.comments['TTYPE5'] = 'Stop times of the good time intervals'
+        
+        # the checksum cards are written as placeholders, which have the same
+        # length as the final values
+        header['CHECKSUM'] = ('0' * 16, 'HDU checksum')
+        header['DATASUM'] = ('0', 'data unit checksum')
+        header_start = fobj.tell()
+        fobj.write(header.tostring().encode('ascii'))
+        
+        def write_data(arr):
+            fobj.write(arr.tobytes())
+            return hdu._compute_checksum(arr.view('ubyte').ravel(), datasum)
+        
+        datasum = 0
+        datasum = write_data(table)
+        for i in range(0, num_events, chunk_size):
+            datasum = write_data(times[i:i+chunk_size].astype(time_dtype))
+        # an even number of 16-bit channels keeps each chunk aligned to the 
+        # 32-bit words of the datasum
+        chan_chunk = chunk_size + chunk_size % 2
+        for i in range(0, num_events, chan_chunk):
+            datasum = write_data(channels[i:i+chan_chunk].astype(chan_dtype))
+        
+        # pad the data to a multiple of the FITS block size
+        size = table.nbytes + heap_size
+        fobj.write(bytes(-size % _BLOCK_SIZE))
+        
+        header['DATASUM'] = str(datasum)
+        header['CHECKSUM'] = hdu._calculate_checksum(datasum)
+        data_end = fobj.tell()
+        fobj.seek(header_start)
+        fobj.write(header.tostring().encode('ascii'))
+        fobj.seek(data_end)
 
 
 class BatseTteMulti(FitsFileContextManager):
@@ -390,8 +512,8 @@ class BatseTteMulti(FitsFileContextManager):
                             'object')
 
         ecalib_det = self._ecalib.get_detector(num)
-        e_edges = ecalib_det.edges_over_timespan(num, self._tstart.cgro, 
-                                                 self._tstop.cgro)
+        e_edges = ecalib_det.edges_over_timespan(num, self._tstart, 
+                                                 self._tstop)
         ebounds = Ebounds.from_bounds(e_edges[:-1], e_edges[1:])
         
         times = self._data['TIMES'][num]
@@ -407,12 +529,11 @@ class BatseTteMulti(FitsFileContextManager):
         
         gti = self._create_gti(num)
         
-        fname_type, _, fname_id = self.filename.split('_')
-        fname = f'{fname_type}_list_{num}_{fname_id}'
+        fname = self._detector_filename(num)
         
         return BatseTteTrigger.from_data(ev, gti=gti, headers=self._headers, 
                                          ecalib=ecalib_det, filename=fname, 
-                                         trigger_time=self._trigtime.cgro,
+                                         trigger_time=self._trigtime,
                                          detector=BatseDetectors.from_num(num))
     
     @classmethod
@@ -437,15 +558,20 @@ class BatseTteMulti(FitsFileContextManager):
         obj._data = obj.hdulist[2].data
         obj._headers = headers
                 
-        obj._tstart = from_day_time(headers[0]['STRT-DAY'], headers[0]['STRT-TIM'])
-        obj._tstop = from_day_time(headers[0]['END-DAY'], headers[0]['END-TIM'])
-        obj._trigtime = from_day_time(headers[0]['TRIG-DAY'], headers[0]['TRIG-TIM'])
+        obj._tstart = day_time_to_cgro(headers[0]['STRT-DAY'], 
+                                       headers[0]['STRT-TIM'])
+        obj._tstop = day_time_to_cgro(headers[0]['END-DAY'], 
+                                      headers[0]['END-TIM'])
+        obj._trigtime = day_time_to_cgro(headers[0]['TRIG-DAY'], 
+                                         headers[0]['TRIG-TIM'])
         
         obj.close()
         return obj
 
-    def sum_detectors(self, det_var_list=None):
-        """Sum data over multiple detectors and return a Tte object.
+    def sum_detectors(self, det_var_list=None, return_det_ids=False):
+        """Sum data over multiple detectors and return a Tte object.  The 
+        events of the detectors are merged so that the summed event list is 
+        ordered in time.
         
         Note::
           The energy edges are taken to be the geometric mean.
@@ -453,43 +579,75 @@ class BatseTteMulti(FitsFileContextManager):
         Args:
             det_var_list (list of str, int, or :class:`BatseDetectors`, optional)
                 If not set, will sum all available detectors.
+            return_det_ids (bool, optional): 
+                If True, also return an array containing the detector number
+                of each event in the summed event list. Default is False.
         
         Returns:
-            (:class:`BatseTteTrigger``)
+            (:class:`BatseTteTrigger``) or 
+            (:class:`BatseTteTrigger``, np.array) if ``return_det_ids`` is True
         """
         if det_var_list is None:
             det_var_list = self.detectors
         ttes = [self.get_detector(det_var) for det_var in det_var_list]
-        num_ttes = len(ttes)
         
-        times = ttes[0].data.times
-        channels = ttes[0].data.channels
+        # copy the events of each detector into preallocated arrays
+        sizes = [tte.data.size for tte in ttes]
+        num_events = sum(sizes)
+        times = np.empty(num_events, dtype=ttes[0].data.times.dtype)
+        channels = np.empty(num_events, dtype=ttes[0].data.channels.dtype)
+        det_ids = np.empty(num_events, dtype=int)
         gti = ttes[0].gti
-        for i in range(1, num_ttes):
-            times = np.concatenate([times, ttes[i].data.times])
-            channels = np.concatenate([channels, ttes[i].data.channels])
-            gti = Gti.merge(gti, ttes[i].gti)
+        idx = 0
+        for i, tte in enumerate(ttes):
+            times[idx:idx+sizes[i]] = tte.data.times
+            channels[idx:idx+sizes[i]] = tte.data.channels
+            det_ids[idx:idx+sizes[i]] = tte.detector.number
+            if i > 0:
+                gti = Gti.merge(gti, tte.gti)
+            idx += sizes[i]
+        
+        # the events of each detector are already sorted in time, and a stable
+        # sort (timsort) merges these sorted runs in O(N log k).  Simultaneous
+        # events are kept in detector order.
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        channels = channels[order]
+        det_ids = det_ids[order]
                 
         ecalibs = [tte.ecalib for tte in ttes]
         ecalib_sum = BatseEnergyCalib.combine_detectors(ecalibs)
-        e_edges = ecalib_sum.edges_over_timespan(0, self._tstart.cgro, 
-                                                    self._tstop.cgro)
+        e_edges = ecalib_sum.edges_over_timespan(ttes[0].detector.number, 
+                                                 self._tstart, self._tstop)
         ebounds = Ebounds.from_bounds(e_edges[:-1], e_edges[1:])
         
         ev = EventList(times=times, channels=channels, ebounds=ebounds)
                 
-        fname_type, _, fname_id = self.filename.split('_')
-        fname = f"{fname_type}_list_{fname_id}"
+        fname = self._detector_filename()
         
         dets = [tte.detector for tte in ttes]
 
         obj = BatseTteTrigger.from_data(ev, gti=gti, headers=ttes[0].headers,
                                         ecalib=ecalib_sum, filename=fname,
-                                        trigger_time=self._trigtime.cgro,
+                                        trigger_time=self._trigtime,
                                         detector=dets)
-                    
+        
+        if return_det_ids:
+            return obj, det_ids
         return obj
 
+    def _detector_filename(self, num=None):
+        """The filename of the data from one detector, or of summed data if
+        ``num`` is None.  Files not named as in the archive keep their name.
+        """
+        parts = self.filename.split('_')
+        if len(parts) != 3:
+            return self.filename
+        fname_type, _, fname_id = parts
+        if num is None:
+            return f'{fname_type}_list_{fname_id}'
+        return f'{fname_type}_list_{num}_{fname_id}'
+
     def _create_gti(self, det_num):
         """Create GTI for the given detector"""
         tstart = self._data['T_START'][det_num]
@@ -511,4 +669,18 @@ class BatseTteTrigger(BatseTte):
     """    
     @classmethod
     def open(cls, file_path, **kwargs):
-        raise NotImplementedError
+        """Open a BATSE TTE FITS file containing a single detector, such as 
+        one written by :meth:`BatseTte.write`.
+        
+        Args:
+            file_path (str): The file path of the FITS file
+        
+        Returns:        
+            (:class:`BatseTteTrigger`)
+        """
+        multi = BatseTteMulti.open(file_path, **kwargs)
+        if multi.num_dets != 1:
+            raise ValueError('This is a multi-detector TTE file. Use ' \
+                             'BatseTteMulti to open this file, and then ' \
+                             'select the detector you wish to use.')
+        return multi.get_detector(multi.detectors[0])
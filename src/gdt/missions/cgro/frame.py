@@ -40,13 +40,13 @@
 
 from astropy.coordinates import FunctionTransform, ICRS, frame_transform_graph
 import numpy as np
-from scipy.spatial.transform import Rotation
 from gdt.core.coords import SpacecraftFrame, Quaternion
 from gdt.core.coords.quaternion import QuaternionAttribute
 from gdt.core.coords.spacecraft.axes import SpacecraftAxesAttribute
 from gdt.core.coords.spacecraft.frame import spacecraft_to_icrs, icrs_to_spacecraft
 
-__all__ = ['CgroFrame', 'cgro_to_icrs', 'icrs_to_cgro']
+__all__ = ['CgroFrame', 'axes_to_quaternion', 'cgro_to_icrs', 'icrs_to_cgro',
+           'pointings_to_quaternion']
 
 class CgroFrame(SpacecraftFrame):
     """
@@ -78,20 +78,139 @@ class CgroFrame(SpacecraftFrame):
                 x_pv = x_pv.reshape(3, 1)
                 z_pv = z_pv.reshape(3, 1)
             
-            # rotation between equatorial frame X axis and CGRO X pointing
-            q1 = Quaternion.from_vectors(axes.x_vector[np.newaxis,:], x_pv.T).unit
-            q1_arr = np.array([q1.x, q1.y, q1.z, q1.w])
-            
-            # apply X-axis rotation to equatorial frame Z axis
-            z_vector = Rotation.from_quat(q1_arr.T).apply(axes.z_vector)
-
-            # rotation between equatorial frame Z axis and CGRO Z pointing
-            q2 = Quaternion.from_vectors(z_vector, z_pv.T)
-            
-            quaternion = (q2 * q1).unit
+            quaternion = Quaternion(axes_to_quaternion(x_pv.T, z_pv.T))
             
         super().__init__(*args, quaternion=quaternion, **kwargs)
 
+    @classmethod
+    def from_pointings(cls, x_ra, x_dec, z_ra, z_dec, **kwargs):
+        """Create the frame(s) directly from the RA and Dec of the CGRO X and Z
+        axes, such as the X_RA, X_DEC, Z_RA, and Z_DEC columns of the BATSE 
+        continuous data, without creating intermediate SkyCoord or 
+        SpacecraftAxes objects.
+        
+        Args:
+            x_ra (float or np.array): The RA of the X axis, in degrees
+            x_dec (float or np.array): The Dec of the X axis, in degrees
+            z_ra (float or np.array): The RA of the Z axis, in degrees
+            z_dec (float or np.array): The Dec of the Z axis, in degrees
+            **kwargs: Other frame attributes, such as ``obstime`` and 
+                      ``obsgeoloc``
+        
+        Returns:
+            (:class:`CgroFrame`)
+        """
+        quat = pointings_to_quaternion(x_ra, x_dec, z_ra, z_dec)
+        return cls(quaternion=Quaternion(quat), **kwargs)
+
+
+def axes_to_quaternion(x_vectors, z_vectors):
+    """Calculate the quaternions that rotate the equatorial frame into the CGRO
+    frame from the pointing vectors of the CGRO X and Z axes.
+    
+    The first rotation takes the equatorial X axis to the CGRO X pointing and
+    the second takes the rotated equatorial Z axis to the CGRO Z pointing.
+    
+    Args:
+        x_vectors (np.array): The (N, 3) cartesian vectors of the X axis
+        z_vectors (np.array): The (N, 3) cartesian vectors of the Z axis
+    
+    Returns:
+        (np.array): The (N, 4) unit quaternions in (x, y, z, w) order
+    """
+    x_vectors = np.atleast_2d(x_vectors)
+    z_vectors = np.atleast_2d(z_vectors)
+    xx, xy, xz = x_vectors.T
+    zx, zy, zz = z_vectors.T
+    
+    # rotation between equatorial frame X axis and CGRO X pointing.
+    # the cross product of [1, 0, 0] and the X pointing is [0, -xz, xy]
+    x_norm = np.sqrt(xx * xx + xy * xy + xz * xz)
+    w1 = x_norm + xx
+    norm = np.sqrt(xz * xz + xy * xy + w1 * w1)
+    qx1 = np.zeros_like(w1)
+    qy1 = -xz / norm
+    qz1 = xy / norm
+    w1 = w1 / norm
+    
+    # apply X-axis rotation to equatorial frame Z axis: v + w*t + q x t, 
+    # where t = 2 * (q x [0, 0, 1]) = [2*qy, -2*qx, 0]
+    tx, ty = 2.0 * qy1, -2.0 * qx1
+    rx = w1 * tx - qz1 * ty
+    ry = w1 * ty + qz1 * tx
+    rz = 1.0 + qx1 * ty - qy1 * tx
+
+    # rotation between equatorial frame Z axis and CGRO Z pointing
+    z_norm = np.sqrt(rx * rx + ry * ry + rz * rz) * \
+             np.sqrt(zx * zx + zy * zy + zz * zz)
+    qx2 = ry * zz - rz * zy
+    qy2 = rz * zx - rx * zz
+    qz2 = rx * zy - ry * zx
+    w2 = z_norm + rx * zx + ry * zy + rz * zz
+    
+    # Hamilton product of the two rotations
+    quat = np.empty((x_vectors.shape[0], 4))
+    quat[:, 0] = w2 * qx1 + qx2 * w1 + qy2 * qz1 - qz2 * qy1
+    quat[:, 1] = w2 * qy1 - qx2 * qz1 + qy2 * w1 + qz2 * qx1
+    quat[:, 2] = w2 * qz1 + qx2 * qy1 - qy2 * qx1 + qz2 * w1
+    quat[:, 3] = w2 * w1 - qx2 * qx1 - qy2 * qy1 - qz2 * qz1
+    quat /= np.sqrt(np.einsum('ij,ij->i', quat, quat))[:, np.newaxis]
+    return quat
+
+
+def pointings_to_quaternion(x_ra, x_dec, z_ra, z_dec):
+    """Calculate the quaternions that rotate the equatorial frame into the CGRO
+    frame from the RA and Dec of the CGRO X and Z axes.
+    
+    Args:
+        x_ra (float or np.array): The RA of the X axis, in degrees
+        x_dec (float or np.array): The Dec of the X axis, in degrees
+        z_ra (float or np.array): The RA of the Z axis, in degrees
+        z_dec (float or np.array): The Dec of the Z axis, in degrees
+    
+    Returns:
+        (np.array): The (N, 4) unit quaternions in (x, y, z, w) order
+    """
+    return axes_to_quaternion(_radec_to_vectors(x_ra, x_dec), 
+                              _radec_to_vectors(z_ra, z_dec))
+
+
+def _radec_to_vectors(ra, dec):
+    """The (N, 3) cartesian unit vectors of RA and Dec in degrees"""
+    ra = np.deg2rad(np.atleast_1d(np.asarray(ra, dtype=float)))
+    dec = np.deg2rad(np.atleast_1d(np.asarray(dec, dtype=float)))
+    cos_dec = np.cos(dec)
+    return np.stack((cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)),
+                    axis=1)
+
+
+def _rotate_inverse(quaternions, vectors):
+    """Rotate vectors by the inverse of unit quaternions, e.g. from the 
+    equatorial frame into the CGRO frame.  The leading dimensions of the 
+    quaternions and vectors are broadcast against each other.
+    
+    Args:
+        quaternions (np.array): The (..., 4) unit quaternions in (x, y, z, w) 
+                                order
+        vectors (np.array): The (..., 3) vectors
+    
+    Returns:
+        (np.array): The (..., 3) rotated vectors
+    """
+    # v + w*t + u x t, where t = 2 * (u x v) and u is the negated vector part
+    ux, uy, uz = -quaternions[..., 0], -quaternions[..., 1], -quaternions[..., 2]
+    w = quaternions[..., 3]
+    vx, vy, vz = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+    tx = 2.0 * (uy * vz - uz * vy)
+    ty = 2.0 * (uz * vx - ux * vz)
+    tz = 2.0 * (ux * vy - uy * vx)
+    rotated = np.empty(np.broadcast_shapes(quaternions.shape[:-1], 
+                                           vectors.shape[:-1]) + (3,))
+    rotated[..., 0] = vx + w * tx + uy * tz - uz * ty
+    rotated[..., 1] = vy + w * ty + uz * tx - ux * tz
+    rotated[..., 2] = vz + w * tz + ux * ty - uy * tx
+    return rotated
+
 
 @frame_transform_graph.transform(FunctionTransform, CgroFrame, ICRS)
 def cgro_to_icrs(cgro_frame, icrs_frame):
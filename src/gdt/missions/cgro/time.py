@@ -38,10 +38,14 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import erfa
+import numpy as np
 from astropy.time.formats import TimeFromEpoch, Time
-import datetime
+from astropy.time.utils import day_frac
 
-__all__ = ['TimeCgroSec', 'Time', 'from_day_time', 'to_day_time']
+__all__ = ['TimeCgroSec', 'Time', 'from_day_time', 'to_day_time', 
+           'day_time_to_cgro', 'cgro_to_day_time', 'cgro_to_mjd', 
+           'mjd_to_cgro', 'cgro_to_unix', 'unix_to_cgro']
 
 class TimeCgroSec(TimeFromEpoch):
     """Truncated Julian Date + fraction of a day."""
@@ -54,22 +58,72 @@ class TimeCgroSec(TimeFromEpoch):
     epoch_format = 'iso'  # Format for epoch_val class attribute
 
 
+# microseconds in a day.  The BATSE day/seconds representation is resolved to
+# the microsecond, which is the same resolution as a datetime object.
+_usec_per_day = 86400 * 1000000
+
+# the two-part Julian Dates of the CGRO (TJD) and Unix epochs, and the offsets
+# of the Unix and MJD epochs in TJD
+_cgro_epoch_jd = (2440000.0, 0.5)
+_unix_epoch_jd = (2440588.0, -0.5)
+_unix_epoch_tjd = 587
+_mjd_epoch_tjd = -40000
+
+# UTC dates at which TAI-UTC changed, and the new value of TAI-UTC (s), from 
+# the IERS Bulletin C announcements.  No leap seconds have been announced 
+# since 2017.  Prior to 1972, UTC is not an integer offset from TAI, and 
+# conversions fall back to astropy Time.
+_leap_second_dates = np.array(['1972-01-01', '1972-07-01', '1973-01-01', 
+                               '1974-01-01', '1975-01-01', '1976-01-01',
+                               '1977-01-01', '1978-01-01', '1979-01-01',
+                               '1980-01-01', '1981-07-01', '1982-07-01',
+                               '1983-07-01', '1985-07-01', '1988-01-01',
+                               '1990-01-01', '1991-01-01', '1992-07-01',
+                               '1993-07-01', '1994-07-01', '1996-01-01',
+                               '1997-07-01', '1999-01-01', '2006-01-01',
+                               '2009-01-01', '2012-07-01', '2015-07-01',
+                               '2017-01-01'], dtype='datetime64[D]')
+_leap_second_tjd = _leap_second_dates.astype(np.int64) + _unix_epoch_tjd
+_leap_second_tai_utc = np.arange(10.0, 10.0 + _leap_second_tjd.size)
+
+
 def from_day_time(yyyy_ddd, day_secs):
     """Create from day-of-year and seconds-of-day. This is a format
     often used in the BATSE FITS files.
     
+    The inputs may either be scalars or arrays.  If arrays are given, then a 
+    single array ``Time`` object is returned.
+    
     Args:
-        yyyy_ddd (float): The day-of-year, where the integer part is the 
-                          year, and the decimal part represents the day
-                          of year.
-        day_secs (float): Seconds of day
+        yyyy_ddd (float or np.array): The day-of-year, where the integer part 
+                                      is the year, and the decimal part 
+                                      represents the day of year.
+        day_secs (float or np.array): Seconds of day
         
     Returns:
         (astropy.time.Time)
     """
-    dt = datetime.datetime.strptime(str(yyyy_ddd), '%Y.%j')
-    dt += datetime.timedelta(seconds=day_secs)
-    return Time(dt)
+    days, usecs = _parse_day_time(yyyy_ddd, day_secs)
+    
+    # seconds beyond the current day (or before it) are rolled into the day 
+    # count
+    day_offset, usecs = np.divmod(usecs, _usec_per_day)
+    days = days + day_offset
+    
+    date = days.astype('datetime64[D]')
+    iy = date.astype('datetime64[Y]').astype(np.int64) + 1970
+    im = date.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    id = (date - date.astype('datetime64[M]')).astype(np.int64) + 1
+    
+    secs, usecs = np.divmod(usecs, 1000000)
+    ihr, secs = np.divmod(secs, 3600)
+    imin, isec = np.divmod(secs, 60)
+    
+    jd1, jd2 = erfa.dtf2d(b'UTC', iy, im, id, ihr, imin, isec + usecs / 1e6)
+    jd1, jd2 = day_frac(jd1, jd2)
+    time_obj = Time(jd1, jd2, format='jd', scale='utc')
+    time_obj.format = 'datetime'
+    return time_obj
 
 
 def to_day_time(time_obj):
@@ -77,14 +131,242 @@ def to_day_time(time_obj):
     format.  The day-of-year is in the form yyyy.ddd, where the integer part is
     the year, and the decimal part is the day of year.
     
+    If the time object is an array, then a pair of arrays is returned.
+    
     Args:
         time_obj (astropy.Time): The time object
         
     Returns:
-        (float, float): (day-of-year and seconds-of-day)
+        (float, float) or (np.array, np.array): 
+            (day-of-year and seconds-of-day)
+    """
+    scale = time_obj.scale.upper().encode('ascii')
+    iy, im, id, ihmsf = erfa.d2dtf(scale, 6, time_obj.jd1, time_obj.jd2)
+    
+    date = (iy - 1970).astype('datetime64[Y]').astype('datetime64[M]') + \
+           (im - 1)
+    date = date.astype('datetime64[D]') + (id - 1)
+    doy = _day_of_year(date.astype(np.int64))
+    
+    num_secs = ihmsf['h'] * 3600 + ihmsf['m'] * 60 + ihmsf['s']
+    num_secs = num_secs + (ihmsf['f'] / 1e6)
+    
+    return _return_pair(doy, num_secs)
+
+
+def day_time_to_cgro(yyyy_ddd, day_secs):
+    """Convert day-of-year and seconds-of-day BATSE format directly to the 
+    CGRO mission time (TJD) without creating a ``Time`` object.  This is 
+    equivalent to ``from_day_time(yyyy_ddd, day_secs).cgro``, except that 
+    seconds-of-day may extend into the leap second on days that have one.
+    
+    Args:
+        yyyy_ddd (float or np.array): The day-of-year, where the integer part 
+                                      is the year, and the decimal part 
+                                      represents the day of year.
+        day_secs (float or np.array): Seconds of day
+    
+    Returns:
+        (float or np.array)
+    """
+    days, usecs = _parse_day_time(yyyy_ddd, day_secs)
+    tjd_day = days + _unix_epoch_tjd
+    day_length = _day_length(tjd_day)
+    
+    # seconds outside of the day are rolled into the day count using 86400 s
+    # days, the same as from_day_time()
+    outside = (usecs < 0) | (usecs >= day_length * 1000000)
+    day_offset, rolled = np.divmod(usecs, _usec_per_day)
+    tjd_day = np.where(outside, tjd_day + day_offset, tjd_day)
+    usecs = np.where(outside, rolled, usecs)
+    day_length = _day_length(tjd_day)
+    
+    # the time of day as fraction of the day, as computed by erfa.dtf2d(), 
+    # where a leap second belongs to the final minute of the day
+    secs, usecs = np.divmod(usecs, 1000000)
+    mins = np.minimum(secs // 60, 1439)
+    secs = 60.0 * mins + ((secs - 60 * mins) + usecs / 1e6)
+    jd1, jd2 = day_frac(2400000.5 + (tjd_day - _mjd_epoch_tjd), 
+                        secs / day_length)
+    tjd = (jd1 - _cgro_epoch_jd[0]) + (jd2 - _cgro_epoch_jd[1])
+    
+    # fall back to astropy for times before the leap second table
+    mask = tjd_day < _leap_second_tjd[0]
+    if mask.any():
+        yyyy_ddd, day_secs = np.broadcast_arrays(yyyy_ddd, day_secs)
+        tjd = np.where(mask, from_day_time(yyyy_ddd, day_secs).cgro, tjd)
+    
+    return _return_single(tjd)
+
+
+def cgro_to_day_time(tjd):
+    """Convert CGRO mission time (TJD) to the day-of-year and seconds-of-day 
+    BATSE format without creating a ``Time`` object. This is equivalent to 
+    ``to_day_time(Time(tjd, format='cgro'))``, except that a time within a 
+    leap second is returned as a seconds-of-day >= 86400.
+    
+    Args:
+        tjd (float or np.array): The CGRO mission time
+    
+    Returns:
+        (float, float) or (np.array, np.array): 
+            (day-of-year and seconds-of-day)
+    """
+    jd1, jd2 = _cgro_to_jd(tjd)
+    
+    # day number and fraction of the day, as computed by erfa.d2dtf() 
+    tjd_day = (jd1 - (_cgro_epoch_jd[0] + 1.0)).astype(np.int64)
+    tjd_day = np.where(jd2 >= 0.5, tjd_day + 1, tjd_day)
+    frac = np.where(jd2 >= 0.5, jd2 - 0.5, 0.5 + jd2)
+    
+    # on a leap second day, the fraction of the day is scaled to SI seconds
+    day_length = _day_length(tjd_day)
+    frac = frac + frac * (day_length - 86400.0) / 86400.0
+    usecs = np.floor(1e6 * (86400.0 * frac) + 0.5).astype(np.int64)
+    
+    # rounding reached the end of the day
+    rollover = (usecs >= day_length * 1000000)
+    tjd_day = np.where(rollover, tjd_day + 1, tjd_day)
+    usecs = np.where(rollover, 0, usecs)
+    
+    secs, usecs = np.divmod(usecs, 1000000)
+    doy = _day_of_year(tjd_day - _unix_epoch_tjd)
+    num_secs = secs + (usecs / 1e6)
+    
+    # fall back to astropy for times before the leap second table
+    mask = tjd_day < _leap_second_tjd[0]
+    if mask.any():
+        doy_fb, num_secs_fb = to_day_time(Time(tjd, format='cgro'))
+        doy = np.where(mask, doy_fb, doy)
+        num_secs = np.where(mask, num_secs_fb, num_secs)
+    
+    return _return_pair(doy, num_secs)
+
+
+def cgro_to_mjd(tjd):
+    """Convert CGRO mission time (TJD) to UTC Modified Julian Date without 
+    creating a ``Time`` object.  This is equivalent to 
+    ``Time(tjd, format='cgro').mjd``.
+    
+    Args:
+        tjd (float or np.array): The CGRO mission time
+    
+    Returns:
+        (float or np.array)
     """
-    dt = time_obj.datetime
-    doy = dt.year + (dt.timetuple().tm_yday) / 1000
-    num_secs = dt - dt.replace(hour=0, minute=0, second=0, microsecond=0)
-    num_secs = num_secs.seconds + (num_secs.microseconds / 1e6)
-    return (doy, num_secs)
\ No newline at end of file
+    jd1, jd2 = _cgro_to_jd(tjd)
+    return _return_single((jd1 - erfa.DJM0) + jd2)
+
+
+def mjd_to_cgro(mjd):
+    """Convert UTC Modified Julian Date to CGRO mission time (TJD) without 
+    creating a ``Time`` object.  This is equivalent to 
+    ``Time(mjd, format='mjd').cgro``.
+    
+    Args:
+        mjd (float or np.array): The Modified Julian Date
+    
+    Returns:
+        (float or np.array)
+    """
+    mjd = np.asarray(mjd, dtype=float)
+    jd1, jd2 = day_frac(mjd, np.zeros_like(mjd))
+    jd1, jd2 = day_frac(jd1 + erfa.DJM0, jd2)
+    tjd = (jd1 - _cgro_epoch_jd[0]) + (jd2 - _cgro_epoch_jd[1])
+    return _return_single(tjd)
+
+
+def cgro_to_unix(tjd):
+    """Convert CGRO mission time (TJD) to Unix time, the seconds from 
+    1970-01-01 00:00:00 UTC ignoring leap seconds, without creating a ``Time`` 
+    object.  This is equivalent to ``Time(tjd, format='cgro').unix``.
+    
+    Args:
+        tjd (float or np.array): The CGRO mission time
+    
+    Returns:
+        (float or np.array)
+    """
+    jd1, jd2 = _cgro_to_jd(tjd)
+    unix = (jd1 - _unix_epoch_jd[0]) * erfa.DAYSEC + \
+           (jd2 - _unix_epoch_jd[1]) * erfa.DAYSEC
+    return _return_single(unix)
+
+
+def unix_to_cgro(unix):
+    """Convert Unix time to CGRO mission time (TJD) without creating a 
+    ``Time`` object.  This is equivalent to ``Time(unix, format='unix').cgro``.
+    
+    Args:
+        unix (float or np.array): The Unix time
+    
+    Returns:
+        (float or np.array)
+    """
+    unix = np.asarray(unix, dtype=float)
+    day, frac = day_frac(unix, np.zeros_like(unix), divisor=erfa.DAYSEC)
+    jd1, jd2 = _normalize_jd(_unix_epoch_jd[0] + day, _unix_epoch_jd[1] + frac)
+    tjd = (jd1 - _cgro_epoch_jd[0]) + (jd2 - _cgro_epoch_jd[1])
+    return _return_single(tjd)
+
+
+def _cgro_to_jd(tjd):
+    """The two-part UTC Julian Date for a CGRO mission time, identical to the
+    internal representation of a ``Time`` object in the 'cgro' format.
+    """
+    tjd = np.asarray(tjd, dtype=float)
+    day, frac = day_frac(tjd, np.zeros_like(tjd), divisor=1.0)
+    return _normalize_jd(_cgro_epoch_jd[0] + day, _cgro_epoch_jd[1] + frac)
+
+
+def _normalize_jd(jd1, jd2):
+    """Move whole days from jd2 to jd1 after adding a time to an epoch"""
+    jd1_extra = np.round(jd2)
+    return (jd1 + jd1_extra, jd2 - jd1_extra)
+
+
+def _day_length(tjd_day):
+    """The length of the UTC day in seconds, which is 86401 for days that end
+    in a leap second.
+    """
+    idx = np.searchsorted(_leap_second_tjd, tjd_day + 1, side='right') - 1
+    idx = np.clip(idx, 1, None)
+    leap = (_leap_second_tjd[idx] == tjd_day + 1)
+    return 86400.0 + leap * (_leap_second_tai_utc[idx] - 
+                             _leap_second_tai_utc[idx-1])
+
+
+def _day_of_year(days):
+    """The yyyy.ddd day-of-year for a number of days since 1970-01-01"""
+    date = np.asarray(days, dtype=np.int64).astype('datetime64[D]')
+    year = date.astype('datetime64[Y]')
+    yday = (date - year).astype(np.int64) + 1
+    return (year.astype(np.int64) + 1970) + yday / 1000
+
+
+def _parse_day_time(yyyy_ddd, day_secs):
+    """Split the day-of-year and seconds-of-day BATSE format into the number 
+    of days since 1970-01-01 and the integer microseconds of the day.
+    """
+    yyyy_ddd, day_secs = np.broadcast_arrays(np.asarray(yyyy_ddd, dtype=float),
+                                             np.asarray(day_secs, dtype=float))
+    year = np.floor(yyyy_ddd).astype(np.int64)
+    doy = np.rint((yyyy_ddd - year) * 1000.0).astype(np.int64)
+    days = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    days = days.astype(np.int64) + (doy - 1)
+    usecs = np.rint(day_secs * 1e6).astype(np.int64)
+    return (days, usecs)
+
+
+def _return_pair(val1, val2):
+    """Return a pair of arrays, or floats if the arrays are 0-dimensional"""
+    if np.ndim(val1) == 0:
+        return (float(val1), float(val2))
+    return (val1, val2)
+
+
+def _return_single(val):
+    """Return an array, or a float if the array is 0-dimensional"""
+    if np.ndim(val) == 0:
+        return float(val)
+    return val
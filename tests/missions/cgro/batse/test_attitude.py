@@ -0,0 +1,237 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import unittest
+import numpy as np
+from astropy.coordinates import SkyCoord
+from scipy.spatial.transform import Rotation
+from gdt.core import data_path
+from gdt.missions.cgro.time import Time
+from gdt.missions.cgro.batse.attitude import *
+from gdt.missions.cgro.batse.detectors import BatseDetectors
+from gdt.missions.cgro.batse.phaii import BatsePhaiiMulti
+
+cont_file = data_path / 'cgro-batse/cont_08362.fits.gz'
+
+# a spacecraft rotating about the equatorial Z axis at 1 deg/record, in a 
+# circular equatorial orbit with a radius of 6800 km and a 90 minute period
+tjd0 = 8362.5
+dt = 2.048
+num = 100
+times = tjd0 + np.arange(num) * dt / 86400.0
+angles = np.deg2rad(np.arange(num, dtype=float))
+quats = np.zeros((num, 4))
+quats[:, 2] = np.sin(angles / 2.0)
+quats[:, 3] = np.cos(angles / 2.0)
+phase = 2.0 * np.pi * np.arange(num) * dt / 5400.0
+positions = 6800.0 * np.stack((np.cos(phase), np.sin(phase), 
+                               np.zeros(num)), axis=1)
+
+
+class TestBatseAttitudeInterpolator(unittest.TestCase):
+    
+    def setUp(self):
+        self.interp = BatseAttitudeInterpolator(times, quats, positions)
+    
+    def test_attributes(self):
+        self.assertEqual(self.interp.num_records, 100)
+        self.assertTupleEqual(self.interp.time_range, (times[0], times[-1]))
+    
+    def test_quaternion_at(self):
+        # at the records
+        q = self.interp.quaternion_at(times)
+        self.assertTrue(np.allclose(q, quats))
+        
+        # halfway between records is a 0.5 deg rotation
+        tmid = (times[:-1] + times[1:]) / 2.0
+        q = self.interp.quaternion_at(tmid)
+        mid_angles = angles[:-1] + np.deg2rad(0.5)
+        self.assertTrue(np.allclose(q[:, 2], np.sin(mid_angles / 2.0)))
+        self.assertTrue(np.allclose(q[:, 3], np.cos(mid_angles / 2.0)))
+        
+        # a scalar time and astropy Time
+        q = self.interp.quaternion_at(times[10])
+        self.assertEqual(q.shape, (1, 4))
+        q = self.interp.quaternion_at(Time(times[10:12], format='cgro'))
+        self.assertTrue(np.allclose(q, quats[10:12]))
+    
+    def test_quaternion_sign(self):
+        # flipping the sign of a record does not change the interpolation
+        flipped = quats.copy()
+        flipped[50:] *= -1.0
+        interp = BatseAttitudeInterpolator(times, flipped, positions)
+        tmid = (times[:-1] + times[1:]) / 2.0
+        q1 = Rotation.from_quat(interp.quaternion_at(tmid))
+        q2 = Rotation.from_quat(self.interp.quaternion_at(tmid))
+        self.assertTrue(np.allclose((q1 * q2.inv()).magnitude(), 0.0))
+
+    def test_position_at(self):
+        tmid = (times[:-1] + times[1:]) / 2.0
+        pos = self.interp.position_at(tmid)
+        self.assertEqual(pos.shape, (99, 3))
+        phase_mid = phase[:-1] + np.pi * dt / 5400.0
+        self.assertTrue(np.allclose(pos[:, 0], 6800.0 * np.cos(phase_mid), 
+                                    atol=1e-3))
+        self.assertTrue(np.allclose(pos[:, 1], 6800.0 * np.sin(phase_mid), 
+                                    atol=1e-3))
+
+    def test_to_spacecraft(self):
+        # the spacecraft X axis points at RA = 10 deg at record 10
+        vec = self.interp.to_spacecraft(10.0, 0.0, times[10])
+        self.assertTrue(np.allclose(vec, [[1.0, 0.0, 0.0]]))
+        
+        # multiple times and positions
+        vec = self.interp.to_spacecraft([10.0, 20.0], [0.0, 0.0], 
+                                        times[10:12])
+        self.assertTrue(np.allclose(vec, [[1.0, 0.0, 0.0], 
+                                          [np.cos(np.deg2rad(9.0)), 
+                                           np.sin(np.deg2rad(9.0)), 0.0]]))
+        with self.assertRaises(ValueError):
+            self.interp.to_spacecraft([10.0, 20.0], [0.0, 0.0], times[10:13])
+
+    def test_detector_angles(self):
+        tmid = (times[:-1] + times[1:]) / 2.0
+        angles = self.interp.detector_angles(100.0, -30.0, tmid[::10])
+        self.assertEqual(angles.shape, (10, 16))
+        
+        frame = self.interp.frame_at(tmid[::10])
+        coord = SkyCoord(100.0, -30.0, unit='deg')
+        for det in BatseDetectors:
+            ref = frame.detector_angle(det, coord).deg
+            self.assertTrue(np.allclose(angles[:, det.number], ref, 
+                                        atol=1e-8))
+        
+        angles = self.interp.detector_angles(100.0, -30.0, tmid[::10],
+                                             dets=['LAD0', 9, 
+                                                   BatseDetectors.SD7])
+        self.assertEqual(angles.shape, (10, 3))
+
+    def test_occultation(self):
+        # the geocenter is in the direction of -position
+        geo = self.interp.geocenter_angle(180.0, 0.0, times[0])
+        self.assertAlmostEqual(geo[0], 0.0)
+        geo = self.interp.geocenter_angle(0.0, 90.0, times[0])
+        self.assertAlmostEqual(geo[0], 90.0)
+        
+        radius = self.interp.earth_angular_radius(times[0])
+        self.assertAlmostEqual(radius[0], 
+                               np.rad2deg(np.arcsin(6378.1 / 6800.0)), 
+                               places=3)
+        
+        occ = self.interp.is_occulted([180.0, 0.0, 180.0], [0.0, 0.0, 75.0], 
+                                      times[0])
+        self.assertListEqual(occ.tolist(), [True, False, False])
+    
+    def test_frame_at(self):
+        frame = self.interp.frame_at(times[:5])
+        self.assertEqual(frame.shape, (5,))
+        self.assertTrue(np.allclose(frame.quaternion._array, quats[:5]))
+        self.assertTrue(np.allclose(frame.obsgeoloc.xyz.to_value('km').T, 
+                                    positions[:5]))
+
+    def test_gaps(self):
+        self.assertListEqual(self.interp.gaps, [])
+        
+        # a gap of 20 records
+        mask = np.ones(num, dtype=bool)
+        mask[40:60] = False
+        interp = BatseAttitudeInterpolator(times[mask], quats[mask], 
+                                           positions[mask])
+        self.assertListEqual(interp.gaps, [(times[39], times[60])])
+        
+        # times within the gap are rejected, but not at its edges
+        with self.assertRaises(ValueError):
+            interp.quaternion_at(times[50])
+        with self.assertRaises(ValueError):
+            interp.position_at([times[10], times[50]])
+        with self.assertRaises(ValueError):
+            interp.is_occulted(0.0, 0.0, times[40])
+        q = interp.quaternion_at([times[39], times[60]])
+        self.assertTrue(np.allclose(q, quats[[39, 60]]))
+        
+        # unless the gap is shorter than the maximum
+        interp = BatseAttitudeInterpolator(times[mask], quats[mask], 
+                                           positions[mask], max_gap=60.0)
+        self.assertListEqual(interp.gaps, [])
+        self.assertEqual(interp.quaternion_at(times[50]).shape, (1, 4))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.interp.quaternion_at(times[0] - 1.0)
+        with self.assertRaises(ValueError):
+            self.interp.position_at(times[-1] + 1.0)
+        with self.assertRaises(ValueError):
+            BatseAttitudeInterpolator(times, quats[:-1], positions)
+        with self.assertRaises(ValueError):
+            BatseAttitudeInterpolator(times[:1], quats[:1], positions[:1])
+
+
+@unittest.skipIf(not cont_file.exists(), 
+                 "test files aren't downloaded. run gdt-data download.")
+class TestBatseAttitudeInterpolatorCont(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.cont = BatsePhaiiMulti.open(cont_file)
+        cls.interp = BatseAttitudeInterpolator.from_phaii(cls.cont)
+    
+    def test_records(self):
+        frame = self.cont.get_spacecraft_frame()
+        times = frame.obstime.cgro
+        self.assertEqual(self.interp.num_records, times.size)
+        q = self.interp.quaternion_at(times)
+        # same rotations, up to the sign of the quaternions
+        dot = np.abs(np.sum(q * frame.quaternion._array, axis=1))
+        self.assertTrue(np.allclose(dot, 1.0))
+    
+    def test_detector_angles(self):
+        frame = self.cont.get_spacecraft_frame()[::500]
+        coord = SkyCoord(100.0, -30.0, unit='deg')
+        angles = self.interp.detector_angles(100.0, -30.0, 
+                                             frame.obstime.cgro)
+        for det in BatseDetectors:
+            ref = frame.detector_angle(det, coord).deg
+            self.assertTrue(np.allclose(angles[:, det.number], ref, 
+                                        atol=1e-6))
+    
+    def test_from_phaii_columns(self):
+        cont = BatsePhaiiMulti.open(cont_file, columns=[])
+        with self.assertRaises(RuntimeError):
+            BatseAttitudeInterpolator.from_phaii(cont)
@@ -0,0 +1,284 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import glob
+import gzip
+import os
+import shutil
+import unittest
+import numpy as np
+import astropy.io.fits as fits
+from tempfile import TemporaryDirectory
+from gdt.core import data_path
+from gdt.missions.cgro.batse.batch import *
+from gdt.missions.cgro.batse.headers import PhaiiTriggerHeaders, RspHeaders
+from gdt.missions.cgro.batse.phaii import BatsePhaiiTrigger
+from gdt.missions.cgro.time import day_time_to_cgro
+
+cont_file = data_path / 'cgro-batse/cont_bfits_3_105.fits.gz'
+
+
+def read_array(path):
+    arr = np.load(path)
+    if arr[0] < 0:
+        raise ValueError('negative array')
+    return {'counts': arr, 'info': [arr.size, (arr[:2], 'ok')]}
+
+
+def read_counts(path):
+    return BatsePhaiiTrigger.open(path).data.counts
+
+
+class TestBatch(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.temp_dir.name, 'file{}.npy'.format(i))
+            value = -1 if i == 2 else i
+            np.save(path, np.full(1000, value, dtype=np.float64))
+            self.paths.append(path)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def check_results(self, results):
+        self.assertEqual(len(results), 6)
+        for i, result in enumerate(results):
+            self.assertEqual(result.index, i)
+            self.assertEqual(result.path, self.paths[i])
+            if i == 2:
+                self.assertFalse(result.ok)
+                self.assertIsInstance(result.error, ValueError)
+                self.assertIn('negative array', result.traceback)
+                self.assertIsNone(result.value)
+            else:
+                self.assertTrue(result.ok)
+                self.assertIsNone(result.error)
+                self.assertIsNone(result.traceback)
+                self.assertListEqual(result.value['counts'].tolist(), 
+                                     [i] * 1000)
+                self.assertEqual(result.value['info'][0], 1000)
+                self.assertListEqual(result.value['info'][1][0].tolist(), 
+                                     [i, i])
+                self.assertEqual(result.value['info'][1][1], 'ok')
+    
+    def test_load_batch(self):
+        results = load_batch(self.paths, read_array, num_workers=2, 
+                             shm_threshold=100)
+        self.check_results(results)
+    
+    def test_load_batch_pickled(self):
+        results = load_batch(self.paths, read_array, num_workers=2, 
+                             shm_threshold=None)
+        self.check_results(results)
+
+    def test_load_batch_serial(self):
+        results = load_batch(self.paths, read_array, num_workers=0)
+        self.check_results(results)
+    
+    def test_iter_batch(self):
+        results = list(iter_batch(self.paths, read_array, num_workers=3, 
+                                  shm_threshold=100))
+        results = sorted(results, key=lambda result: result.index)
+        self.check_results(results)
+
+        results = list(iter_batch(self.paths, read_array, num_workers=3, 
+                                  ordered=True, shm_threshold=100))
+        self.check_results(results)
+    
+    def test_iter_batch_stop(self):
+        blocks = set(glob.glob('/dev/shm/psm_*'))
+        results = iter_batch(self.paths, read_array, num_workers=2, 
+                             ordered=True, shm_threshold=100)
+        self.assertEqual(next(results).index, 0)
+        results.close()
+        # the shared memory of the unconsumed results has been removed
+        self.assertSetEqual(set(glob.glob('/dev/shm/psm_*')), blocks)
+    
+    def test_repr(self):
+        results = load_batch(self.paths[1:3], read_array, num_workers=0)
+        self.assertEqual(repr(results[0]), '<BatchResult 0: file1.npy; ok>')
+        self.assertEqual(repr(results[1]), 
+                         '<BatchResult 1: file2.npy; ValueError: negative array>')
+    
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            load_batch(self.paths, 'read_array')
+        with self.assertRaises(ValueError):
+            load_batch(self.paths, read_array, num_workers=-1)
+
+
+@unittest.skipIf(not cont_file.exists(), 
+                 "test files aren't downloaded. run gdt-data download.")
+class TestBatchTrigger(unittest.TestCase):
+    
+    def test_load_batch(self):
+        paths = [cont_file, cont_file, 'missing.fits']
+        results = load_batch(paths, read_counts, num_workers=2, 
+                             shm_threshold=0)
+        counts = BatsePhaiiTrigger.open(cont_file).data.counts
+        self.assertTrue(results[0].ok)
+        self.assertTrue(results[1].ok)
+        self.assertFalse(results[2].ok)
+        self.assertIsInstance(results[2].error, FileNotFoundError)
+        self.assertListEqual(results[0].value.tolist(), counts.tolist())
+        self.assertListEqual(results[1].value.tolist(), counts.tolist())
+
+
+def write_trigger_file(path, trigger):
+    headers = PhaiiTriggerHeaders()
+    headers[0]['FILETYPE'] = 'BATSE_DISCSC'
+    headers[0]['BATSE_TR'] = trigger
+    headers[0]['STRT-DAY'] = 1991.113
+    headers[0]['STRT-TIM'] = 1000.0 + trigger
+    headers[0]['END-DAY'] = 1991.113
+    headers[0]['END-TIM'] = 2000.0
+    headers[0]['TRIG-DAY'] = 1991.113
+    headers[0]['TRIG-TIM'] = 1500.0
+    headers[2]['DET_MODE'] = 'LAD'
+    headers[2]['DSELECT'] = '00001111'
+    
+    primary = fits.PrimaryHDU(header=headers[0])
+    # the energy calibration data must be skipped to reach the next header
+    ecalib = fits.BinTableHDU.from_columns(
+                  [fits.Column(name='E_EDGES', format='5E', 
+                               array=np.ones((100, 5)))],
+                  header=headers[1])
+    spectra = fits.BinTableHDU.from_columns(
+                  [fits.Column(name='RATES', format='4E', 
+                               array=np.ones((1000, 4)))],
+                  header=headers[2])
+    fits.HDUList([primary, ecalib, spectra]).writeto(path)
+
+
+class TestScanHeaders(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.temp_dir.name, 
+                                'discsc_bfits_{}.fits'.format(i+1))
+            write_trigger_file(path, i+1)
+            if i % 2 == 1:
+                with open(path, 'rb') as f_in, gzip.open(path+'.gz', 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+                os.remove(path)
+                path += '.gz'
+            self.paths.append(path)
+        
+        # a response file, which has no energy calibration extension
+        headers = RspHeaders()
+        headers[0]['FILETYPE'] = 'BATSE_DRM'
+        headers[0]['DET_MODE'] = 'SD'
+        headers[0]['STRT-DAY'] = 1992.001
+        headers[0]['STRT-TIM'] = 0.0
+        drm = fits.BinTableHDU.from_columns(
+                  [fits.Column(name='DET_NUM', format='I', array=[0, 1])],
+                  header=headers[1])
+        path = os.path.join(self.temp_dir.name, 'hera_bfits_1.fits')
+        fits.HDUList([fits.PrimaryHDU(header=headers[0]), drm]).writeto(path)
+        self.paths.append(path)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def check_scan(self, arr):
+        self.assertEqual(arr.size, 5)
+        self.assertListEqual(arr.path.tolist(), self.paths)
+        self.assertListEqual(arr.filetype.tolist(), 
+                             ['BATSE_DISCSC'] * 4 + ['BATSE_DRM'])
+        self.assertListEqual(arr.trigger.tolist(), [1, 2, 3, 4, -1])
+        self.assertListEqual(arr.det_mode.tolist(), ['LAD'] * 4 + ['SD'])
+        self.assertListEqual(arr.dselect.tolist(), ['00001111'] * 4 + [''])
+        self.assertListEqual(arr.strt_tim.tolist(), 
+                             [1001.0, 1002.0, 1003.0, 1004.0, 0.0])
+        self.assertListEqual(arr.tstart[:4].tolist(), 
+            day_time_to_cgro(np.full(4, 1991.113), 
+                             np.array([1001.0, 1002.0, 1003.0, 1004.0])).tolist())
+        self.assertEqual(arr.tstart[4], day_time_to_cgro(1992.001, 0.0))
+        self.assertEqual(arr.trigtime[0], day_time_to_cgro(1991.113, 1500.0))
+        # the unset times of the response file
+        self.assertEqual(arr.trig_day[4], 0.0)
+        self.assertTrue(np.isnan(arr.tstop[4]))
+        self.assertTrue(np.isnan(arr.trigtime[4]))
+
+    def test_scan(self):
+        self.check_scan(scan_headers(self.paths, num_workers=2))
+    
+    def test_scan_serial(self):
+        self.check_scan(scan_headers(self.paths, num_workers=0))
+    
+    def test_header_only(self):
+        # the spectra data are never read, so a file truncated after the 
+        # spectra header can still be scanned
+        path = self.paths[0]
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 17280)
+        arr = scan_headers(path for path in self.paths[:1])
+        self.assertEqual(arr.dselect[0], '00001111')
+    
+    def test_empty(self):
+        arr = scan_headers([], num_workers=0)
+        self.assertEqual(arr.size, 0)
+        self.assertIn('tstart', arr.dtype.names)
+
+    def test_errors(self):
+        bad_file = os.path.join(self.temp_dir.name, 'bad.fits')
+        with open(bad_file, 'wb') as f:
+            f.write(b'not a fits file')
+        paths = self.paths[:1] + [bad_file, 'missing.fits']
+        
+        with self.assertRaises(RuntimeError):
+            scan_headers(paths, num_workers=0)
+        
+        arr = scan_headers(paths, num_workers=2, errors='ignore')
+        self.assertEqual(arr.trigger[0], 1)
+        self.assertListEqual(arr.trigger[1:].tolist(), [-1, -1])
+        self.assertListEqual(arr.filetype[1:].tolist(), ['', ''])
+        self.assertTrue(np.isnan(arr.tstart[1:]).all())
+
+        with self.assertRaises(ValueError):
+            scan_headers(self.paths, errors='warn')
+        with self.assertRaises(ValueError):
+            scan_headers(self.paths, num_workers=-1)
+
@@ -38,10 +38,304 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import os
+import time
 import unittest
+import warnings
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from astropy.io import fits
+from gdt.missions.cgro.time import Time
 from gdt.missions.cgro.batse.catalogs import *
 
 
+class OfflineTriggerCatalog(BatseTriggerCatalog):
+    """A trigger catalog that cannot reach HEASARC"""
+    def _is_connected(self, host):
+        raise OSError('not connected')
+
+
+class TestBatseCatalog(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.cache_path = self.temp_dir.name
+        rng = np.random.default_rng(1)
+        num_rows = 500
+        self.tnums = rng.permutation(np.arange(105, 105 + 2 * num_rows, 2))
+        self.times = 48365.0 + rng.uniform(0.0, 3000.0, num_rows)
+        self.ra = rng.uniform(0.0, 360.0, num_rows)
+        self.dec = np.rad2deg(np.arcsin(rng.uniform(-1.0, 1.0, num_rows)))
+        types = np.where(rng.uniform(size=num_rows) > 0.3, 'burst      ', 
+                         'solar flare')
+        
+        # the trigger catalog has string trigger numbers and times
+        columns = [fits.Column('TRIGGER_ID', '5A', array=np.array(
+                               ['{:05d}'.format(t) for t in self.tnums])),
+                   fits.Column('START_TIME', '13A', array=np.array(
+                               ['{:.7f}'.format(t) for t in self.times])),
+                   fits.Column('RA', 'D', array=self.ra),
+                   fits.Column('DEC', 'D', array=self.dec),
+                   fits.Column('TRIG_TYPE', '11A', array=types)]
+        hdu = fits.BinTableHDU.from_columns(columns)
+        hdu.header['EXTNAME'] = 'BATSETRIGS'
+        self.fit_file = os.path.join(self.cache_path, 'batsetrigs.fit')
+        fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(self.fit_file)
+        self.cat = BatseTriggerCatalog(cache_path=self.cache_path, cached=True)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_cache(self):
+        npz_file = os.path.join(self.cache_path, 'batsetrigs.npz')
+        self.assertTrue(os.path.exists(npz_file))
+        
+        # read from the columnar cache without the FITS file
+        os.remove(self.fit_file)
+        cat = BatseTriggerCatalog(cache_path=self.cache_path, cached=True)
+        self.assertEqual(cat.num_rows, 500)
+        self.assertTupleEqual(cat.columns, self.cat.columns)
+        self.assertEqual(cat._header['EXTNAME'], 'BATSETRIGS')
+        table1 = self.cat.get_table()
+        table2 = cat.get_table()
+        self.assertEqual(table1.dtype, table2.dtype)
+        for column in table1.dtype.names:
+            self.assertTrue(np.all(table1[column] == table2[column]))
+        self.assertTupleEqual(cat.column_range('TRIGGER_ID'), 
+                              ('00105', '01103'))
+    
+    def test_cache_refresh(self):
+        # a newer FITS file replaces the columnar cache
+        with fits.open(self.fit_file) as hdulist:
+            hdulist[1].data['RA'][0] = 1.0
+            hdulist.writeto(self.fit_file + '.new')
+        os.replace(self.fit_file + '.new', self.fit_file)
+        t = time.time() + 10.0
+        os.utime(self.fit_file, (t, t))
+        
+        cat = BatseTriggerCatalog(cache_path=self.cache_path, cached=True)
+        self.assertEqual(cat.get_table()['RA'][0], 1.0)
+        os.remove(self.fit_file)
+        cat = BatseTriggerCatalog(cache_path=self.cache_path, cached=True)
+        self.assertEqual(cat.get_table()['RA'][0], 1.0)
+    
+    def test_offline(self):
+        with self.assertWarns(UserWarning):
+            cat = OfflineTriggerCatalog(cache_path=self.cache_path)
+        self.assertEqual(cat.num_rows, 500)
+        
+        with TemporaryDirectory() as empty:
+            with self.assertRaises(OSError):
+                OfflineTriggerCatalog(cache_path=empty)
+
+    def test_slice(self):
+        # string comparisons ignore trailing whitespace, as in a FITS table
+        cat = self.cat.slice('TRIG_TYPE', 'burst', 'burst')
+        self.assertEqual(cat.num_rows, 
+                         np.sum(self.cat.get_table()['TRIG_TYPE'] == 'burst'))
+        self.assertIsInstance(cat, BatseTriggerCatalog)
+        cat = self.cat.slices([('DEC', 0.0, 90.0), ('RA', 0.0, 180.0)])
+        self.assertEqual(cat.num_rows, np.sum((self.dec >= 0.0) & 
+                                              (self.ra <= 180.0)))
+    
+    def test_select_triggers(self):
+        self.assertEqual(self.cat.trigger_column, 'TRIGGER_ID')
+        cat = self.cat.select_triggers([301, '00105', 106, 999])
+        self.assertListEqual(list(cat.get_table()['TRIGGER_ID']), 
+                             ['00105', '00301', '00999'])
+        self.assertEqual(self.cat.select_triggers(105).num_rows, 1)
+        self.assertEqual(self.cat.select_triggers([]).num_rows, 0)
+
+    def test_time_slice(self):
+        self.assertEqual(self.cat.time_column, 'START_TIME')
+        cat = self.cat.time_slice(49000.0, 49500.0)
+        mask = (self.times >= 49000.0) & (self.times <= 49500.0)
+        self.assertEqual(cat.num_rows, mask.sum())
+        times = cat.get_table()['START_TIME'].astype(float)
+        self.assertTrue(np.all(np.diff(times) >= 0.0))
+        
+        cat = self.cat.time_slice(Time(49000.0, format='mjd'), 
+                                  Time(49500.0, format='mjd'))
+        self.assertEqual(cat.num_rows, mask.sum())
+    
+    def test_cone_search(self):
+        cat = self.cat.cone_search(100.0, 30.0, 20.0)
+        cos_sep = np.sin(np.deg2rad(30.0)) * np.sin(np.deg2rad(self.dec)) + \
+                  np.cos(np.deg2rad(30.0)) * np.cos(np.deg2rad(self.dec)) * \
+                  np.cos(np.deg2rad(self.ra - 100.0))
+        separation = np.rad2deg(np.arccos(np.clip(cos_sep, -1.0, 1.0)))
+        self.assertEqual(cat.num_rows, np.sum(separation <= 20.0))
+        self.assertTrue(np.all(np.isin(cat.get_table()['RA'], 
+                                       self.ra[separation <= 20.0])))
+        
+        self.assertEqual(self.cat.cone_search(0.0, 0.0, 180.0).num_rows, 500)
+        
+        # searches on a selection only return rows of the selection
+        bursts = self.cat.slice('TRIG_TYPE', 'burst', 'burst')
+        cat = bursts.cone_search(100.0, 30.0, 20.0)
+        self.assertTrue(np.all(cat.get_table()['TRIG_TYPE'] == 'burst'))
+
+    def test_cross_match(self):
+        positions, rows, separations = self.cat.cross_match(self.ra[:10], 
+                                                            self.dec[:10], 
+                                                            1e-6)
+        self.assertTrue(np.array_equal(positions, np.arange(10)))
+        self.assertTrue(np.array_equal(rows, np.arange(10)))
+        self.assertTrue(np.all(separations < 1e-6))
+        
+        positions, rows, separations = self.cat.cross_match([0.0, 180.0], 
+                                                            [90.0, -90.0], 
+                                                            10.0)
+        self.assertTrue(np.all(separations <= 10.0))
+        self.assertEqual(np.sum(positions == 0), np.sum(self.dec >= 80.0))
+        self.assertEqual(np.sum(positions == 1), np.sum(self.dec <= -80.0))
+
+
+class TestBatseCatalogJoin(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.cache_path = self.temp_dir.name
+        rng = np.random.default_rng(2)
+        
+        # trigger catalog: string trigger numbers, every trigger
+        self.trig_tnums = np.arange(105, 405)
+        self.write('batsetrigs', [
+            fits.Column('TRIGGER_ID', '5A', array=np.array(
+                        ['{:05d}'.format(t) for t in self.trig_tnums])),
+            fits.Column('RA', 'D', array=rng.uniform(0.0, 360.0, 300)),
+            fits.Column('TRIG_TYPE', '11A', array=np.where(
+                        self.trig_tnums % 3 == 0, 'solar flare', 'burst'))])
+        
+        # 4B catalog: integer trigger numbers, a subset of the triggers
+        self.grb_tnums = rng.permutation(self.trig_tnums[::2])
+        self.t90 = rng.uniform(0.1, 100.0, self.grb_tnums.size)
+        self.write('batse4b', [
+            fits.Column('TRIGGER_NUM', 'J', array=self.grb_tnums),
+            fits.Column('RA', 'D', array=rng.uniform(0.0, 360.0, 150)),
+            fits.Column('T90', 'D', array=self.t90)])
+        
+        # time-resolved spectra: several rows for some triggers
+        self.spec_tnums = np.repeat(self.grb_tnums[:20], 3)
+        self.write('batsegrbsp', [
+            fits.Column('TRIGGER_NUM', 'J', array=self.spec_tnums),
+            fits.Column('EPEAK', 'D', array=rng.uniform(50.0, 500.0, 60))])
+        
+        self.trigcat, self.grbcat, self.speccat = self.open_catalogs()
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_catalogs(self):
+        return (BatseTriggerCatalog(cache_path=self.cache_path, cached=True), 
+                BatseGrb4bCatalog(cache_path=self.cache_path, cached=True),
+                BatseBrightSpectralCatalog(cache_path=self.cache_path, 
+                                           cached=True))
+
+    def write(self, table, columns):
+        hdu = fits.BinTableHDU.from_columns(columns)
+        fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(
+                     os.path.join(self.cache_path, table + '.fit'))
+    
+    def test_inner(self):
+        join = BatseCatalogJoin([self.trigcat, self.grbcat])
+        self.assertEqual(join.num_rows, 150)
+        self.assertTrue(np.array_equal(join.trigger_numbers, 
+                                       np.sort(self.grb_tnums)))
+        self.assertIn('T90', join.columns)
+        self.assertIn('batse4b.RA', join.columns)
+        self.assertIn('batsetrigs.RA', join.columns)
+        
+        table = join.get_table(['TRIGGER_ID', 'TRIGGER_NUM', 'T90'])
+        self.assertTrue(np.array_equal(table['TRIGGER_ID'].astype(int), 
+                                       table['TRIGGER_NUM']))
+        t90 = dict(zip(self.grb_tnums, self.t90))
+        self.assertListEqual(list(table['T90']), 
+                             [t90[t] for t in table['TRIGGER_NUM']])
+    
+    def test_one_to_many(self):
+        join = BatseCatalogJoin([self.trigcat, self.grbcat, self.speccat])
+        self.assertEqual(join.num_rows, 60)
+        table = join.get_table(['batsegrbsp.TRIGGER_NUM', 'EPEAK'])
+        self.assertListEqual(sorted(table['EPEAK']), 
+                             sorted(self.speccat.get_table()['EPEAK']))
+        self.assertTrue(np.all(np.diff(table['batsegrbsp.TRIGGER_NUM']) >= 0))
+    
+    def test_left(self):
+        join = BatseCatalogJoin([self.trigcat, self.grbcat], how='left')
+        self.assertEqual(join.num_rows, 300)
+        table = join.get_table(['TRIGGER_ID', 'T90', 'TRIGGER_NUM'])
+        missing = ~np.isin(self.trig_tnums, self.grb_tnums)
+        self.assertTrue(np.all(np.isnan(table['T90'][missing])))
+        self.assertTrue(np.all(table['TRIGGER_NUM'][missing] == -1))
+        self.assertEqual(np.sum(join.rows(self.grbcat) >= 0), 150)
+    
+    def test_filters(self):
+        join = BatseCatalogJoin([self.trigcat, self.grbcat], how='left')
+        table = join.get_table(['TRIGGER_ID', 'T90'], 
+                               filters=[('TRIG_TYPE', 'burst', 'burst'), 
+                                        ('T90', 2.0, None)])
+        t90 = dict(zip(self.grb_tnums, self.t90))
+        expected = [t for t in self.trig_tnums if (t % 3 != 0) and 
+                    (t in t90) and (t90[t] >= 2.0)]
+        self.assertListEqual(list(table['TRIGGER_ID'].astype(int)), expected)
+    
+    def join_files(self):
+        return sorted(f for f in os.listdir(self.cache_path) 
+                      if f.startswith('join_'))
+    
+    def test_saved(self):
+        join = BatseCatalogJoin([self.trigcat, self.grbcat])
+        files = self.join_files()
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith('join_batsetrigs_batse4b_inner_'))
+        
+        # reopening from the columnar cache only reads the columns used, and
+        # the trigger number indexes are loaded with the join
+        trigcat, grbcat, _ = self.open_catalogs()
+        join2 = BatseCatalogJoin([trigcat, grbcat])
+        self.assertTrue(np.array_equal(join.rows(0), join2.rows(0)))
+        join2.get_table(['T90'])
+        self.assertListEqual(sorted(grbcat._data._source._columns.keys()), 
+                             ['T90', 'TRIGGER_NUM'])
+        for cat1, cat2 in [(self.trigcat, trigcat), (self.grbcat, grbcat)]:
+            keys1, order1 = cat1._sorted_index('trigger')
+            keys2, order2 = cat2._indexes['trigger']
+            self.assertTrue(np.array_equal(keys1, keys2))
+            self.assertTrue(np.array_equal(order1, order2))
+        
+        # a join of different catalogs is recomputed and saved separately
+        sliced = trigcat.slice('TRIG_TYPE', 'burst', 'burst')
+        join3 = BatseCatalogJoin([sliced, grbcat])
+        self.assertLess(join3.num_rows, join.num_rows)
+        self.assertEqual(len(self.join_files()), 2)
+        
+        # neither join replaces the other
+        trigcat, grbcat, _ = self.open_catalogs()
+        join5 = BatseCatalogJoin([trigcat, grbcat])
+        self.assertIn('trigger', trigcat._indexes)
+        self.assertTrue(np.array_equal(join.rows(1), join5.rows(1)))
+        join6 = BatseCatalogJoin([trigcat.slice('TRIG_TYPE', 'burst', 'burst'),
+                                  grbcat])
+        self.assertTrue(np.array_equal(join3.rows(0), join6.rows(0)))
+        self.assertEqual(len(self.join_files()), 2)
+        
+        join4 = BatseCatalogJoin([self.trigcat, self.grbcat], save=False)
+        self.assertEqual(join4.num_rows, join.num_rows)
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            BatseCatalogJoin([self.trigcat])
+        with self.assertRaises(ValueError):
+            BatseCatalogJoin([self.trigcat, self.grbcat], how='outer')
+        with self.assertRaises(ValueError):
+            BatseCatalogJoin([self.trigcat, self.trigcat])
+        join = BatseCatalogJoin([self.trigcat, self.grbcat])
+        with self.assertRaises(KeyError):
+            join.get_table(['RA'])
+
+
 class TestBatseGrbCatalog(unittest.TestCase):
     
     def setUp(self):
@@ -39,6 +39,10 @@
 # the License.
 
 import unittest
+import numpy as np
+from astropy.coordinates import SkyCoord
+from gdt.core.coords import Quaternion
+from gdt.missions.cgro.frame import CgroFrame
 
 from gdt.missions.cgro.batse.detectors import *
 
@@ -174,4 +178,50 @@ class TestBatseDetectors(unittest.TestCase):
     def test_is_sd(self):
         assert BatseDetectors.LAD0.is_sd() == False
         assert BatseDetectors.SD0.is_sd() == True
-    
+
+    def test_unit_vectors(self):
+        vectors = BatseDetectors.unit_vectors()
+        self.assertEqual(vectors.shape, (16, 3))
+        self.assertTrue(np.allclose(np.linalg.norm(vectors, axis=1), 1.0))
+        for det in BatseDetectors:
+            az = det.azimuth.to_value('rad')
+            zen = det.zenith.to_value('rad')
+            self.assertTrue(np.allclose(vectors[det.number], 
+                                        [np.sin(zen) * np.cos(az), 
+                                         np.sin(zen) * np.sin(az),
+                                         np.cos(zen)]))
+        with self.assertRaises(ValueError):
+            vectors[0, 0] = 1.0
+
+    def test_masks(self):
+        lad_mask = BatseDetectors.lad_mask()
+        sd_mask = BatseDetectors.sd_mask()
+        self.assertListEqual(lad_mask.tolist(), 
+                             [det.is_lad() for det in BatseDetectors])
+        self.assertListEqual(sd_mask.tolist(), 
+                             [det.is_sd() for det in BatseDetectors])
+        self.assertTrue(np.all(lad_mask ^ sd_mask))
+        with self.assertRaises(ValueError):
+            lad_mask[0] = False
+
+    def test_angles_to(self):
+        # the spacecraft z axis
+        angles = BatseDetectors.angles_to([0.0, 0.0, 2.0])
+        self.assertEqual(angles.shape, (1, 16))
+        self.assertTrue(np.allclose(angles[0], 
+                                    [det.zenith.value for det in BatseDetectors]))
+        
+        # compare to the detector angles in the spacecraft frame
+        frame = CgroFrame(quaternion=Quaternion([0.0, 0.0, 0.0, 1.0]),
+                          detectors=BatseDetectors)
+        coords = SkyCoord([10.0, 100.0, 250.0], [-30.0, 0.0, 75.0], unit='deg')
+        vectors = coords.cartesian.xyz.value.T
+        angles = BatseDetectors.angles_to(vectors)
+        self.assertEqual(angles.shape, (3, 16))
+        for det in BatseDetectors:
+            ref = [frame.detector_angle(det, coord).deg[0] for coord in coords]
+            self.assertTrue(np.allclose(angles[:, det.number], ref))
+        
+        with self.assertRaises(ValueError):
+            BatseDetectors.angles_to([[1.0, 0.0]])
+
@@ -0,0 +1,449 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+import gzip
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+from gdt.core.heasarc import Http
+from gdt.missions.cgro.batse.download import *
+from gdt.missions.cgro.batse.finders import *
+from gdt.missions.cgro.batse.mirror import *
+
+trigger_dir = 'compton/data/batse/trigger/00001_00200'
+cont_files = ['cont_bfits_{}_105.fits.gz'.format(det) for det in range(8)]
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """A stand-in for the HEASARC HTTPS archive that serves a local directory
+    with range requests, and can cut off a number of responses part way"""
+    def do_GET(self):
+        server = self.server
+        path = unquote(urlparse(self.path).path).lstrip('/')
+        local_path = server.root.joinpath(path)
+        with server.lock:
+            server.requests.append((local_path.name, 
+                                    self.headers.get('Range')))
+        if local_path.name in server.errors:
+            self.send_error(500)
+            return
+        
+        if local_path.is_dir():
+            names = sorted(os.listdir(local_path))
+            body = 'Parent Directory</a>\n' + \
+                   '\n'.join(['<a href="{0}">{0}</a>'.format(name) 
+                              for name in names])
+            self._send(200, body.encode())
+            return
+        if not local_path.is_file():
+            self.send_error(404)
+            return
+        
+        data = local_path.read_bytes()
+        size = len(data)
+        headers = {}
+        status = 200
+        range_header = self.headers.get('Range')
+        if (range_header is not None) and server.ranges:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            if start >= size:
+                self.send_error(416)
+                return
+            data = data[start:]
+            status = 206
+            headers['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, 
+                                                                  size - 1, 
+                                                                  size)
+        
+        with server.lock:
+            cutoff = server.failures.get(local_path.name, 0) > 0
+            if cutoff:
+                server.failures[local_path.name] -= 1
+        if cutoff:
+            # advertise the whole file, but only send half of it
+            self._send(status, data[:len(data) // 2], headers, len(data))
+        else:
+            self._send(status, data, headers)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers={}, length=None):
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', 
+                         str(len(body) if length is None else length))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+
+def start_server(root):
+    """Start a stand-in archive server for a local directory"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArchiveHandler)
+    server.daemon_threads = True
+    server.root = root
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = {}
+    server.errors = set()
+    server.ranges = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, 'http://127.0.0.1:{}/'.format(server.server_address[1])
+
+
+class TestBatseDownloader(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        temp_path = Path(self.temp_dir.name)
+        self.archive_dir = temp_path.joinpath('archive')
+        self.download_dir = temp_path.joinpath('download')
+        
+        rng = np.random.default_rng(105)
+        path = self.archive_dir.joinpath(trigger_dir, '00105_burst')
+        path.mkdir(parents=True)
+        self.data = {}
+        for file in cont_files:
+            self.data[file] = rng.integers(0, 8, 200000, 
+                                           dtype=np.uint8).tobytes()
+            path.joinpath(file).write_bytes(gzip.compress(self.data[file]))
+        path.joinpath('105_4ch.gif').write_bytes(b'GIF89a')
+        
+        self.server, url = start_server(self.archive_dir)
+        self.finder = BatseTriggerFinder('00105', protocol=Http(url=url))
+        self.finder.downloader = BatseDownloader(num_workers=4, retries=2, 
+                                                 backoff=0.0)
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+    
+    def archive_path(self, file):
+        return self.archive_dir.joinpath(trigger_dir, '00105_burst', file)
+
+    def file_requests(self, file):
+        return [req for req in self.server.requests if req[0] == file]
+    
+    def test_protocol(self):
+        self.assertEqual(self.finder.protocol, 'HTTPS')
+        finder = BatseTriggerFinder(protocol=Http(url=None))
+        self.assertEqual(finder.protocol, 'HTTPS')
+        with self.assertRaises(ValueError):
+            BatseTriggerFinder('00105', protocol=Http(url=None))
+    
+    def test_get(self):
+        files = self.finder.get_cont(self.download_dir, verbose=False)
+        self.assertListEqual([file.name for file in files], cont_files)
+        for file in files:
+            self.assertEqual(gzip.decompress(file.read_bytes()), 
+                             self.data[file.name])
+        self.assertListEqual(sorted(os.listdir(self.download_dir)), 
+                             cont_files)
+        
+        files = self.finder.get_lightcurves(self.download_dir, verbose=False)
+        self.assertEqual(files[0].read_bytes(), b'GIF89a')
+    
+    def test_get_verbose(self):
+        files = self.finder.get_cont(self.download_dir, dets=[0, 1])
+        self.assertEqual(len(files), 2)
+
+    def test_resume(self):
+        file = cont_files[3]
+        self.server.failures[file] = 1
+        files = self.finder.get_cont(self.download_dir, dets=3, verbose=False)
+        self.assertEqual(gzip.decompress(files[0].read_bytes()), 
+                         self.data[file])
+        
+        # the retry only requests the remainder of the file
+        size = self.archive_path(file).stat().st_size
+        requests = self.file_requests(file)
+        self.assertEqual(len(requests), 2)
+        self.assertIsNone(requests[0][1])
+        self.assertEqual(requests[1][1], 'bytes={}-'.format(size // 2))
+    
+    def test_resume_partial_file(self):
+        # a partial file left by an earlier call
+        file = cont_files[2]
+        data = self.archive_path(file).read_bytes()
+        self.download_dir.mkdir()
+        self.download_dir.joinpath(file + '.part').write_bytes(data[:1000])
+        
+        files = self.finder.get_cont(self.download_dir, dets=2, verbose=False)
+        self.assertEqual(files[0].read_bytes(), data)
+        self.assertFalse(self.download_dir.joinpath(file + '.part').exists())
+        self.assertEqual(self.file_requests(file)[0][1], 'bytes=1000-')
+    
+    def test_no_ranges(self):
+        # the server ignores the range request, so the download restarts
+        self.server.ranges = False
+        file = cont_files[3]
+        self.server.failures[file] = 1
+        files = self.finder.get_cont(self.download_dir, dets=3, verbose=False)
+        self.assertEqual(gzip.decompress(files[0].read_bytes()), 
+                         self.data[file])
+        self.assertEqual(len(self.file_requests(file)), 2)
+    
+    def test_retries_exhausted(self):
+        file = cont_files[5]
+        self.server.failures[file] = 3
+        with self.assertRaises(RuntimeError):
+            self.finder.get_cont(self.download_dir, verbose=False)
+        self.assertEqual(len(self.file_requests(file)), 3)
+        
+        # the other files are complete, and the failed file is only partial
+        files = sorted(os.listdir(self.download_dir))
+        self.assertNotIn(file, files)
+        self.assertIn(file + '.part', files)
+        self.assertEqual(len([f for f in files if f in cont_files]), 7)
+        
+        # and is completed by a later call
+        files = self.finder.get_cont(self.download_dir, dets=5, verbose=False)
+        self.assertEqual(gzip.decompress(files[0].read_bytes()), 
+                         self.data[file])
+    
+    def test_checksum(self):
+        file = cont_files[1]
+        path = self.archive_path(file)
+        data = bytearray(path.read_bytes())
+        data[len(data) // 2] ^= 0xff
+        path.write_bytes(bytes(data))
+        
+        with self.assertRaises(RuntimeError):
+            self.finder.get_cont(self.download_dir, dets=1, verbose=False)
+        self.assertEqual(len(self.file_requests(file)), 3)
+        self.assertListEqual(os.listdir(self.download_dir), [])
+        
+        # verification can be turned off
+        self.finder.downloader = BatseDownloader(verify=False)
+        files = self.finder.get_cont(self.download_dir, dets=1, verbose=False)
+        self.assertEqual(files[0].read_bytes(), bytes(data))
+    
+    def test_missing_file(self):
+        with self.assertRaises(RuntimeError):
+            self.finder.get(self.download_dir, ['cont_bfits_9_105.fits.gz'],
+                            verbose=False)
+    
+    def test_mirror(self):
+        mirror_dir = Path(self.temp_dir.name, 'mirror')
+        finder = BatseTriggerFinder('00105', protocol=self.finder._protocol,
+                                    mirror=mirror_dir)
+        files = finder.get_cont(self.download_dir, dets=[0, 1], verbose=False)
+        self.assertEqual(gzip.decompress(files[1].read_bytes()), 
+                         self.data[cont_files[1]])
+        self.assertTrue(finder.mirror.mirror_path(
+                        '/' + trigger_dir + '/00105_burst/' + 
+                        cont_files[0]).exists())
+        num_requests = len(self.server.requests)
+        
+        # served from the mirror
+        files = finder.get_cont(self.download_dir, dets=[0, 1], verbose=False)
+        self.assertEqual(len(files), 2)
+        self.assertEqual(len(self.server.requests), num_requests)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            BatseDownloader(num_workers=0)
+        with self.assertRaises(ValueError):
+            BatseDownloader(retries=-1)
+        with self.assertRaises(TypeError):
+            self.finder.downloader = 4
+        
+        downloader = BatseDownloader()
+        self.assertEqual(downloader.num_workers, 4)
+        self.assertEqual(downloader.retries, 3)
+        self.assertEqual(downloader.backoff, 1.0)
+        self.assertTrue(downloader.verify)
+        self.assertTrue(downloader.supports(self.finder._protocol))
+        self.assertFalse(downloader.supports(LocalArchive(self.archive_dir)))
+        with self.assertRaises(TypeError):
+            downloader.get(LocalArchive(self.archive_dir), '/', [], 
+                           self.download_dir)
+        with self.assertRaises(ValueError):
+            downloader.get(self.finder._protocol, '/', 'file', 
+                           self.download_dir)
+
+
+class TestPrefetch(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        temp_path = Path(self.temp_dir.name)
+        self.archive_dir = temp_path.joinpath('archive')
+        self.download_dir = temp_path.joinpath('download')
+        
+        self.triggers = {'00105': '00001_00200', '00106': '00001_00200',
+                         '00143': '00001_00200', '00249': '00201_00400'}
+        for tnum, bucket in self.triggers.items():
+            path = self.archive_dir.joinpath('compton/data/batse/trigger', 
+                                             bucket, tnum + '_burst')
+            path.mkdir(parents=True)
+            t = str(int(tnum))
+            files = ['cont_bfits_{0}_{1}.fits.gz'.format(det, t) 
+                     for det in range(4)]
+            files += ['her_bfits_{0}_{1}.fits.gz'.format(det, t) 
+                      for det in range(2)]
+            files += ['sher_bfits_{0}_{1}.fits.gz'.format(det, t) 
+                      for det in range(2)]
+            files += ['tte_bfits_{}.fits.gz'.format(t), 
+                      '{}_4ch.gif'.format(t)]
+            for file in files:
+                path.joinpath(file).write_bytes(gzip.compress(file.encode()))
+        
+        self.server, url = start_server(self.archive_dir)
+        self.finder = BatseTriggerFinder(protocol=Http(url=url))
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+    
+    def test_prefetch(self):
+        summary = self.finder.prefetch([105, 106, '143', 249, 300], 
+                                       ['cont', 'her', 'tte'], 
+                                       self.download_dir, dets=[0, 1], 
+                                       verbose=False)
+        self.assertListEqual(summary.filetypes, ['cont', 'her', 'tte'])
+        self.assertListEqual(summary.missing_triggers, ['00300'])
+        self.assertListEqual(summary.listing_failed, [])
+        self.assertEqual(len(summary.downloaded('cont')), 8)
+        self.assertEqual(len(summary.downloaded('her')), 8)
+        self.assertEqual(len(summary.downloaded('tte')), 4)
+        self.assertTrue(all([file.name.startswith('her') for file in 
+                             summary.downloaded('her')]))
+        self.assertEqual(len(summary.skipped()), 0)
+        self.assertEqual(len(summary.failed()), 0)
+        self.assertEqual(summary.num_bytes(), 
+                         sum([file.stat().st_size for file in 
+                              self.download_dir.iterdir()]))
+        self.assertEqual(len(os.listdir(self.download_dir)), 20)
+        self.assertGreater(summary.time(), 0.0)
+        self.assertIn('total', str(summary))
+        
+        # each bucket and trigger directory is listed once
+        listings = [req[0] for req in self.server.requests 
+                    if not req[0].endswith(('.gz', '.gif'))]
+        self.assertListEqual(sorted(listings), 
+                             ['00001_00200', '00105_burst', '00106_burst', 
+                              '00143_burst', '00201_00400', '00249_burst'])
+
+    def test_skip_present(self):
+        self.finder.prefetch([105], 'cont', self.download_dir, verbose=False)
+        summary = self.finder.prefetch([105, 106], ['cont', 'cont'], 
+                                       self.download_dir, verbose=False)
+        self.assertListEqual(summary.filetypes, ['cont'])
+        self.assertEqual(len(summary.skipped()), 4)
+        self.assertEqual(len(summary.downloaded()), 4)
+        self.assertEqual(len(summary.files()), 8)
+        self.assertTrue(all(['_106.' in file.name for file in 
+                             summary.downloaded()]))
+
+    def test_failed(self):
+        self.server.failures['cont_bfits_2_105.fits.gz'] = 10
+        self.finder.downloader = BatseDownloader(retries=1, backoff=0.0)
+        summary = self.finder.prefetch([105], 'cont', self.download_dir, 
+                                       verbose=False)
+        self.assertListEqual(summary.failed(), ['cont_bfits_2_105.fits.gz'])
+        self.assertEqual(len(summary.downloaded()), 3)
+    
+    def test_listing_failed(self):
+        # a trigger directory that cannot be listed is not a missing trigger
+        self.server.errors.add('00106_burst')
+        summary = self.finder.prefetch([105, 106, 300], 'cont', 
+                                       self.download_dir, verbose=False)
+        self.assertListEqual(summary.listing_failed, ['00106'])
+        self.assertListEqual(summary.missing_triggers, ['00300'])
+        self.assertEqual(len(summary.downloaded()), 4)
+        self.assertIn('1 triggers could not be listed', str(summary))
+        
+        # nor are the triggers of a 200-trigger directory that cannot be listed
+        self.server.errors.add('00201_00400')
+        summary = self.finder.prefetch([105, 249], 'cont', 
+                                       Path(self.temp_dir.name, 'download2'),
+                                       verbose=False)
+        self.assertListEqual(summary.listing_failed, ['00249'])
+        self.assertListEqual(summary.missing_triggers, [])
+        self.assertEqual(len(summary.downloaded()), 4)
+    
+    def test_local_archive(self):
+        # a protocol without concurrent downloads, with the finder in a 
+        # trigger directory
+        finder = BatseTriggerFinder('00105', 
+                                    protocol=LocalArchive(self.archive_dir))
+        summary = finder.prefetch([106, 249], 'sher', self.download_dir, 
+                                  verbose=False)
+        self.assertEqual(len(summary.downloaded()), 4)
+        self.assertEqual(len(finder.ls_sher()), 2)
+        files = finder.get_sher(self.download_dir, verbose=False)
+        self.assertEqual(files[0].name, 'sher_bfits_0_105.fits.gz')
+    
+    def test_mirror(self):
+        finder = BatseTriggerFinder(protocol=self.finder._protocol, 
+                                    mirror=Path(self.temp_dir.name, 'mirror'))
+        summary = finder.prefetch([105, 249], 'tte', self.download_dir, 
+                                  verbose=False)
+        self.assertEqual(len(summary.downloaded()), 2)
+        self.assertTrue(finder.mirror.mirror_path(
+                        'compton/data/batse/trigger/00201_00400/' \
+                        '00249_burst/tte_bfits_249.fits.gz').exists())
+        
+        # the second time is served from the mirror and its index
+        num_requests = len(self.server.requests)
+        summary = finder.prefetch([105, 249], 'tte', 
+                                  Path(self.temp_dir.name, 'download2'),
+                                  verbose=False)
+        self.assertEqual(len(summary.downloaded()), 2)
+        self.assertEqual(len(self.server.requests), num_requests)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.finder.prefetch([105], 'stte', self.download_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import unittest
+
+from gdt.missions.cgro.batse.finders import _FilenameIndex
+
+
+class TestFilenameIndex(unittest.TestCase):
+    
+    @staticmethod
+    def substring_filter(file_list, filetype, extension, dets=None):
+        # the substring tests that the index replaces
+        files = [f for f in file_list if 
+                 (filetype in f) and f.endswith(extension)]
+        if dets is not None:
+            files = [f for f in files if
+                     any(f'_{det}_' in f for det in dets) or 
+                     any(f'_{det}.' in f for det in dets)]
+        return files
+    
+    def setUp(self):
+        self.files = ['105_4ch.gif', '105_sum.gif', 'cont_08362.fits.gz',
+                      'her_08362_3.fits.gz', 'x.3_y', '_7_', 'a#b_1.fits.gz']
+        for datatype in ['cont', 'discsc', 'dsherb', 'her', 'herb', 'sher', 
+                         'sherb', 'stte_list', 'tte']:
+            for product in ['bfits', 'drm', 'ibdb']:
+                self.files.append('{0}_{1}_105.fits.gz'.format(datatype, 
+                                                               product))
+                self.files.extend(['{0}_{1}_{2}_105.fits.gz'.format(datatype,
+                                   product, det) for det in range(8)])
+        self.index = _FilenameIndex(self.files)
+
+    def test_filter(self):
+        filetypes = ['', 'cont_bfits', 'her_bfits', 'herb_bfits', 
+                     'sherb_drm', '_drm', '_ibdb', 'stte_list_drm', 'bfits_',
+                     'cont', '_1', '3_1', '#', '105']
+        extensions = ['fits.gz', 'gif', '', '5.fits.gz']
+        detectors = [None, [3], [0, 1], ['3'], [105], ['3_105'], [''], 
+                     ['y'], ['3.fits']]
+        for filetype in filetypes:
+            for extension in extensions:
+                for dets in detectors:
+                    self.assertListEqual(
+                        self.index.filter(filetype, extension, dets=dets),
+                        self.substring_filter(self.files, filetype, 
+                                              extension, dets=dets))
+    
+    def test_indexes(self):
+        self.assertTrue(self.index.indexes(self.files))
+        self.assertFalse(self.index.indexes(list(self.files)))
+        
+        # results are copies
+        files = self.index.filter('cont_bfits', 'fits.gz')
+        files.clear()
+        self.assertEqual(len(self.index.filter('cont_bfits', 'fits.gz')), 9)
@@ -39,7 +39,9 @@
 # the License.
 
 import unittest
+import warnings
 from gdt.missions.cgro.batse.headers import *
+from gdt.missions.cgro.batse.headers import _match_layout
 
 
 class TestPhaiiContHeaders(unittest.TestCase):
@@ -674,3 +676,61 @@ class TestRspHeadersAlt(unittest.TestCase):
         assert hdr['EXTTYPE'] == 'BATSEDRM'
 
 
+def file_headers(cls):
+    hdrs = cls()
+    return [hdrs[i] for i in range(hdrs.num_headers)]
+
+
+class TestDetectHeaders(unittest.TestCase):
+    
+    def setUp(self):
+        self.cont = (PhaiiContHeaders, PhaiiContHeadersAlt1, 
+                     PhaiiContHeadersAlt2)
+        self.rsp = (RspHeaders, RspHeadersAlt)
+    
+    def test_cont(self):
+        for cls in self.cont:
+            hdrs = file_headers(cls)
+            assert detect_headers(hdrs, self.cont) is cls
+            # no keywords should be missing from the selected headers
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                detect_headers(hdrs, self.cont).from_headers(hdrs)
+
+    def test_discla(self):
+        candidates = (PhaiiDisclaHeaders, PhaiiDisclaHeadersAlt1, 
+                      PhaiiDisclaHeadersAlt2)
+        for cls in candidates:
+            assert detect_headers(file_headers(cls), candidates) is cls
+    
+    def test_rsp(self):
+        assert detect_headers(file_headers(RspHeaders), self.rsp) is RspHeaders
+        assert detect_headers(file_headers(RspHeadersAlt), self.rsp) \
+               is RspHeadersAlt
+        # the first candidate is preferred when the layouts are compatible
+        assert detect_headers(file_headers(RspHeaders), self.rsp[::-1]) \
+               is RspHeadersAlt
+    
+    def test_missing_keyword(self):
+        hdrs = file_headers(PhaiiContHeaders)
+        del hdrs[0]['QMASKDAT']
+        assert detect_headers(hdrs, self.cont) is PhaiiContHeaders
+
+    def test_no_match(self):
+        hdrs = file_headers(PhaiiTriggerHeaders)[:2]
+        assert detect_headers(hdrs, self.cont) is PhaiiContHeadersAlt2
+        with self.assertRaises(ValueError):
+            detect_headers(hdrs, self.cont).from_headers(hdrs)
+        
+        with self.assertRaises(ValueError):
+            detect_headers(hdrs, [])
+    
+    def test_cache(self):
+        hdrs = file_headers(PhaiiContHeadersAlt1)
+        detect_headers(hdrs, self.cont)
+        hits = _match_layout.cache_info().hits
+        hdrs = file_headers(PhaiiContHeadersAlt1)
+        hdrs[0]['FILE-ID'] = 'another_file.fits'
+        assert detect_headers(hdrs, self.cont) is PhaiiContHeadersAlt1
+        assert _match_layout.cache_info().hits == hits + 1
+
@@ -0,0 +1,212 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from gdt.missions.cgro.time import Time
+from gdt.missions.cgro.batse.finders import *
+from gdt.missions.cgro.batse.mirror import *
+
+trigger_dir = 'compton/data/batse/trigger/00001_00200'
+trigger_files = ['105_4ch.gif', 'cont_bfits_3_105.fits.gz', 
+                 'cont_bfits_4_105.fits.gz', 'tte_bfits_105.fits.gz']
+daily_dir = 'compton/data/batse/daily/08001_09000/08361_08400/dds08362'
+daily_files = ['cont_08362.fits.gz', 'discla_08362.fits.gz']
+
+
+class CountingArchive(LocalArchive):
+    """A local archive that counts the number of accesses"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_ls = 0
+        self.num_downloads = 0
+    
+    def download_url(self, *args, **kwargs):
+        self.num_downloads += 1
+        return super().download_url(*args, **kwargs)
+
+    def _ls(self, path):
+        self.num_ls += 1
+        return super()._ls(path)
+
+
+class TestBatseMirror(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        temp_path = Path(self.temp_dir.name)
+        self.archive_dir = temp_path.joinpath('archive')
+        self.mirror_dir = temp_path.joinpath('mirror')
+        self.download_dir = temp_path.joinpath('download')
+        
+        path = self.archive_dir.joinpath(trigger_dir, '00105_burst')
+        path.mkdir(parents=True)
+        for file in trigger_files:
+            path.joinpath(file).write_bytes(file.encode())
+        path = self.archive_dir.joinpath(trigger_dir, '00106_burst')
+        path.mkdir(parents=True)
+        path.joinpath('cont_bfits_1_106.fits.gz').write_bytes(b'106')
+        
+        path = self.archive_dir.joinpath(daily_dir)
+        path.mkdir(parents=True)
+        for file in daily_files:
+            path.joinpath(file).write_bytes(file.encode())
+        
+        self.archive = CountingArchive(self.archive_dir)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_local_archive(self):
+        finder = BatseTriggerFinder('00105', protocol=self.archive)
+        self.assertIsNone(finder.mirror)
+        self.assertEqual(finder.protocol, 'CountingArchive')
+        self.assertListEqual(finder.files, trigger_files)
+        files = finder.get_cont(self.download_dir, dets=[3])
+        self.assertEqual(files[0].read_bytes(), b'cont_bfits_3_105.fits.gz')
+    
+    def test_index(self):
+        finder = BatseTriggerFinder('00105', protocol=self.archive, 
+                                    mirror=self.mirror_dir)
+        self.assertIsInstance(finder.mirror, BatseMirror)
+        self.assertListEqual(finder.files, trigger_files)
+        self.assertListEqual(finder.ls_cont(), trigger_files[1:3])
+        # the parent directory and the trigger directory
+        self.assertEqual(self.archive.num_ls, 2)
+        self.assertTrue(finder.mirror.index_path.exists())
+        self.assertListEqual(finder.mirror.indexed_paths(), 
+                             ['/' + trigger_dir, 
+                              '/' + trigger_dir + '/00105_burst'])
+        
+        # the listings are answered from the index
+        finder.cd('00106')
+        self.assertEqual(self.archive.num_ls, 3)
+        finder.cd('00105')
+        self.assertEqual(self.archive.num_ls, 3)
+        
+        # a new finder uses the same index
+        finder = BatseTriggerFinder('00105', protocol=self.archive, 
+                                    mirror=self.mirror_dir)
+        self.assertListEqual(finder.files, trigger_files)
+        self.assertEqual(self.archive.num_ls, 3)
+    
+    def test_get(self):
+        finder = BatseTriggerFinder('00105', protocol=self.archive, 
+                                    mirror=self.mirror_dir)
+        files = finder.get_cont(self.download_dir, dets=[3])
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0], 
+                         self.download_dir.joinpath('cont_bfits_3_105.fits.gz'))
+        self.assertEqual(files[0].read_bytes(), b'cont_bfits_3_105.fits.gz')
+        self.assertEqual(self.archive.num_downloads, 1)
+        mirror_path = finder.mirror.mirror_path(os.path.join(finder.cwd, 
+                                                'cont_bfits_3_105.fits.gz'))
+        self.assertTrue(mirror_path.is_file())
+        
+        # served from the mirror
+        files = finder.get_cont(self.temp_dir.name + '/other', dets=[3])
+        self.assertEqual(files[0].read_bytes(), b'cont_bfits_3_105.fits.gz')
+        self.assertEqual(self.archive.num_downloads, 1)
+        
+        # downloading into the mirror itself
+        files = finder.get_cont(mirror_path.parent, dets=[3])
+        self.assertEqual(files[0], mirror_path)
+        self.assertEqual(self.archive.num_downloads, 1)
+
+    def test_offline(self):
+        finder = BatseTriggerFinder('00105', protocol=self.archive, 
+                                    mirror=self.mirror_dir)
+        finder.get_cont(self.download_dir, dets=[3])
+        
+        finder = BatseTriggerFinder('00105', mirror=self.mirror_dir, 
+                                    offline=True)
+        self.assertTrue(finder.mirror.offline)
+        self.assertListEqual(finder.files, trigger_files)
+        files = finder.get_cont(self.download_dir, dets=[3])
+        self.assertEqual(files[0].read_bytes(), b'cont_bfits_3_105.fits.gz')
+        
+        # not downloaded or not indexed
+        with self.assertRaises(FileNotFoundError):
+            finder.get_tte(self.download_dir)
+        with self.assertRaises(ValueError):
+            finder.cd('00106')
+        with self.assertRaises(RuntimeError):
+            finder.mirror.refresh()
+        with self.assertRaises(ValueError):
+            BatseTriggerFinder('00105', offline=True)
+
+    def test_refresh(self):
+        finder = BatseTriggerFinder('00105', protocol=self.archive, 
+                                    mirror=self.mirror_dir)
+        self.assertListEqual(finder.mirror.refresh(), [])
+        self.assertEqual(self.archive.num_ls, 4)
+        
+        path = self.archive_dir.joinpath(trigger_dir, '00105_burst', 
+                                         'cont_bfits_5_105.fits.gz')
+        path.write_bytes(b'new')
+        # too recent to refresh
+        self.assertListEqual(finder.mirror.refresh(max_age=3600.0), [])
+        self.assertEqual(self.archive.num_ls, 4)
+        
+        changed = finder.mirror.refresh()
+        self.assertListEqual(changed, ['/' + trigger_dir + '/00105_burst'])
+        finder.cd('00105')
+        self.assertIn('cont_bfits_5_105.fits.gz', finder.ls_cont())
+        
+        # listings older than max_age are refreshed automatically
+        path.unlink()
+        finder = BatseTriggerFinder('00105', protocol=self.archive, 
+                                    mirror=self.mirror_dir, max_age=0.0)
+        self.assertNotIn('cont_bfits_5_105.fits.gz', finder.ls_cont())
+
+    def test_continuous(self):
+        time = Time(8362.5, format='cgro')
+        finder = BatseContinuousFinder(time, protocol=self.archive, 
+                                       mirror=self.mirror_dir)
+        self.assertListEqual(finder.ls_cont(), ['cont_08362.fits.gz'])
+        files = finder.get_discla(self.download_dir)
+        self.assertEqual(files[0].read_bytes(), b'discla_08362.fits.gz')
+        
+        finder = BatseContinuousFinder(time, mirror=self.mirror_dir, 
+                                       offline=True)
+        self.assertListEqual(finder.ls_discla(), ['discla_08362.fits.gz'])
@@ -0,0 +1,183 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import unittest
+import numpy as np
+from astropy.coordinates import SkyCoord
+from gdt.core import data_path
+from gdt.missions.cgro.batse.detectors import BatseDetectors
+from gdt.missions.cgro.batse.occultation import *
+from gdt.missions.cgro.batse.phaii import BatsePhaiiMulti
+
+cont_file = data_path / 'cgro-batse/cont_08362.fits.gz'
+
+# a fixed attitude aligned with the equatorial frame, in a circular 
+# equatorial orbit with a radius of 6800 km and a 5400 s period
+tjd0 = 8362.5
+dt = 10.0
+num = 1200
+times = tjd0 + np.arange(num) * dt / 86400.0
+quats = np.tile([0.0, 0.0, 0.0, 1.0], (num, 1))
+phase = 2.0 * np.pi * np.arange(num) * dt / 5400.0
+positions = 6800.0 * np.stack((np.cos(phase), np.sin(phase), 
+                               np.zeros(num)), axis=1)
+# the angular radius of the Earth, in degrees
+radius = np.rad2deg(np.arcsin(6378.1 / 6800.0))
+
+
+class TestBatseOccultation(unittest.TestCase):
+    
+    def setUp(self):
+        self.occ = BatseOccultation(times, quats, positions, 
+                                    [0.0, 90.0, 0.0], [0.0, 0.0, 90.0])
+    
+    def test_attributes(self):
+        self.assertEqual(self.occ.num_records, num)
+        self.assertEqual(self.occ.num_sources, 3)
+        self.assertListEqual(self.occ.ra.tolist(), [0.0, 90.0, 0.0])
+        self.assertListEqual(self.occ.dec.tolist(), [0.0, 0.0, 90.0])
+        self.assertTrue(np.allclose(self.occ.times, times))
+        self.assertTrue(np.allclose(self.occ.earth_angular_radius, radius))
+        self.assertEqual(repr(self.occ), 
+                         '<BatseOccultation: 1200 records; 3 sources>')
+    
+    def test_masks(self):
+        self.assertEqual(self.occ.occulted.shape, (num, 3))
+        self.assertTrue(np.all(self.occ.occulted ^ self.occ.visible))
+        
+        # the geocenter is at RA = 180 + orbital phase
+        geo_ra = np.rad2deg(phase) + 180.0
+        for i, ra in enumerate([0.0, 90.0]):
+            sep = np.abs((geo_ra - ra + 180.0) % 360.0 - 180.0)
+            self.assertTrue(np.allclose(self.occ.geocenter_angles[:, i], sep))
+            self.assertListEqual(self.occ.occulted[:, i].tolist(), 
+                                 (sep <= radius).tolist())
+        # the pole is never occulted from an equatorial orbit
+        self.assertFalse(self.occ.occulted[:, 2].any())
+
+    def test_rise_set_times(self):
+        # RA = 0 sets when the orbital phase is 180 - radius and rises at 
+        # 180 + radius, with a period of 5400 s
+        rise = (self.occ.rise_times(0) - tjd0) * 86400.0
+        sets = (self.occ.set_times(0) - tjd0) * 86400.0
+        self.assertEqual(rise.size, 2)
+        self.assertEqual(sets.size, 2)
+        exp_sets = (180.0 - radius) / 360.0 * 5400.0 + np.array([0.0, 5400.0])
+        exp_rise = (180.0 + radius) / 360.0 * 5400.0 + np.array([0.0, 5400.0])
+        self.assertTrue(np.allclose(sets, exp_sets, atol=0.5))
+        self.assertTrue(np.allclose(rise, exp_rise, atol=0.5))
+        
+        self.assertEqual(self.occ.rise_times(2).size, 0)
+        self.assertEqual(self.occ.set_times(2).size, 0)
+
+    def test_gaps(self):
+        # a gap in the records from 1500 to 2000 s, which hides the first set
+        # of RA = 0 at about 1654 s
+        mask = (times - tjd0) * 86400.0 < 1495.0
+        mask |= (times - tjd0) * 86400.0 > 2005.0
+        occ = BatseOccultation(times[mask], quats[mask], positions[mask], 
+                               0.0, 0.0)
+        exp_sets = (180.0 - radius) / 360.0 * 5400.0 + 5400.0
+        sets = (occ.set_times() - tjd0) * 86400.0
+        self.assertEqual(sets.size, 1)
+        self.assertAlmostEqual(sets[0], exp_sets, delta=0.5)
+        self.assertEqual(occ.rise_times().size, 2)
+        
+        # unless the gap is shorter than the maximum
+        occ = BatseOccultation(times[mask], quats[mask], positions[mask], 
+                               0.0, 0.0, max_gap=600.0)
+        self.assertEqual(occ.set_times().size, 2)
+
+    def test_detector_angles(self):
+        angles = self.occ.detector_angles
+        self.assertEqual(angles.shape, (num, 3, 16))
+        # the attitude is fixed, so the angles are constant
+        vectors = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+        self.assertTrue(np.allclose(angles[0], 
+                                    BatseDetectors.angles_to(vectors)))
+        self.assertTrue(np.allclose(angles, angles[0]))
+        
+        vectors = self.occ.source_vectors()
+        self.assertEqual(vectors.shape, (num, 3, 3))
+        self.assertTrue(np.allclose(vectors[10], 
+                                    [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], 
+                                     [0.0, 0.0, 1.0]]))
+
+    def test_detector_visibility(self):
+        mask = self.occ.detector_visibility()
+        self.assertEqual(mask.shape, (num, 3, 16))
+        self.assertFalse(mask[self.occ.occulted].any())
+        # the pole is visible to the upper detectors only
+        self.assertListEqual(mask[0, 2].tolist(), 
+                             (BatseDetectors.unit_vectors()[:, 2] > 0.0).tolist())
+        mask = self.occ.detector_visibility(max_angle=45.0)
+        self.assertListEqual(np.flatnonzero(mask[0, 2]).tolist(), 
+                             [0, 1, 2, 3])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            BatseOccultation(times, quats[:-1], positions, 0.0, 0.0)
+        with self.assertRaises(ValueError):
+            BatseOccultation(times, quats, positions, [0.0, 1.0], 0.0)
+
+
+@unittest.skipIf(not cont_file.exists(), 
+                 "test files aren't downloaded. run gdt-data download.")
+class TestBatseOccultationCont(unittest.TestCase):
+    
+    def test_from_phaii(self):
+        cont = BatsePhaiiMulti.open(cont_file)
+        occ = BatseOccultation.from_phaii(cont, [100.0, 250.0], [-30.0, 60.0])
+        frame = cont.get_spacecraft_frame()[::500]
+        for i, (ra, dec) in enumerate([(100.0, -30.0), (250.0, 60.0)]):
+            coord = SkyCoord(ra, dec, unit='deg')
+            visible = frame.location_visible(coord)
+            self.assertListEqual(occ.visible[::500, i].tolist(), 
+                                 visible.tolist())
+            for det in BatseDetectors:
+                angles = frame.detector_angle(det, coord).deg
+                self.assertTrue(np.allclose(
+                                    occ.detector_angles[::500, i, det.number], 
+                                    angles))
+    
+    def test_from_phaii_columns(self):
+        cont = BatsePhaiiMulti.open(cont_file, columns=[])
+        with self.assertRaises(RuntimeError):
+            BatseOccultation.from_phaii(cont, 0.0, 0.0)
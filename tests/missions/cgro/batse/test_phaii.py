@@ -41,11 +41,14 @@
 import os
 import unittest
 import numpy as np
+import astropy.io.fits as fits
 from tempfile import TemporaryDirectory
 from gdt.core import data_path
 from gdt.missions.cgro.frame import *
 from gdt.missions.cgro.batse.detectors import BatseDetectors
+from gdt.missions.cgro.batse.headers import PhaiiContHeaders, PhaiiTriggerHeaders
 from gdt.missions.cgro.batse.phaii import *
+from gdt.missions.cgro.batse.phaii import BatseTimeEnergyBins
 from gdt.core.binning.binned import combine_by_factor
 
 cont_file = data_path / 'cgro-batse/cont_08362.fits.gz'
@@ -114,6 +117,27 @@ class TestBatsePhaiiCont(unittest.TestCase):
         for i, bin in enumerate(phaii_sum.data.exposure.flatten()):
             assert bin == (expo0[i] + expo1[i]) / 2
                 
+    def test_sum_detectors_weighted(self):
+        phaii0 = self.phaii_collection.get_detector(0)
+        phaii1 = self.phaii_collection.get_detector(1)
+        
+        phaii_sum = self.phaii_collection.sum_detectors([0, 1], 
+                                                        weights=[0.5, 2.0])
+        assert isinstance(phaii_sum, BatsePhaiiCont)
+        counts = 0.5 * phaii0.data.counts + 2.0 * phaii1.data.counts
+        assert np.allclose(phaii_sum.data.counts, counts)
+        uncerts = np.sqrt(0.25 * phaii0.data.counts + 4.0 * phaii1.data.counts)
+        assert np.allclose(phaii_sum.data.count_uncertainty, uncerts)
+        
+        # weights changing with time
+        weights = np.ones((phaii0.data.num_times, 2))
+        weights[:, 1] = 0.0
+        phaii_sum = self.phaii_collection.sum_detectors([0, 1], weights=weights)
+        assert np.allclose(phaii_sum.data.counts, phaii0.data.counts)
+        
+        with self.assertRaises(ValueError):
+            self.phaii_collection.sum_detectors([0, 1], weights=[1.0, 1.0, 1.0])
+                
     def test_get_spacecraft_frame(self):
         frame = self.phaii_collection.get_spacecraft_frame()
         assert isinstance(frame, CgroFrame)
@@ -210,6 +234,59 @@ class TestBatsePhaiiContOneDet(unittest.TestCase):
         assert isinstance(self.phaii.ecalib, BatseEnergyCalib)
 
 
+@unittest.skipIf(not cont_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestBatsePhaiiContSelective(unittest.TestCase):
+    
+    def setUp(self):
+        self.phaii_collection = BatsePhaii.open(cont_file, dets=[1, 'LAD3'],
+                                                columns=[])
+    
+    def test_detectors(self):
+        assert self.phaii_collection.detectors == [1, 3]
+        assert self.phaii_collection.num_dets == 2
+    
+    def test_get_detector(self):
+        full = BatsePhaii.open(cont_file)
+        for det in (1, 3):
+            phaii = self.phaii_collection.get_detector(det)
+            phaii_full = full.get_detector(det)
+            assert phaii.detector.number == det
+            assert np.array_equal(phaii.data.counts, phaii_full.data.counts)
+            assert np.array_equal(phaii.data.exposure, 
+                                  phaii_full.data.exposure)
+        
+        # detector not read
+        with self.assertRaises(ValueError):
+            self.phaii_collection.get_detector(0)
+
+    def test_read_only(self):
+        phaii = self.phaii_collection.get_detector(1)
+        with self.assertRaises(ValueError):
+            phaii.data.counts[0, 0] = 0
+
+    def test_sum_detectors(self):
+        phaii_sum = self.phaii_collection.sum_detectors()
+        assert len(phaii_sum.detector) == 2
+        assert phaii_sum.detector[0].number == 1
+        assert phaii_sum.detector[1].number == 3
+    
+    def test_get_spacecraft_frame(self):
+        with self.assertRaises(RuntimeError):
+            self.phaii_collection.get_spacecraft_frame()
+        
+        phaii_collection = BatsePhaii.open(cont_file, columns=['X_RA', 'X_DEC',
+                                           'Z_RA', 'Z_DEC', 'X_POS', 'Y_POS', 
+                                           'Z_POS'])
+        frame = phaii_collection.get_spacecraft_frame()
+        assert frame.shape == (4485,)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            BatsePhaii.open(cont_file, columns=['NOT_A_COLUMN'])
+        with self.assertRaises(ValueError):
+            BatsePhaii.open(cont_file, dets=['SD0'])
+
+
 @unittest.skipIf(not discla_file.exists(), "test files aren't downloaded. run gdt-data download.")
 class TestBatsePhaiiDiscla(unittest.TestCase):
     
@@ -272,6 +349,22 @@ class TestBatsePhaiiDiscla(unittest.TestCase):
         for i, bin in enumerate(phaii_sum.data.exposure.flatten()):
             assert bin == (expo0[i] + expo1[i]) / 2
                 
+    def test_sum_detectors_weighted(self):
+        phaii0 = self.phaii_collection.get_detector(0)
+        phaii1 = self.phaii_collection.get_detector(1)
+        
+        phaii_sum = self.phaii_collection.sum_detectors([0, 1], 
+                                                        weights=[0.5, 2.0])
+        assert isinstance(phaii_sum, BatsePhaiiDiscla)
+        counts = 0.5 * phaii0.data.counts + 2.0 * phaii1.data.counts
+        assert np.allclose(phaii_sum.data.counts, counts)
+        counts = 0.5 * phaii0.lad_lightcurve.counts + \
+                 2.0 * phaii1.lad_lightcurve.counts
+        assert np.allclose(phaii_sum.lad_lightcurve.counts, counts)
+        counts = 0.5 * phaii0.cpd_lightcurve.counts + \
+                 2.0 * phaii1.cpd_lightcurve.counts
+        assert np.allclose(phaii_sum.cpd_lightcurve.counts, counts)
+
     def test_lad_lightcurve(self):
         lad_lc0 = self.phaii_collection.get_detector(0).lad_lightcurve
         lad_lc1 = self.phaii_collection.get_detector(1).lad_lightcurve
@@ -497,6 +590,16 @@ class TestBatseEnergyCalib(unittest.TestCase):
         for i, edge in enumerate(edges):
             self.assertAlmostEqual(edge, test_edges[i], places=4)
     
+    def test_edges_at_times(self):
+        times = np.linspace(8362.0, 8363.0, 50)
+        edges = self.ecalib.edges_at_times(0, times)
+        assert edges.shape == (50, 17)
+        for i, time in enumerate(times):
+            assert np.array_equal(edges[i], self.ecalib.edges_at_time(0, time))
+        
+        with self.assertRaises(ValueError):
+            self.ecalib.edges_at_times(9, times)
+    
     def test_edges_over_timespan(self):
         
         # t0 prior to first calibration, t1 prior to last calibration
@@ -544,3 +647,305 @@ class TestBatseEnergyCalib(unittest.TestCase):
 
         for i, edge in enumerate(edges):
             self.assertAlmostEqual(edge, test_edges[i], places=4)
+
+
+class TestBatseEnergyCalibLookup(unittest.TestCase):
+    
+    def setUp(self):
+        dtype = [('CAL_DET', 'i2'), ('CAL_STRT', 'f8'), ('CAL_STOP', 'f8'),
+                 ('E_EDGES', 'f4', (3,))]
+        # calibrations are out of order for detector 1
+        data = np.array([(0, 0.0, 1.0, [10.0, 20.0, 30.0]),
+                         (0, 1.0, 2.0, [11.0, 21.0, 31.0]),
+                         (0, 2.0, 4.0, [12.0, 22.0, 32.0]),
+                         (1, 2.0, 4.0, [13.0, 23.0, 33.0]),
+                         (1, 0.0, 1.0, [14.0, 24.0, 34.0]),
+                         (1, 1.0, 2.0, [15.0, 25.0, 35.0])], dtype=dtype)
+        self.ecalib = BatseEnergyCalib.from_hdu(data)
+    
+    def test_edges_at_time(self):
+        assert list(self.ecalib.edges_at_time(0, -1.0)) == [10.0, 20.0, 30.0]
+        assert list(self.ecalib.edges_at_time(0, 1.4)) == [11.0, 21.0, 31.0]
+        assert list(self.ecalib.edges_at_time(0, 10.0)) == [12.0, 22.0, 32.0]
+        assert list(self.ecalib.edges_at_time(1, 1.4)) == [15.0, 25.0, 35.0]
+        assert list(self.ecalib.edges_at_time(1, 3.5)) == [13.0, 23.0, 33.0]
+    
+    def test_ties(self):
+        # equidistant from a calibration start and stop: the start wins
+        assert list(self.ecalib.edges_at_time(0, 1.0)) == [11.0, 21.0, 31.0]
+        # equidistant from two calibration starts: the first in the file wins
+        assert list(self.ecalib.edges_at_time(1, 1.5)) == [13.0, 23.0, 33.0]
+
+    def test_edges_at_times(self):
+        times = np.array([-1.0, 1.0, 1.4, 1.5, 3.5, 10.0])
+        for det in (0, 1):
+            edges = self.ecalib.edges_at_times(det, times)
+            for i, time in enumerate(times):
+                assert np.array_equal(edges[i], 
+                                      self.ecalib.edges_at_time(det, time))
+
+
+def write_trigger_file(path):
+    """Write a small trigger PHAII file with two calibrations"""
+    headers = PhaiiTriggerHeaders()
+    headers[0]['TRIG-DAY'] = 1991.113
+    headers[0]['TRIG-TIM'] = 33247.0
+    headers[2]['DSELECT'] = '00000100'
+    headers[2]['DET_MODE'] = 'LAD'
+
+    e_edges = np.geomspace(20.0, 2000.0, 17).astype(np.float32)
+    ecalib = np.zeros(2, dtype=[('CAL_DET', 'i2'), ('CAL_STRT', 'f8'), 
+                                ('CAL_STOP', 'f8'), ('E_EDGES', 'f4', (17,)),
+                                ('CAL_NAME', 'S16')])
+    ecalib['CAL_DET'] = 2
+    ecalib['CAL_STRT'] = [8300.0, 8369.5]
+    ecalib['CAL_STOP'] = [8369.5, 8400.0]
+    ecalib['E_EDGES'] = [e_edges, e_edges * 1.01]
+    ecalib['CAL_NAME'] = 'TEST'
+    
+    time_edges = (np.arange(321) * 0.064 - 10.0).astype(np.float32)
+    times = np.column_stack((time_edges[:-1], time_edges[1:]))
+    counts = np.random.default_rng(0).poisson(100.0, (320, 16))
+    rates = counts.astype(np.float32) / np.float32(0.064)
+    spectra = fits.BinTableHDU.from_columns(
+                  [fits.Column(name='TIMES', format='2E', array=times),
+                   fits.Column(name='RATES', format='16E', array=rates),
+                   fits.Column(name='ERRORS', format='16E', 
+                               array=np.sqrt(rates))], 
+                  header=headers[2])
+    fits.HDUList([fits.PrimaryHDU(header=headers[0]), 
+                  fits.BinTableHDU(ecalib, header=headers[1]), 
+                  spectra]).writeto(path)
+
+
+class TestBatsePhaiiWrite(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        path = os.path.join(self.temp_dir.name, 'discsc_bfits_105.fits')
+        write_trigger_file(path)
+        self.phaii = BatsePhaiiTrigger.open(path)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def write_and_open(self, phaii, filename):
+        phaii.write(self.temp_dir.name, filename=filename)
+        return BatsePhaiiTrigger.open(os.path.join(self.temp_dir.name, 
+                                                   filename))
+    
+    def test_round_trip(self):
+        phaii2 = self.write_and_open(self.phaii, 'out_bfits_105.fits')
+        self.assertEqual(phaii2.trigtime, self.phaii.trigtime)
+        self.assertTrue(np.array_equal(phaii2.data.counts, 
+                                       self.phaii.data.counts))
+        self.assertTrue(np.array_equal(phaii2.data.tstart, 
+                                       self.phaii.data.tstart))
+        self.assertTrue(np.array_equal(phaii2.data.tstop, 
+                                       self.phaii.data.tstop))
+        self.assertTrue(np.array_equal(phaii2.data.emin, self.phaii.data.emin))
+        self.assertEqual(phaii2.detector, self.phaii.detector)
+        self.assertEqual(phaii2.headers[2]['DSELECT'], '00000100')
+        
+        # the calibration table is written unchanged
+        self.assertTrue(np.array_equal(phaii2.ecalib._data, 
+                                       self.phaii.ecalib._data))
+        
+        # the file keeps the BATSE column formats
+        with fits.open(os.path.join(self.temp_dir.name, 
+                                    'out_bfits_105.fits')) as f:
+            self.assertListEqual(f[1].columns.names, 
+                                 ['CAL_DET', 'CAL_STRT', 'CAL_STOP', 
+                                  'E_EDGES', 'CAL_NAME'])
+            self.assertEqual(f[1].columns['CAL_STRT'].unit, 'TJD')
+            self.assertEqual(f[2].columns['TIMES'].format, '2E')
+            self.assertEqual(f[2].columns['RATES'].format, '16E')
+    
+    def test_rebinned(self):
+        phaii = self.phaii.rebin_energy(combine_by_factor, 2)
+        phaii = phaii.rebin_time(combine_by_factor, 4)
+        phaii = phaii.slice_energy((50.0, 500.0))
+        phaii2 = self.write_and_open(phaii, 'rebinned_bfits_105.fits')
+        
+        self.assertEqual(phaii2.num_chans, phaii.num_chans)
+        self.assertTrue(np.array_equal(phaii2.data.emin, phaii.data.emin))
+        self.assertTrue(np.array_equal(phaii2.data.emax, phaii.data.emax))
+        self.assertTrue(np.array_equal(phaii2.data.tstart, phaii.data.tstart))
+        self.assertTrue(np.allclose(phaii2.data.rates, phaii.data.rates, 
+                                    rtol=1e-6))
+        self.assertEqual(phaii2.headers[0]['STRT-TIM'], 
+                         phaii.headers[0]['STRT-TIM'])
+        self.assertEqual(phaii2.headers[2]['UP_CHAN'], phaii.num_chans - 1)
+    
+    def test_continuous(self):
+        e_edges = np.geomspace(20.0, 2000.0, 17).astype(np.float32)
+        ecalib = self.phaii.ecalib
+        mid_time = 8369.0 + np.arange(1000) * 2.048 / 86400.0
+        counts = np.random.default_rng(1).poisson(200.0, (1000, 16))
+        data = BatseTimeEnergyBins(counts.astype(float), 
+                                   mid_time - 1.024 / 86400.0, 
+                                   mid_time + 1.024 / 86400.0, 
+                                   np.full(1000, 2.0), e_edges[:-1], 
+                                   e_edges[1:])
+        headers = PhaiiContHeaders()
+        headers[0]['FILETYPE'] = 'BATSE_CONT'
+        phaii = BatsePhaiiCont.from_data(data, headers=headers, ecalib=ecalib,
+                                         detector=[BatseDetectors.LAD0,
+                                                   BatseDetectors.LAD3])
+        phaii2 = self.write_and_open(phaii, 'summed.fits')
+        
+        # the times are absolute, and the rates are preserved
+        self.assertIsNone(phaii2.trigtime)
+        self.assertTrue(np.allclose(phaii2.data.tstart, phaii.data.tstart, 
+                                    rtol=0.0, atol=1e-9))
+        self.assertTrue(np.allclose(phaii2.data.rates, phaii.data.rates, 
+                                    rtol=1e-12))
+        self.assertTrue(np.array_equal(phaii2.data.emin, phaii.data.emin))
+        self.assertEqual(phaii2.headers[0]['FILETYPE'], 'BATSE_CONT')
+        self.assertEqual(phaii2.headers[2]['DSELECT'], '00001001')
+        self.assertEqual(phaii2.headers[2]['DET_MODE'], 'LAD')
+    
+    def test_no_ecalib(self):
+        phaii = BatsePhaiiTrigger.from_data(self.phaii.data, 
+                                            trigger_time=self.phaii.trigtime,
+                                            headers=self.phaii.headers)
+        with self.assertRaises(RuntimeError):
+            phaii.write(self.temp_dir.name, filename='no_ecalib.fits')
+
+
+
+def write_cont_file(path, num_times=500, seed=0, tstart=8369.0):
+    """Write a small CONT file with all eight LADs, starting at tstart"""
+    headers = PhaiiContHeaders()
+    headers[0]['STRT-DAY'] = 1991.113
+    headers[0]['STRT-TIM'] = 0.0
+    headers[0]['END-DAY'] = 1991.114
+    headers[0]['END-TIM'] = 0.0
+    
+    e_edges = np.geomspace(20.0, 2000.0, 17).astype(np.float32)
+    ecalib = np.zeros(8, dtype=[('CAL_DET', 'i2'), ('CAL_STRT', 'f8'), 
+                                ('CAL_STOP', 'f8'), ('E_EDGES', 'f4', (17,)),
+                                ('CAL_NAME', 'S16')])
+    ecalib['CAL_DET'] = np.arange(8)
+    ecalib['CAL_STRT'] = 8300.0
+    ecalib['CAL_STOP'] = 8400.0
+    ecalib['E_EDGES'] = e_edges
+    ecalib['CAL_NAME'] = 'TEST'
+    
+    rng = np.random.default_rng(seed)
+    mid_time = tstart + (np.arange(num_times) * 2.048 + 1.024) / 86400.0
+    counts = rng.poisson(100.0, (num_times, 16, 8)).astype(np.int16)
+    deadtime = np.full((num_times, 8), 0.01, dtype=np.float32)
+    columns = [fits.Column(name='MID_TIME', format='D', array=mid_time),
+               fits.Column(name='COUNTS', format='128I', dim='(8,16)', 
+                           array=counts),
+               fits.Column(name='DEADTIME', format='8E', array=deadtime)]
+    for name in ('X_RA', 'X_DEC', 'Z_RA', 'Z_DEC'):
+        columns.append(fits.Column(name=name, format='E', 
+                                   array=np.full(num_times, 10.0)))
+    for name in ('X_POS', 'Y_POS', 'Z_POS'):
+        columns.append(fits.Column(name=name, format='E', 
+                                   array=np.full(num_times, 4000.0)))
+    fits.HDUList([fits.PrimaryHDU(header=headers[0]), 
+                  fits.BinTableHDU(ecalib, header=headers[1]), 
+                  fits.BinTableHDU.from_columns(columns, header=headers[2])
+                  ]).writeto(path, overwrite=True)
+
+
+class TestBatsePhaiiCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'cont_08369.fits.gz')
+        write_cont_file(self.path)
+        self.cache_path = self.path + '.npcache'
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def assert_same_detector(self, phaii_collection1, phaii_collection2, num):
+        phaii1 = phaii_collection1.get_detector(num)
+        phaii2 = phaii_collection2.get_detector(num)
+        self.assertTrue(np.array_equal(phaii1.data.counts, phaii2.data.counts))
+        self.assertTrue(np.array_equal(phaii1.data.tstart, phaii2.data.tstart))
+        self.assertTrue(np.array_equal(phaii1.data.exposure, 
+                                       phaii2.data.exposure))
+        self.assertTrue(np.array_equal(phaii1.data.emin, phaii2.data.emin))
+        self.assertEqual(phaii1.headers[0]['STRT-DAY'], 
+                         phaii2.headers[0]['STRT-DAY'])
+    
+    def test_cache(self):
+        phaii_collection = BatsePhaii.open(self.path)
+        self.assertFalse(os.path.exists(self.cache_path))
+        
+        # the first open writes the cache, and the second reads it
+        cached1 = BatsePhaii.open(self.path, cache=True)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_path, 
+                                                    'meta.json')))
+        cached2 = BatsePhaii.open(self.path, cache=True)
+        self.assertIsInstance(cached2._data['COUNTS'], np.memmap)
+        self.assertFalse(cached2._data['COUNTS'].flags.writeable)
+        
+        for cached in (cached1, cached2):
+            self.assertEqual(cached.filename, 'cont_08369.fits.gz')
+            self.assertListEqual(cached.detectors, list(range(8)))
+            self.assert_same_detector(phaii_collection, cached, 3)
+        
+        frame = cached2.get_spacecraft_frame()
+        self.assertEqual(len(frame), 500)
+        summed = cached2.sum_detectors([0, 1])
+        self.assertTrue(np.array_equal(summed.data.counts, 
+                        phaii_collection.sum_detectors([0, 1]).data.counts))
+    
+    def test_selective(self):
+        BatsePhaii.open(self.path, cache=True)
+        phaii_collection = BatsePhaii.open(self.path, cache=True, dets=[1, 3], 
+                                           columns=['X_RA'])
+        self.assertListEqual(phaii_collection.detectors, [1, 3])
+        self.assertListEqual(list(phaii_collection._data.keys()), 
+                             ['MID_TIME', 'COUNTS', 'DEADTIME', 'X_RA'])
+        self.assert_same_detector(BatsePhaii.open(self.path), 
+                                  phaii_collection, 3)
+        with self.assertRaises(ValueError):
+            phaii_collection.get_detector(2)
+    
+    def test_memmap(self):
+        phaii_collection = BatsePhaii.open(self.path, cache=True)
+        counts = phaii_collection.get_detector(3).data.counts
+        # the columns read from the cache are not copied into memory, with or 
+        # without selecting the detectors and columns
+        for kwargs in ({}, {'dets': [1, 3]}, {'columns': ['X_RA']}):
+            phaii_collection = BatsePhaii.open(self.path, cache=True, **kwargs)
+            for name in ('MID_TIME', 'COUNTS', 'DEADTIME', 'X_RA'):
+                col = phaii_collection._data[name]
+                while not isinstance(col, np.memmap):
+                    col = col.base
+                    self.assertIsNotNone(col)
+            phaii = phaii_collection.get_detector(3)
+            self.assertTrue(np.array_equal(phaii.data.counts, counts))
+    
+    def test_invalidate(self):
+        BatsePhaii.open(self.path, cache=True)
+        write_cont_file(self.path, num_times=300, seed=1)
+        
+        # the cache is rebuilt for the changed file
+        cached1 = BatsePhaii.open(self.path, cache=True)
+        cached2 = BatsePhaii.open(self.path, cache=True)
+        phaii_collection = BatsePhaii.open(self.path)
+        for cached in (cached1, cached2):
+            self.assertEqual(cached._data['MID_TIME'].size, 300)
+            self.assert_same_detector(phaii_collection, cached, 5)
+    
+    def test_cache_dir(self):
+        cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        os.mkdir(cache_dir)
+        BatsePhaii.open(self.path, cache=True, cache_dir=cache_dir)
+        self.assertFalse(os.path.exists(self.cache_path))
+        self.assertListEqual(os.listdir(cache_dir), 
+                             ['cont_08369.fits.gz.npcache'])
+        
+        # the cache cannot be written to a missing directory
+        with self.assertWarns(UserWarning):
+            phaii_collection = BatsePhaii.open(self.path, cache=True, 
+                                               cache_dir=cache_dir + '_none')
+        self.assertEqual(phaii_collection.num_dets, 8)
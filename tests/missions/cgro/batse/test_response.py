@@ -40,6 +40,7 @@
 
 import os
 import unittest
+import numpy as np
 from tempfile import TemporaryDirectory
 from gdt.core import data_path
 from gdt.missions.cgro.batse.detectors import BatseDetectors
@@ -139,4 +140,123 @@ class TestBatseRspMulti(unittest.TestCase):
         det = BatseDetectors.LAD3
         rsp3 = self.rsp_collection.get_detector(det)
         assert rsp3.detector == 'LAD3'
-       
\ No newline at end of file
+
+    def test_get_matrices(self):
+        drms = self.rsp_collection.get_matrices()
+        assert drms.shape == (2, 30, 4)
+        for i, det in enumerate(self.rsp_collection.detectors):
+            rsp = self.rsp_collection.get_detector(det)
+            assert np.array_equal(drms[i], rsp.drm.matrix)
+
+    def test_cache(self):
+        rsp_collection = BatseRspMulti.open(discsc_file, cache_size=1)
+        rsp3 = rsp_collection.get_detector('LAD3')
+        rsp3_again = rsp_collection.get_detector(3)
+        assert rsp3_again.drm is rsp3.drm
+        rsp_collection.get_detector('LAD7')
+        rsp_collection.get_detector('LAD3')
+        assert rsp_collection.cache_info() == (1, 3, 1, 1)
+        
+        rsp_collection.clear_cache()
+        assert rsp_collection.cache_info() == (0, 0, 1, 0)
+    
+    def test_shared_cache(self):
+        rsp_collection1 = BatseRspMulti.open(discsc_file, shared_cache=True)
+        rsp_collection2 = BatseRspMulti.open(discsc_file, shared_cache=True)
+        assert rsp_collection1.cache is BatseRspMulti.shared_cache
+        rsp3 = rsp_collection1.get_detector('LAD3')
+        assert rsp_collection2.get_detector('LAD3').drm is rsp3.drm
+        
+        rsp_collection2.clear_cache()
+        assert BatseRspMulti.shared_cache.size == 0
+
+
+class TestBatseRspDecompress(unittest.TestCase):
+    
+    def setUp(self):
+        # two 4x3 DRMs; each channel is stored from its first non-zero bin
+        self.drms = np.array([[[1.0, 0.0, 0.0],
+                               [2.0, 3.0, 0.0],
+                               [4.0, 5.0, 6.0],
+                               [7.0, 8.0, 9.0]],
+                              [[0.0, 0.0, 0.0],
+                               [1.0, 0.0, 0.0],
+                               [2.0, 3.0, 4.0],
+                               [5.0, 6.0, 7.0]]])
+        n_zeros = np.array([[1, 2, 3], [2, 3, 3]])
+        compressed = []
+        for drm, nz in zip(self.drms, n_zeros):
+            compressed.append(np.concatenate([drm[n-1:, i] \
+                                              for i, n in enumerate(nz)]))
+        drm_dir = np.empty(2, dtype=object)
+        drm_dir[1] = compressed[1]
+        drm_sum = np.empty(2, dtype=object)
+        drm_sum[0] = compressed[0]
+        self.drm_data = {'MAT_TYPE': np.array([3, 1]), 
+                         'DRM_DIR': drm_dir, 'DRM_SUM': drm_sum,
+                         'N_ZEROS': n_zeros, 'NUMEBINS': np.array([5, 5]),
+                         'NUMCHAN': np.array([4, 4]), 
+                         'NUMZERO': np.array([3, 3]),
+                         'E_EDGES': np.array([[10.0, 20.0, 30.0, 40.0]] * 2),
+                         'PHT_EDGE': np.array([[5.0, 10.0, 20.0, 40.0, 80.0]] * 2)}
+
+    def test_decompress(self):
+        for i in range(2):
+            drm = BatseRsp._decompress(self.drm_data, i)
+            assert np.array_equal(drm.matrix, self.drms[i])
+    
+    def test_decompress_matrices(self):
+        drms = BatseRsp._decompress_matrices(self.drm_data, [0, 1])
+        assert np.array_equal(drms, self.drms)
+        
+        drms = BatseRsp._decompress_matrices(self.drm_data, [1])
+        assert np.array_equal(drms, self.drms[1:])
+
+
+class TestDrmCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.cache = DrmCache(maxsize=2)
+    
+    def test_get_put(self):
+        assert self.cache.get(('a', 'LAD0')) is None
+        self.cache.put(('a', 'LAD0'), 1)
+        assert self.cache.get(('a', 'LAD0')) == 1
+        assert self.cache.hits == 1
+        assert self.cache.misses == 1
+        assert self.cache.size == 1
+    
+    def test_lru_eviction(self):
+        self.cache.put(('a', 'LAD0'), 0)
+        self.cache.put(('a', 'LAD1'), 1)
+        self.cache.get(('a', 'LAD0'))
+        self.cache.put(('a', 'LAD2'), 2)
+        assert self.cache.get(('a', 'LAD1')) is None
+        assert self.cache.get(('a', 'LAD0')) == 0
+        assert self.cache.get(('a', 'LAD2')) == 2
+        
+        self.cache.maxsize = 1
+        assert self.cache.get(('a', 'LAD0')) is None
+        assert self.cache.info() == (3, 2, 1, 1)
+    
+    def test_clear(self):
+        self.cache.put(('a', 'LAD0'), 0)
+        self.cache.put(('b', 'LAD0'), 1)
+        self.cache.get(('a', 'LAD0'))
+        self.cache.clear(file_id='a')
+        assert self.cache.size == 1
+        assert self.cache.hits == 1
+        
+        self.cache.clear()
+        assert self.cache.info() == (0, 0, 2, 0)
+    
+    def test_disabled(self):
+        cache = DrmCache(maxsize=0)
+        cache.put(('a', 'LAD0'), 0)
+        assert cache.get(('a', 'LAD0')) is None
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            DrmCache(maxsize=-1)
+        with self.assertRaises(TypeError):
+            DrmCache(maxsize='a')
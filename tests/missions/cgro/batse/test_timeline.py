@@ -0,0 +1,203 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import os
+import shutil
+import unittest
+import numpy as np
+from tempfile import TemporaryDirectory
+from gdt.core import data_path
+from gdt.missions.cgro.batse.phaii import *
+from gdt.missions.cgro.batse.timeline import *
+from test_phaii import write_cont_file
+
+cont_file = data_path / 'cgro-batse/cont_08362.fits.gz'
+discla_file = data_path / 'cgro-batse/discla_08362.fits.gz'
+
+
+class TestBatseContinuousTimelineIndex(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        for fname in ['cont_08364.fits.gz', 'cont_08362.fits', 
+                      'discla_08362.fits.gz', 'cont_08363.fits.gz.tmp', 
+                      'cont_drm_08363.fits.gz']:
+            open(os.path.join(self.temp_dir.name, fname), 'w').close()
+        self.timeline = BatseContinuousTimeline(self.temp_dir.name)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_days(self):
+        assert self.timeline.days == [8362, 8364]
+        assert self.timeline.num_days == 2
+    
+    def test_filetype(self):
+        assert self.timeline.filetype == 'cont'
+        timeline = BatseContinuousTimeline(self.temp_dir.name, 
+                                           filetype='discla')
+        assert timeline.days == [8362]
+    
+    def test_time_range(self):
+        assert self.timeline.time_range == (8362.0, 8365.0)
+    
+    def test_get_range_no_data(self):
+        with self.assertRaises(ValueError):
+            self.timeline.get_range(8370.0, 8371.0)
+        with self.assertRaises(ValueError):
+            self.timeline.get_range(8362.5, 8362.4)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            BatseContinuousTimeline(self.temp_dir.name, filetype='tte')
+        with self.assertRaises(ValueError):
+            BatseContinuousTimeline(self.temp_dir.name, cache_size=0)
+        with self.assertRaises(ValueError):
+            self.timeline.get_day(8363)
+
+
+class TestBatseContinuousTimelineDays(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        # the first day ends 500 records after TJD 8369.99
+        self.day1_path = os.path.join(self.temp_dir.name, 'cont_08369.fits')
+        self.dt = 2.048 / 86400.0
+        write_cont_file(self.day1_path, tstart=8369.99)
+        self.day1 = BatsePhaii.open(self.day1_path).get_detector(3)
+        self.day2_path = os.path.join(self.temp_dir.name, 'cont_08370.fits')
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_overlap(self):
+        # the first 100 records of the second day repeat the first day
+        write_cont_file(self.day2_path, seed=1, 
+                        tstart=8369.99 + 400 * self.dt)
+        day2 = BatsePhaii.open(self.day2_path).get_detector(3)
+        timeline = BatseContinuousTimeline(self.temp_dir.name)
+        phaii = timeline.get_range(8369.99, 8370.1, dets=[3])[3]
+        
+        self.assertEqual(phaii.data.num_times, 900)
+        self.assertTrue(np.all(np.diff(phaii.data.tstart) > 0.0))
+        self.assertTrue(np.allclose(phaii.data.tstart[1:], 
+                                    phaii.data.tstop[:-1], rtol=0.0, 
+                                    atol=1e-9))
+        self.assertTrue(np.array_equal(phaii.data.counts[:500], 
+                                       self.day1.data.counts))
+        self.assertTrue(np.array_equal(phaii.data.counts[500:], 
+                                       day2.data.counts[100:]))
+        self.assertEqual(phaii.gti.num_intervals, 1)
+    
+    def test_gap(self):
+        write_cont_file(self.day2_path, seed=1, tstart=8370.01)
+        timeline = BatseContinuousTimeline(self.temp_dir.name)
+        phaii = timeline.get_range(8369.99, 8370.1, dets=[3])[3]
+        
+        self.assertEqual(phaii.data.num_times, 1000)
+        self.assertEqual(phaii.gti.num_intervals, 2)
+        (t0, t1), (t2, t3) = phaii.gti.as_list()
+        self.assertAlmostEqual(t1, self.day1.data.tstop[-1], places=9)
+        self.assertAlmostEqual(t2, 8370.01, places=9)
+
+
+@unittest.skipIf(not cont_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestBatseContinuousTimelineCont(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        shutil.copy(cont_file, self.temp_dir.name)
+        self.timeline = BatseContinuousTimeline(self.temp_dir.name, 
+                                                cache_size=1)
+        self.phaii_collection = BatsePhaii.open(cont_file)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_get_range(self):
+        phaiis = self.timeline.get_range(8362.6, 8362.7, dets=[0, 'LAD3'])
+        assert list(phaiis.keys()) == [0, 3]
+        
+        phaii = phaiis[3]
+        assert isinstance(phaii, BatsePhaiiCont)
+        assert phaii.detector.number == 3
+        
+        phaii_day = self.phaii_collection.get_detector(3)
+        mask = (phaii_day.data.tstop > 8362.6) & (phaii_day.data.tstart < 8362.7)
+        assert np.array_equal(phaii.data.counts, phaii_day.data.counts[mask])
+        assert np.array_equal(phaii.data.exposure, 
+                              phaii_day.data.exposure[mask])
+        assert phaii.gti.range[0] == phaii.data.tstart[0]
+        assert phaii.gti.range[1] == phaii.data.tstop[-1]
+    
+    def test_get_range_all_dets(self):
+        phaiis = self.timeline.get_range(8362.6, 8362.7)
+        assert list(phaiis.keys()) == self.phaii_collection.detectors
+
+    def test_cache(self):
+        self.timeline.get_range(8362.6, 8362.7, dets=[0])
+        assert self.timeline.cached_days == [8362]
+        day = self.timeline.get_day(8362)
+        self.timeline.get_range(8362.8, 8362.9, dets=[0])
+        assert self.timeline.get_day(8362) is day
+        
+        self.timeline.clear_cache()
+        assert self.timeline.cached_days == []
+
+
+@unittest.skipIf(not discla_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestBatseContinuousTimelineDiscla(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        shutil.copy(discla_file, self.temp_dir.name)
+        self.timeline = BatseContinuousTimeline(self.temp_dir.name, 
+                                                filetype='discla')
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_get_range(self):
+        phaiis = self.timeline.get_range(8362.6, 8362.7, dets=[1])
+        phaii = phaiis[1]
+        assert isinstance(phaii, BatsePhaiiDiscla)
+        assert phaii.num_chans == 4
+        assert phaii.lad_lightcurve.size == phaii.data.num_times
+        assert phaii.cpd_lightcurve.size == phaii.data.num_times
@@ -41,10 +41,14 @@
 import os
 import unittest
 from tempfile import TemporaryDirectory
+import numpy as np
+import astropy.io.fits as fits
 from gdt.core import data_path
 from gdt.core.binning.binned import combine_by_factor
 from gdt.core.binning.unbinned import bin_by_time
+from gdt.core.data_primitives import EventList
 from gdt.missions.cgro.batse.detectors import BatseDetectors
+from gdt.missions.cgro.batse.headers import TteTriggerHeaders
 from gdt.missions.cgro.batse.tte import *
 
 tte_file = data_path / 'cgro-batse/tte_list_105.fits.gz'
@@ -98,6 +102,20 @@ class TestBatseTteMulti(unittest.TestCase):
         assert tte_sum.data.size == tte0.data.size + tte1.data.size
         for evt in tte_sum.data.times:
             assert (evt in tte0.data.times) or (evt in tte1.data.times)
+        
+        # the summed events are ordered in time
+        assert (tte_sum.data.times[1:] >= tte_sum.data.times[:-1]).all()
+    
+    def test_sum_detectors_det_ids(self):
+        tte1 = self.tte_collection.get_detector(1)
+        tte5 = self.tte_collection.get_detector(5)
+        
+        tte_sum, det_ids = self.tte_collection.sum_detectors(['LAD5', 1],
+                                                             return_det_ids=True)
+        assert det_ids.size == tte_sum.data.size
+        assert (tte_sum.data.times[det_ids == 1] == tte1.data.times).all()
+        assert (tte_sum.data.times[det_ids == 5] == tte5.data.times).all()
+        assert (tte_sum.data.channels[det_ids == 5] == tte5.data.channels).all()
 
 
 @unittest.skipIf(not tte_file.exists(), "test files aren't downloaded. run gdt-data download.")
@@ -178,3 +196,144 @@ class TestBatseTte(unittest.TestCase):
         assert spec.size == self.tte.num_chans
 
 
+def write_tte_file(path):
+    """Write a small photon list file with events for all eight LADs"""
+    headers = TteTriggerHeaders()
+    headers[0]['TRIG-DAY'] = 1991.113
+    headers[0]['TRIG-TIM'] = 33247.0
+    headers[0]['STRT-DAY'] = 1991.113
+    headers[0]['STRT-TIM'] = 33246.8
+    headers[0]['END-DAY'] = 1991.113
+    headers[0]['END-TIM'] = 33248.5
+    headers[2]['LO_CHAN'] = 0
+    headers[2]['UP_CHAN'] = 3
+    headers[2]['DSELECT'] = '11111111'
+
+    e_edges = np.array([25.0, 50.0, 100.0, 300.0, 2000.0], dtype=np.float32)
+    ecalib = np.zeros(16, dtype=[('CAL_DET', 'i2'), ('CAL_STRT', 'f8'), 
+                                 ('CAL_STOP', 'f8'), ('E_EDGES', 'f4', (5,)),
+                                 ('CAL_NAME', 'S16')])
+    ecalib['CAL_DET'] = np.repeat(np.arange(8), 2)
+    ecalib['CAL_STRT'] = np.tile([8300.0, 8369.5], 8)
+    ecalib['CAL_STOP'] = np.tile([8369.5, 8400.0], 8)
+    ecalib['E_EDGES'] = e_edges
+    ecalib['CAL_NAME'] = 'TEST'
+    
+    rng = np.random.default_rng(0)
+    times = [np.sort(rng.uniform(-0.2, 1.4, 1000 + 100 * i)).astype(np.float32)
+             for i in range(8)]
+    channels = [rng.integers(0, 4, t.size).astype(np.int16) for t in times]
+    photons = fits.BinTableHDU.from_columns(
+                  [fits.Column(name='N_PHOTON', format='J', 
+                               array=[t.size for t in times]),
+                   fits.Column(name='TIMES', format='PE()', 
+                               array=np.array(times, dtype=object)),
+                   fits.Column(name='CHANNELS', format='PI()', 
+                               array=np.array(channels, dtype=object)),
+                   fits.Column(name='T_START', format='1D', 
+                               array=np.full(8, -0.2)),
+                   fits.Column(name='T_STOP', format='1D', 
+                               array=np.full(8, 1.4))],
+                  header=headers[2])
+    fits.HDUList([fits.PrimaryHDU(header=headers[0]), 
+                  fits.BinTableHDU(ecalib, header=headers[1]), 
+                  photons]).writeto(path)
+
+
+class TestBatseTteWrite(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        path = os.path.join(self.temp_dir.name, 'tte_list_105.fits')
+        write_tte_file(path)
+        self.tte_collection = BatseTte.open(path)
+        self.tte = self.tte_collection.get_detector(3)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def write_and_open(self, tte, filename, **kwargs):
+        tte.write(self.temp_dir.name, filename=filename, **kwargs)
+        return BatseTteTrigger.open(os.path.join(self.temp_dir.name, filename))
+    
+    def assert_same_events(self, tte1, tte2):
+        self.assertTrue(np.array_equal(tte1.data.times, tte2.data.times))
+        self.assertTrue(np.array_equal(tte1.data.channels, 
+                                       tte2.data.channels))
+        self.assertTrue(np.array_equal(tte1.data.ebounds.low_edges(), 
+                                       tte2.data.ebounds.low_edges()))
+        self.assertTrue(np.array_equal(tte1.data.ebounds.high_edges(), 
+                                       tte2.data.ebounds.high_edges()))
+        self.assertListEqual(tte1.gti.as_list(), tte2.gti.as_list())
+        self.assertEqual(tte1.trigtime, tte2.trigtime)
+    
+    def test_round_trip(self):
+        tte2 = self.write_and_open(self.tte, 'out_list_105.fits', 
+                                   chunk_size=100)
+        self.assert_same_events(self.tte, tte2)
+        self.assertEqual(tte2.detector, BatseDetectors.LAD3)
+        self.assertEqual(tte2.headers[2]['DSELECT'], '00001000')
+        
+        # the events are in the row of the detector
+        with fits.open(os.path.join(self.temp_dir.name, 'out_list_105.fits'),
+                       checksum=True) as f:
+            self.assertEqual(f[2].data.shape[0], 8)
+            self.assertListEqual(f[2].data['N_PHOTON'].tolist(), 
+                                 [0, 0, 0, 1300, 0, 0, 0, 0])
+            self.assertEqual(f[2].columns['TIMES'].format, '1PE(1300)')
+            self.assertEqual(f[2].columns['CHANNELS'].format, '1PI(1300)')
+    
+    def test_checksum(self):
+        # the datasum of the streamed photon list does not depend on the 
+        # chunks it is written in
+        for chunk_size in (1, 77, 1000000):
+            self.tte.write(self.temp_dir.name, filename='out_list_105.fits', 
+                           overwrite=True, chunk_size=chunk_size)
+            with fits.open(os.path.join(self.temp_dir.name, 
+                                        'out_list_105.fits')) as f:
+                for hdu in f:
+                    self.assertIn('DATASUM', hdu.header)
+                    self.assertEqual(hdu.verify_datasum(), 1)
+                    self.assertEqual(hdu.verify_checksum(), 1)
+    
+    def test_hdulist(self):
+        hdulist = self.tte.hdulist
+        self.assertEqual(len(hdulist), 3)
+        self.assertTrue(np.array_equal(hdulist[2].data['TIMES'][3], 
+                                       self.tte.data.times))
+    
+    def test_slice_and_rebin(self):
+        tte = self.tte.slice_time((0.0, 1.0))
+        tte = tte.rebin_energy(combine_by_factor, 2)
+        tte2 = self.write_and_open(tte, 'out_list_105.fits')
+        self.assert_same_events(tte, tte2)
+        self.assertEqual(tte2.num_chans, 2)
+    
+    def test_double_precision(self):
+        times = self.tte.data.times.astype(float) + 1e-9
+        data = EventList(times=times, channels=self.tte.data.channels, 
+                         ebounds=self.tte.data.ebounds)
+        tte = BatseTteTrigger.from_data(data, gti=self.tte.gti, 
+                                        trigger_time=self.tte.trigtime,
+                                        headers=self.tte.headers,
+                                        ecalib=self.tte.ecalib, 
+                                        detector=self.tte.detector)
+        tte2 = self.write_and_open(tte, 'out_list_105.fits')
+        self.assert_same_events(tte, tte2)
+    
+    def test_sum_detectors(self):
+        tte = self.tte_collection.sum_detectors([0, 1, 2])
+        tte2 = self.write_and_open(tte, 'out_list_105.fits')
+        self.assert_same_events(tte, tte2)
+        self.assertEqual(tte2.headers[2]['DSELECT'], '00000111')
+    
+    def test_errors(self):
+        self.tte.write(self.temp_dir.name, filename='out_list_105.fits')
+        with self.assertRaises(OSError):
+            self.tte.write(self.temp_dir.name, filename='out_list_105.fits')
+        with self.assertRaises(ValueError):
+            self.tte.write(self.temp_dir.name, filename='out_list_105.fits',
+                           overwrite=True, chunk_size=0)
+        with self.assertRaises(ValueError):
+            BatseTteTrigger.open(os.path.join(self.temp_dir.name, 
+                                              'tte_list_105.fits'))
@@ -39,10 +39,13 @@
 # the License.
 
 import unittest
+import numpy as np
 from astropy.coordinates import SkyCoord
+from scipy.spatial.transform import Rotation
 import astropy.coordinates.representation as r
 from gdt.core.coords import SpacecraftAxes
 from gdt.missions.cgro.frame import *
+from gdt.missions.cgro.frame import _rotate_inverse
 from gdt.missions.cgro.time import Time
 from gdt.missions.cgro.batse.detectors import BatseDetectors
 
@@ -90,4 +93,99 @@ class TestCgroFrame(unittest.TestCase):
     
     def test_detectors(self):
         self.assertTrue(isinstance(self.frame.detectors.LAD0, BatseDetectors))
-    
\ No newline at end of file
+    
+
+class TestCgroFramePointings(unittest.TestCase):
+    
+    def setUp(self):
+        self.frame = CgroFrame.from_pointings(x_pointing.ra.value, 
+                                              x_pointing.dec.value,
+                                              z_pointing.ra.value, 
+                                              z_pointing.dec.value,
+                                              obstime=Time(time, format='cgro'),
+                                              obsgeoloc=geoloc, 
+                                              detectors=BatseDetectors)
+    
+    def test_quaternion(self):
+        axes = SpacecraftAxes(x_pointing=x_pointing, z_pointing=z_pointing)
+        frame = CgroFrame(axes=axes)
+        self.assertTrue(np.allclose(self.frame.quaternion._array, 
+                                    frame.quaternion._array, rtol=0.0, 
+                                    atol=1e-12))
+
+    def test_to_cgro_frame(self):
+        zaxis = z_pointing.transform_to(self.frame)
+        self.assertAlmostEqual(zaxis.el.value[0], 90.0, places=2)
+        xaxis = x_pointing.transform_to(self.frame)
+        self.assertAlmostEqual(xaxis.az.value[0], 0.0, places=2)
+        self.assertAlmostEqual(xaxis.el.value[0], 0.0, places=2)
+    
+    def test_detectors(self):
+        self.assertTrue(isinstance(self.frame.detectors.LAD0, BatseDetectors))
+
+
+class TestPointingsToQuaternion(unittest.TestCase):
+    
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        x_ra = rng.uniform(0.0, 360.0, 100)
+        x_dec = rng.uniform(-89.0, 89.0, 100)
+        x = SkyCoord(x_ra, x_dec, unit='deg').cartesian.xyz.value.T
+        # random z axes orthogonal to the x axes
+        z = rng.normal(size=(100, 3))
+        z -= np.sum(z * x, axis=1)[:, np.newaxis] * x
+        z = SkyCoord(z[:, 0], z[:, 1], z[:, 2], representation_type='cartesian')
+        z.representation_type = 'unitspherical'
+        self.x_pointing = SkyCoord(x_ra, x_dec, unit='deg')
+        self.z_pointing = SkyCoord(z.ra, z.dec)
+    
+    def test_array(self):
+        quat = pointings_to_quaternion(self.x_pointing.ra.value, 
+                                       self.x_pointing.dec.value,
+                                       self.z_pointing.ra.value, 
+                                       self.z_pointing.dec.value)
+        self.assertEqual(quat.shape, (100, 4))
+        self.assertTrue(np.allclose(np.linalg.norm(quat, axis=1), 1.0))
+        
+        # the rotation takes the equatorial X and Z axes to the pointings
+        rot = Rotation.from_quat(quat)
+        self.assertTrue(np.allclose(rot.apply([1.0, 0.0, 0.0]), 
+                                    self.x_pointing.cartesian.xyz.value.T))
+        self.assertTrue(np.allclose(rot.apply([0.0, 0.0, 1.0]), 
+                                    self.z_pointing.cartesian.xyz.value.T))
+    
+    def test_rotate_inverse(self):
+        quat = pointings_to_quaternion(self.x_pointing.ra.value, 
+                                       self.x_pointing.dec.value,
+                                       self.z_pointing.ra.value, 
+                                       self.z_pointing.dec.value)
+        # the pointings are rotated back to the X and Z axes
+        x = _rotate_inverse(quat, self.x_pointing.cartesian.xyz.value.T)
+        self.assertTrue(np.allclose(x, [1.0, 0.0, 0.0]))
+        
+        # broadcast over quaternions and vectors
+        vectors = np.random.default_rng(1).normal(size=(5, 3))
+        rotated = _rotate_inverse(quat[:, np.newaxis, :], 
+                                  vectors[np.newaxis, :, :])
+        self.assertEqual(rotated.shape, (100, 5, 3))
+        rot = Rotation.from_quat(quat[10]).inv()
+        self.assertTrue(np.allclose(rotated[10], rot.apply(vectors)))
+    
+    def test_axes(self):
+        quat = axes_to_quaternion(self.x_pointing.cartesian.xyz.value.T,
+                                  self.z_pointing.cartesian.xyz.value.T)
+        frame = CgroFrame.from_pointings(self.x_pointing.ra.value, 
+                                         self.x_pointing.dec.value,
+                                         self.z_pointing.ra.value, 
+                                         self.z_pointing.dec.value)
+        self.assertTrue(np.allclose(quat, frame.quaternion._array, rtol=0.0,
+                                    atol=1e-12))
+    
+    def test_scalar(self):
+        quat = pointings_to_quaternion(x_pointing.ra.value, 
+                                       x_pointing.dec.value,
+                                       z_pointing.ra.value, 
+                                       z_pointing.dec.value)
+        self.assertEqual(quat.shape, (1, 4))
+        self.assertTrue(np.allclose(quat, [[-0.72679576, -0.16954026,  
+                                            0.05838548, 0.66303481]]))
@@ -39,6 +39,7 @@
 # the License.
 
 import unittest
+import numpy as np
 from gdt.missions.cgro.time import *
 
 # trigger time from cont_bfits_3_105.fits
@@ -88,4 +89,85 @@ class TestTime():
         d3, t3 = to_day_time(Time(met3, format='cgro'))
         assert d3 == trig_day3
         assert t3 == trig_tim3
+
+    def test_from_day_time_array(self):
+        days = np.array([trig_day1, trig_day2, trig_day3])
+        secs = np.array([trig_tim1, trig_tim2, trig_tim3])
+        time_obj = from_day_time(days, secs)
+        assert time_obj.shape == (3,)
+        assert time_obj[0].cgro == met1
+        assert time_obj[1].cgro == met2
+        assert time_obj[2].cgro == met3
+        
+        # broadcast a single day against many seconds of day
+        time_obj = from_day_time(trig_day1, np.array([trig_tim1, 0.0]))
+        assert time_obj[0].cgro == met1
+        assert time_obj[1].cgro == 8367.0
+
+    def test_from_day_time_rollover(self):
+        # seconds outside of the day roll over to the adjacent days
+        assert from_day_time(1991.111, 86400.0 + 10.0).iso == \
+               '1991-04-22 00:00:10.000'
+        assert from_day_time(1991.111, -10.0).iso == '1991-04-20 23:59:50.000'
+        # day-of-year with trailing zeros
+        assert from_day_time(1991.110, 10.0).iso == '1991-04-20 00:00:10.000'
+        assert from_day_time(2000.100, 0.0).iso == '2000-04-09 00:00:00.000'
+
+    def test_to_day_time_array(self):
+        days, secs = to_day_time(Time([met1, met2, met3], format='cgro'))
+        assert days.tolist() == [trig_day1, trig_day2, trig_day3]
+        assert secs.tolist() == [trig_tim1, trig_tim2, trig_tim3]
+
+
+class TestFastConversions():
+    
+    # times spanning the mission, with a cluster of times around the end of 
+    # each day with a leap second during the mission
+    leap_days = np.array([8803, 9168, 9533, 10082, 10629, 11178])
+    rng = np.random.default_rng(1991)
+    tjd = np.concatenate((rng.uniform(8351.0, 11700.0, 10000), 
+                          np.repeat(leap_days, 100) + \
+                          rng.uniform(0.9999, 1.0001, 600)))
+    
+    def test_scalars(self):
+        assert day_time_to_cgro(trig_day1, trig_tim1) == met1
+        assert cgro_to_day_time(met2) == (trig_day2, trig_tim2)
+        assert cgro_to_mjd(met3) == Time(met3, format='cgro').mjd
+        assert cgro_to_unix(met3) == Time(met3, format='cgro').unix
+        assert isinstance(day_time_to_cgro(trig_day1, trig_tim1), float)
+    
+    def test_day_time_to_cgro(self):
+        days, secs = to_day_time(Time(self.tjd, format='cgro'))
+        # datetime cannot represent a time within a leap second
+        mask = (secs < 86400.0)
+        tjd = day_time_to_cgro(days[mask], secs[mask])
+        assert (tjd == from_day_time(days[mask], secs[mask]).cgro).all()
+
+    def test_cgro_to_day_time(self):
+        days, secs = cgro_to_day_time(self.tjd)
+        days_ref, secs_ref = to_day_time(Time(self.tjd, format='cgro'))
+        assert (days == days_ref).all()
+        assert (secs == secs_ref).all()
+    
+    def test_leap_second(self):
+        time_obj = Time('1992-06-30 23:59:60.5', scale='utc')
+        tjd = day_time_to_cgro(1992.182, 86400.5)
+        assert tjd == time_obj.cgro
+        assert cgro_to_day_time(tjd) == (1992.182, 86400.5)
+    
+    def test_mjd(self):
+        time_obj = Time(self.tjd, format='cgro')
+        assert (cgro_to_mjd(self.tjd) == time_obj.mjd).all()
+        assert (mjd_to_cgro(time_obj.mjd) == \
+                Time(time_obj.mjd, format='mjd').cgro).all()
+
+    def test_unix(self):
+        time_obj = Time(self.tjd, format='cgro')
+        assert (cgro_to_unix(self.tjd) == time_obj.unix).all()
+        assert (unix_to_cgro(time_obj.unix) == \
+                Time(time_obj.unix, format='unix').cgro).all()
     
+    def test_fallback(self):
+        # before the leap second table
+        assert day_time_to_cgro(1970.001, 43200.0) == 587.5
+        assert cgro_to_day_time(587.5) == (1970.001, 43200.0)